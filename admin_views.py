@@ -0,0 +1,506 @@
+from flask import render_template, request, jsonify, redirect, url_for, session, flash, current_app, send_file, make_response
+import json
+import os
+from catalog import load_summaries, load_tour, load_tour_for_update, save_tour, delete_tour
+import booking_store
+import consent_store
+from tour_dates import clean_date_rules, parse_date
+import profiling
+import static_export
+import cdn_cache
+import app_logging
+
+# Admin views, registered on the "admin" blueprint by app.create_app()
+
+# Admin credentials (from environment variables for security)
+ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'TiTirana')
+ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'TiTirana')
+
+# Admin login decorator
+def admin_required(f):
+    def wrapper(*args, **kwargs):
+        if not session.get('admin_logged_in'):
+            return redirect(url_for('admin.admin_login'))
+        return f(*args, **kwargs)
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+def admin_login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+            session['admin_logged_in'] = True
+            return redirect(url_for('admin.admin_dashboard'))
+        else:
+            flash('Invalid credentials')
+
+    # Add meta tags for admin login page SEO (though typically not indexed)
+    meta_tags = {
+        'title': 'Admin Login - Albania Walk Tours',
+        'description': 'Administrator login page for Albania Walk Tours.',
+        'robots': 'noindex, nofollow' # Prevent indexing of login page
+    }
+    return render_template('admin/login.html', meta_tags=meta_tags)
+
+def admin_logout():
+    session.pop('admin_logged_in', None)
+    return redirect(url_for('admin.admin_login'))
+
+@admin_required
+def admin_dashboard():
+    tours = load_summaries()
+
+    # Load bookings
+    bookings = booking_store.load_bookings()
+
+    # Calculate recent bookings (last 7 days)
+    from datetime import datetime, timedelta
+    week_ago = datetime.now() - timedelta(days=7)
+    recent_bookings_count = 0
+
+    for booking in bookings:
+        if 'booking_time' in booking:
+            try:
+                booking_date = datetime.fromisoformat(booking['booking_time'].replace('Z', '+00:00'))
+                if booking_date >= week_ago:
+                    recent_bookings_count += 1
+            except (ValueError, TypeError):
+                continue
+
+    # Add meta tags for admin dashboard SEO (prevent indexing)
+    meta_tags = {
+        'title': 'Admin Dashboard - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/dashboard.html', 
+                         tours=tours, 
+                         bookings=bookings, 
+                         recent_bookings_count=recent_bookings_count,
+                         meta_tags=meta_tags)
+
+@admin_required
+def admin_tours():
+    tours = load_summaries()
+    # Add meta tags for admin tours page SEO (prevent indexing)
+    meta_tags = {
+        'title': 'Admin Tours Management - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/tours.html', tours=tours, meta_tags=meta_tags)
+
+@admin_required
+def admin_add_tour():
+    if request.method == 'POST':
+        new_tour = {
+            'id': request.form.get('id') or '',
+            'title': request.form.get('title') or '',
+            'short_description': request.form.get('short_description') or '',
+            'long_description': request.form.get('long_description') or '',
+            'price': int(request.form.get('price') or 0),
+            'duration': request.form.get('duration') or '',
+            'starting_point': request.form.get('starting_point') or '',
+            'schedule': (request.form.get('schedule') or '').split('\n'),
+            'images': [img.strip() for img in (request.form.get('images') or '').split('\n') if img.strip()], # Process images, ensure no empty strings
+            'highlights': [h.strip() for h in (request.form.get('highlights') or '').split('\n') if h.strip()], # Process highlights
+            'included': [i.strip() for i in (request.form.get('included') or '').split('\n') if i.strip()], # Process included
+            'meeting_point_details': request.form.get('meeting_point_details') or '',
+            'languages': [lang.strip() for lang in (request.form.get('languages') or '').split(',') if lang.strip()],
+            'paypal_link': request.form.get('paypal_link') or ''
+        }
+        
+        # Basic validation for new tour fields
+        if not new_tour['id'] or not new_tour['title'] or not new_tour['short_description']:
+            flash('Error: Tour ID, Title, and Short Description are required.')
+            return render_template('admin/add_tour.html', tour=new_tour) # Re-render with entered data
+
+        if load_tour(new_tour['id']) is not None:
+            flash(f"Error: A tour with ID '{new_tour['id']}' already exists.")
+            return render_template('admin/add_tour.html', tour=new_tour) # Re-render with entered data
+
+        try:
+            save_tour(new_tour)
+            static_export.refresh_tours([new_tour['id']])
+            cdn_cache.purge_tours([new_tour['id']])
+            flash('Tour added successfully!')
+            return redirect(url_for('admin.admin_tours'))
+        except Exception as e:
+            flash(f'Error saving tour: {e}')
+            return render_template('admin/add_tour.html', tour=new_tour) # Re-render with entered data
+
+    # Add meta tags for admin add tour page SEO (prevent indexing)
+    meta_tags = {
+        'title': 'Add New Tour - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/add_tour.html', meta_tags=meta_tags)
+
+@admin_required
+def admin_edit_tour(tour_id):
+    tour = load_tour_for_update(tour_id)
+
+    if not tour:
+        flash('Tour not found')
+        return redirect(url_for('admin.admin_tours'))
+
+    if request.method == 'POST':
+        tour['title'] = request.form.get('title') or tour.get('title', '')
+        tour['short_description'] = request.form.get('short_description') or tour.get('short_description', '')
+        tour['long_description'] = request.form.get('long_description') or tour.get('long_description', '')
+        tour['price'] = int(request.form.get('price') or tour.get('price', 0))
+        tour['duration'] = request.form.get('duration') or tour.get('duration', '')
+        tour['starting_point'] = request.form.get('starting_point') or tour.get('starting_point', '')
+        tour['schedule'] = [s.strip() for s in (request.form.get('schedule') or '').split('\n') if s.strip()]
+        tour['images'] = [img.strip() for img in (request.form.get('images') or '').split('\n') if img.strip()]
+        tour['highlights'] = [h.strip() for h in (request.form.get('highlights') or '').split('\n') if h.strip()]
+        tour['included'] = [i.strip() for i in (request.form.get('included') or '').split('\n') if i.strip()]
+        tour['meeting_point_details'] = request.form.get('meeting_point_details') or tour.get('meeting_point_details', '')
+        tour['languages'] = [lang.strip() for lang in (request.form.get('languages') or '').split(',') if lang.strip()]
+        tour['paypal_link'] = request.form.get('paypal_link') or ''
+        
+        # Basic validation for edited tour fields
+        if not tour['id'] or not tour['title'] or not tour['short_description']:
+            flash('Error: Tour ID, Title, and Short Description are required.')
+            return render_template('admin/edit_tour.html', tour=tour) # Re-render with edited data
+
+        try:
+            save_tour(tour)
+            static_export.refresh_tours([tour_id])
+            cdn_cache.purge_tours([tour_id])
+            flash('Tour updated successfully!')
+            return redirect(url_for('admin.admin_tours'))
+        except Exception as e:
+            flash(f'Error saving tour: {e}')
+            return render_template('admin/edit_tour.html', tour=tour) # Re-render with edited data
+
+    # Add meta tags for admin edit tour page SEO (prevent indexing)
+    meta_tags = {
+        'title': f"Edit Tour: {tour.get('title', 'Unknown Tour')} - Albania Walk Tours",
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/edit_tour.html', tour=tour, meta_tags=meta_tags)
+
+@admin_required
+def admin_delete_tour(tour_id):
+    try:
+        if not delete_tour(tour_id):
+            flash('Tour not found. No changes made.')
+            return redirect(url_for('admin.admin_tours'))
+
+        static_export.refresh_tours([tour_id])
+        cdn_cache.purge_tours([tour_id])
+        flash('Tour deleted successfully!')
+    except Exception as e:
+        flash(f'Error deleting tour: {e}')
+
+    return redirect(url_for('admin.admin_tours'))
+
+@admin_required
+def admin_manage_tour_dates(tour_id):
+    tour = load_tour_for_update(tour_id)
+
+    if not tour:
+        flash('Tour not found')
+        return redirect(url_for('admin.admin_tours'))
+    
+    # Initialize dates_data if it doesn't exist
+    if 'dates_data' not in tour:
+        tour['dates_data'] = []
+    
+    # Initialize min_booking if it doesn't exist
+    if 'min_booking' not in tour:
+        tour['min_booking'] = 2
+    
+    # Initialize booking_status if it doesn't exist
+    if 'booking_status' not in tour:
+        tour['booking_status'] = 'open'
+
+    if request.method == 'POST':
+        # Get minimum booking requirement
+        min_booking = int(request.form.get('min_booking', 2))
+        
+        # Get dates data as JSON
+        dates_data_str = request.form.get('dates_data', '[]')
+        try:
+            dates_data = json.loads(dates_data_str)
+        except:
+            dates_data = []
+        
+        # Recurrence rules (weekly patterns over date ranges, plus exclusions)
+        try:
+            date_rules = clean_date_rules(json.loads(request.form.get('date_rules', '{}')))
+        except (ValueError, TypeError, AttributeError):
+            date_rules = {}
+
+        # Update tour with new fields
+        tour['min_booking'] = min_booking
+        tour['dates_data'] = dates_data
+        tour['booking_status'] = request.form.get('booking_status', 'open')
+        if date_rules:
+            tour['date_rules'] = date_rules
+        else:
+            tour.pop('date_rules', None)
+        
+        # Keep backward compatibility with available_dates
+        tour['available_dates'] = [d['date'] for d in dates_data if d.get('enabled', True)]
+        
+        try:
+            save_tour(tour)
+            static_export.refresh_tours([tour_id])
+            cdn_cache.purge_tours([tour_id])
+            flash('Tour dates and booking settings updated successfully!')
+            return redirect(url_for('admin.admin_tours'))
+        except Exception as e:
+            flash(f'Error updating tour: {e}')
+
+    # Add meta tags for admin manage dates page SEO (prevent indexing)
+    meta_tags = {
+        'title': f"Manage Dates: {tour.get('title', 'Unknown Tour')} - Albania Walk Tours",
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/manage_dates.html', tour=tour, meta_tags=meta_tags)
+
+SEARCH_LIMIT = 200
+
+@admin_required
+def admin_bookings():
+    # ?q= lists search matches, best first, straight from the search index
+    query = request.args.get('q', '').strip()
+    if query:
+        import booking_search
+        bookings = booking_search.search(query, limit=SEARCH_LIMIT)
+    else:
+        bookings = booking_store.load_bookings()
+
+    # Add meta tags for admin bookings page SEO (prevent indexing)
+    meta_tags = {
+        'title': 'Admin Bookings Management - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/bookings.html', bookings=bookings, query=query, meta_tags=meta_tags)
+
+# Search bookings by name, email or phone (prefix or substring) or booking ID
+# prefix, from the search index only - bookings.json is not read
+@admin_required
+def admin_search_bookings():
+    import booking_search  # the index is only built once an admin searches
+
+    query = request.args.get('q', '').strip()
+    if len(query) < booking_search.MIN_QUERY:
+        return jsonify({'success': False, 'message': f'Enter at least {booking_search.MIN_QUERY} characters.'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), SEARCH_LIMIT)
+    except ValueError:
+        limit = 50
+    results = booking_search.search(query, limit=limit)
+    return jsonify({'success': True, 'query': query, 'count': len(results), 'results': results})
+
+@admin_required
+def admin_cookies():
+    store = consent_store.load_consents()
+
+    # Calculate statistics
+    counts = store.status_counts()
+    total = sum(counts.values())
+    accepted = counts.get('accepted', 0)
+    declined = counts.get('declined', 0)
+    acceptance_rate = round((accepted / total * 100) if total > 0 else 0, 1)
+
+    cookie_stats = {
+        'total': total,
+        'accepted': accepted,
+        'declined': declined,
+        'acceptance_rate': acceptance_rate
+    }
+
+    # Add meta tags for admin cookies page SEO (prevent indexing)
+    meta_tags = {
+        'title': 'Cookie Consent - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/cookies.html', 
+                         cookie_stats=cookie_stats, 
+                         cookie_records=store.expand(limit=50),  # Show last 50 records
+                         meta_tags=meta_tags)
+
+# All consent records as CSV, newest first
+@admin_required
+def admin_cookies_export():
+    import csv
+    import io
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=['timestamp', 'status', 'ip_address', 'user_agent', 'count'])
+    writer.writeheader()
+    writer.writerows(consent_store.load_consents().expand())
+    response = make_response(out.getvalue())
+    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+    response.headers['Content-Disposition'] = 'attachment; filename=cookie_consents.csv'
+    return response
+
+@admin_required
+def admin_delete_booking(booking_id):
+    try:
+        results = booking_store.delete_bookings([booking_id])
+
+        if results[0]['result'] == 'not_found':
+            flash('Booking not found. No changes made.')
+            return redirect(url_for('admin.admin_bookings'))
+
+        flash('Booking deleted successfully!')
+    except Exception as e:
+        flash(f'Error deleting booking: {e}')
+
+    return redirect(url_for('admin.admin_bookings'))
+
+PAYMENT_STATUSES = ('pending', 'paid')
+
+@admin_required
+def admin_update_payment_status(booking_id):
+    new_status = request.form.get('payment_status', 'pending')
+    if new_status not in PAYMENT_STATUSES:
+        flash(f'Invalid payment status: {new_status}')
+        return redirect(url_for('admin.admin_bookings'))
+
+    try:
+        results = booking_store.update_payment_statuses({booking_id: new_status})
+
+        if results[0]['result'] == 'not_found':
+            flash('Booking not found. Payment status not updated.')
+            return redirect(url_for('admin.admin_bookings'))
+
+        flash(f'Payment status updated to {new_status}!')
+    except Exception as e:
+        flash(f'Error updating payment status: {e}')
+
+    return redirect(url_for('admin.admin_bookings'))
+
+# Bulk actions report per-booking results: JSON for API clients, flash messages for the admin page
+def bulk_result_response(results, summary):
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': True, 'message': summary, 'results': results})
+    flash(summary)
+    missing = [r['booking_id'] for r in results if r['result'] == 'not_found']
+    if missing:
+        flash(f'Not found: {", ".join(b[:8] for b in missing)}')
+    return redirect(url_for('admin.admin_bookings'))
+
+def bulk_error_response(message):
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': False, 'message': message}), 400
+    flash(message)
+    return redirect(url_for('admin.admin_bookings'))
+
+@admin_required
+def admin_bulk_delete_bookings():
+    booking_ids = [b for b in request.form.getlist('booking_ids') if b]
+    if not booking_ids:
+        return bulk_error_response('No bookings selected.')
+
+    try:
+        results = booking_store.delete_bookings(booking_ids)
+    except Exception as e:
+        return bulk_error_response(f'Error deleting bookings: {e}')
+
+    deleted = sum(1 for r in results if r['result'] == 'deleted')
+    return bulk_result_response(results, f'{deleted} of {len(results)} bookings deleted.')
+
+@admin_required
+def admin_bulk_update_payment_status():
+    booking_ids = [b for b in request.form.getlist('booking_ids') if b]
+    new_status = request.form.get('payment_status', '')
+    if not booking_ids:
+        return bulk_error_response('No bookings selected.')
+    if new_status not in PAYMENT_STATUSES:
+        return bulk_error_response(f'Invalid payment status: {new_status}')
+
+    try:
+        results = booking_store.update_payment_statuses({b: new_status for b in booking_ids})
+    except Exception as e:
+        return bulk_error_response(f'Error updating payment status: {e}')
+
+    updated = sum(1 for r in results if r['result'] == 'updated')
+    unchanged = sum(1 for r in results if r['result'] == 'unchanged')
+    return bulk_result_response(results, f'{updated} bookings marked {new_status} ({unchanged} already {new_status}).')
+
+@admin_required
+def admin_reports():
+    import analytics  # only admins pay for building the booking columns
+
+    date_from = parse_date(request.args.get('from'))
+    date_to = parse_date(request.args.get('to'))
+    if date_from and date_to and date_to < date_from:
+        date_from, date_to = date_to, date_from
+    report = analytics.build_report(date_from, date_to)
+
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(dict(report, success=True))
+
+    meta_tags = {
+        'title': 'Reports - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/reports.html',
+                         report=report,
+                         date_from=date_from,
+                         date_to=date_to,
+                         meta_tags=meta_tags)
+
+@admin_required
+def admin_profiles():
+    if request.method == 'POST':
+        action = request.form.get('action', 'arm')
+        if action == 'disarm':
+            profiling.disarm()
+            flash('Profiling disarmed.')
+        else:
+            endpoint = request.form.get('endpoint', '').strip()
+            mode = request.form.get('mode', 'cprofile')
+            try:
+                count = max(1, min(int(request.form.get('count', 1)), 100))
+            except ValueError:
+                count = 1
+            if endpoint not in profileable_endpoints():
+                flash(f'Unknown endpoint: {endpoint}')
+            else:
+                profiling.arm(endpoint, count, mode)
+                flash(f'Profiling the next {count} requests to {endpoint} ({mode}).')
+        return redirect(url_for('admin.admin_profiles'))
+
+    meta_tags = {
+        'title': 'Request Profiles - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/profiles.html',
+                         profiles=profiling.list_profiles(),
+                         armed=profiling.armed_state(),
+                         endpoints=profileable_endpoints(),
+                         modes=profiling.MODES,
+                         header_name=profiling.HEADER,
+                         header_values={mode: profiling.sign_header(profiling.HEADER_SECRET, mode) for mode in profiling.MODES} if profiling.HEADER_SECRET else {},
+                         profile_dir=profiling.PROFILE_DIR,
+                         log_stats=app_logging.log_stats(),
+                         meta_tags=meta_tags)
+
+def profileable_endpoints():
+    return sorted({rule.endpoint for rule in current_app.url_map.iter_rules() if rule.endpoint != 'static'})
+
+@admin_required
+def admin_profile_view(filename):
+    path = profiling.profile_path(filename)
+    if path is None:
+        flash('Profile not found.')
+        return redirect(url_for('admin.admin_profiles'))
+
+    if request.args.get('download'):
+        return send_file(path, as_attachment=True, download_name=filename)
+
+    meta_tags = {
+        'title': 'Request Profile - Albania Walk Tours',
+        'robots': 'noindex, nofollow'
+    }
+    return render_template('admin/profile_detail.html',
+                         filename=filename,
+                         summary=profiling.render_profile(path),
+                         meta_tags=meta_tags)
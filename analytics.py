@@ -0,0 +1,353 @@
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+import gc
+from itertools import repeat
+import json
+from operator import add, itemgetter, mul
+import os
+import threading
+
+import booking_search
+import booking_store
+from booking_store import JOURNAL_FIELDS, JOURNAL_FILE, JOURNAL_FORMAT
+from catalog import load_summaries, load_tour
+from tour_search import parse_price
+
+# Booking analytics for /admin/reports.
+#
+# Each worker keeps a cube - bookings and people per (tour, date, status) -
+# fed from booking_store's booking journal (bookings.json.search), like the
+# search index: on each report it reads only the journal lines added since
+# the last one and adds new bookings to the cube, subtracts deleted ones and
+# moves bookings whose payment status changed. The whole journal is read only
+# when a worker starts or the journal was rebuilt, and the journal is rebuilt
+# from bookings.json when it is missing, older than the "pay" and "was"
+# lines, or behind bookings.json.
+#
+# A batch of journal records is folded into the cube through column arrays:
+#
+#   tour_codes    index into tour_ids
+#   ordinals      tour date (preferred_date_time) as a date ordinal, 0 if unknown
+#   people        number_of_people
+#   status_codes  index into statuses
+#
+# Building a column is a C-level pass (map/array over the records, with each
+# distinct string parsed only once). The three codes are then packed into one
+# integer key per booking, the keys counted with Counter and head counts summed
+# per key. Every report (per tour, date, month, occupancy, payment status) is a
+# pass over the cube, which has at most tours x dates x statuses entries
+# however many bookings there are. Prices and min_booking come from the catalog
+# at report time, so catalog edits never invalidate the cube.
+
+UNKNOWN_DATE = 0
+
+_TOUR, _DATE, _PEOPLE, _STATUS = map(JOURNAL_FIELDS.index, ('tour_id', 'preferred_date_time',
+                                                          'number_of_people', 'payment_status'))
+
+_state = {'cube': None}
+_cube_lock = threading.Lock()
+
+
+# Map each value to a dense code. Returns (distinct values, code array).
+def encode_column(values, typecode='I'):
+    table = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    return list(table), array(typecode, map(table.__getitem__, values))
+
+
+def _date_ordinal(value):
+    try:
+        return date.fromisoformat(str(value).strip()[:10]).toordinal()
+    except ValueError:
+        return UNKNOWN_DATE
+
+
+def _people(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 1
+
+
+# Columns of journal records (lists of JOURNAL_FIELDS values)
+class BookingColumns:
+    def __init__(self, records):
+        self.count = len(records)
+
+        self.tour_ids, self.tour_codes = encode_column(list(map(itemgetter(_TOUR), records)))
+
+        statuses = [s or 'pending' for s in map(itemgetter(_STATUS), records)]
+        self.statuses, self.status_codes = encode_column(statuses, 'B' if len(set(statuses)) < 256 else 'I')
+
+        raw_dates = list(map(itemgetter(_DATE), records))
+        ordinal_of = {value: _date_ordinal(value) for value in set(raw_dates)}
+        self.ordinals = array('i', map(ordinal_of.__getitem__, raw_dates))
+
+        raw_people = list(map(itemgetter(_PEOPLE), records))
+        people_of = {value: _people(value) for value in set(raw_people)}
+        self.people = array('I', map(people_of.__getitem__, raw_people))
+
+    # {(tour_code, ordinal, status_code): [bookings, people]}
+    def cube(self):
+        if not self.count:
+            return {}
+        date_values, date_codes = encode_column(self.ordinals)
+        status_base = len(self.statuses)
+        date_base = len(date_values)
+
+        # One integer per booking: (tour * statuses + status) * dates + date
+        keys = array('Q', map(add, map(mul, map(add, map(mul, self.tour_codes, repeat(status_base)),
+                                                    self.status_codes), repeat(date_base)), date_codes))
+        counts = Counter(keys)
+        people = dict.fromkeys(counts, 0)
+        for key, n in zip(keys, self.people):
+            people[key] += n
+
+        cube = {}
+        for key, bookings in counts.items():
+            rest, date_code = divmod(key, date_base)
+            tour_code, status_code = divmod(rest, status_base)
+            cube[(tour_code, date_values[date_code], status_code)] = [bookings, people[key]]
+        return cube
+
+
+def _code(codes, values, value):
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(values)
+        values.append(value)
+    return code
+
+
+class BookingCube:
+    def __init__(self):
+        self.tour_ids = []
+        self.statuses = []
+        self._tour_codes = {}
+        self._status_codes = {}
+        self.cells = {}        # (tour_code, ordinal, status_code) -> [bookings, people]
+        self.count = 0
+        self.format = None     # journal format, from its first line
+        self.version = None    # bookings.json version of the last journal line applied
+        self.inode = None
+        self.offset = 0
+
+    # Add (sign=1) or subtract (sign=-1) a batch of journal records
+    def apply(self, records, sign=1):
+        if not records:
+            return
+        columns = BookingColumns(records)
+        tour_codes = [_code(self._tour_codes, self.tour_ids, value) for value in columns.tour_ids]
+        status_codes = [_code(self._status_codes, self.statuses, value) for value in columns.statuses]
+        cells = self.cells
+        for (tour_code, ordinal, status_code), (bookings, people) in columns.cube().items():
+            key = (tour_codes[tour_code], ordinal, status_codes[status_code])
+            cell = cells.setdefault(key, [0, 0])
+            cell[0] += sign * bookings
+            cell[1] += sign * people
+            if not cell[0]:
+                del cells[key]
+        self.count += sign * columns.count
+
+    # Read journal lines appended since the last call, as
+    # booking_search.SearchIndex.follow does. Returns False if the journal
+    # was rebuilt since, so this cube is obsolete.
+    def follow(self, path):
+        with open(path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if self.inode is not None and inode != self.inode:
+                return False
+            self.inode = inode
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        with _gc_paused():
+            entries = json.loads('[' + b','.join(data[:end].splitlines()).decode() + ']')
+            if not self.offset and entries:
+                self.format = entries[0].get('format')
+            self.offset += end
+            if self.format == JOURNAL_FORMAT:
+                self._apply_entries(entries)
+        return True
+
+    def _apply_entries(self, entries):
+        added = []
+        removed = []
+        for entry in entries:
+            if 'add' in entry:
+                added.append(entry['add'])
+            elif 'del' in entry:
+                removed.append(entry['was'])
+            elif 'pay' in entry:
+                record = entry['pay']
+                added.append(record)
+                removed.append(record[:_STATUS] + [entry['was']] + record[_STATUS + 1:])
+            elif 'v' in entry:
+                self.version = entry['v']
+        # Additions first, so no cell is emptied by a booking added in this batch
+        self.apply(added)
+        self.apply(removed, -1)
+
+
+# A whole journal is a million small lists: without this the cyclic GC keeps
+# rescanning them while they are parsed and folded, which about doubles the
+# time a worker takes to load it
+@contextmanager
+def _gc_paused():
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
+# Catch a cube up with the journal. None when there is no journal.
+def _sync(cube):
+    try:
+        if cube is not None and cube.follow(JOURNAL_FILE):
+            return cube
+        cube = BookingCube()
+        cube.follow(JOURNAL_FILE)
+        return cube
+    except FileNotFoundError:
+        return None
+
+
+def _is_current(cube):
+    return (cube is not None and cube.format == JOURNAL_FORMAT
+            and cube.version == booking_store.bookings_version())
+
+
+# This worker's cube, brought up to date with the journal
+def booking_cube():
+    with _cube_lock:
+        cube = _sync(_state['cube'])
+        if not _is_current(cube):
+            # As in booking_search.current_index(): check again under the
+            # writers' lock before rebuilding the journal, and read the new
+            # journal after releasing it
+            with booking_store.bookings_lock():
+                cube = _sync(cube)
+                rebuild = not _is_current(cube)
+                if rebuild:
+                    booking_search.rebuild_journal()
+            if rebuild:
+                cube = _sync(None)
+        _state['cube'] = cube
+        return cube
+
+
+def _price_cents(tour):
+    price = parse_price((tour or {}).get('price'))
+    return None if price is None else int(round(price * 100))
+
+
+# Report rows are [bookings, people, paid_cents, pending_cents, unpriced_people]
+def _row():
+    return [0, 0, 0, 0, 0]
+
+
+def _merge(target, row):
+    for i, value in enumerate(row):
+        target[i] += value
+
+
+def _as_dict(row, **extra):
+    bookings, people, paid, pending, unpriced = row
+    return dict(extra, bookings=bookings, people=people, revenue_cents=paid + pending,
+                paid_cents=paid, pending_cents=pending, unpriced_people=unpriced)
+
+
+# Revenue, head count and occupancy reports for the current bookings,
+# optionally for tour dates in [date_from, date_to]. Bookings without a
+# readable date are only included when no range is given.
+def build_report(date_from=None, date_to=None):
+    return summarize(booking_cube(), date_from, date_to)
+
+
+def summarize(cube, date_from=None, date_to=None):
+    first = date_from.toordinal() if date_from else None
+    last = date_to.toordinal() if date_to else None
+    filtered = first is not None or last is not None
+
+    titles = {summary.get('id'): summary.get('title') for summary in load_summaries()}
+    tours = []
+    for tour_id in cube.tour_ids:
+        tour = load_tour(tour_id)
+        tours.append({
+            'id': tour_id,
+            'title': titles.get(tour_id) or tour_id or 'Unknown tour',
+            'price_cents': _price_cents(tour),
+            'min_booking': int((tour or {}).get('min_booking', 1) or 1),
+        })
+    prices = [tour['price_cents'] for tour in tours]
+    paid_code = cube.statuses.index('paid') if 'paid' in cube.statuses else -1
+
+    # A single pass over the cube into per-tour, per-status and per-date rows,
+    # and head counts per departure (tour and date)
+    by_tour = {}
+    by_status = {}
+    by_date = {}
+    departures = {}
+    for (tour_code, ordinal, status_code), (bookings, people) in cube.cells.items():
+        if filtered and (ordinal == UNKNOWN_DATE or (first is not None and ordinal < first)
+                         or (last is not None and ordinal > last)):
+            continue
+        price = prices[tour_code]
+        if price is None:
+            values = (bookings, people, 0, 0, people)
+        elif status_code == paid_code:
+            values = (bookings, people, price * people, 0, 0)
+        else:
+            values = (bookings, people, 0, price * people, 0)
+
+        for groups, key in ((by_tour, tour_code), (by_status, status_code), (by_date, ordinal)):
+            row = groups.get(key)
+            groups[key] = list(values) if row is None else list(map(add, row, values))
+        if ordinal != UNKNOWN_DATE:
+            departures[(tour_code, ordinal)] = departures.get((tour_code, ordinal), 0) + people
+
+    totals = _row()
+    for row in by_status.values():
+        _merge(totals, row)
+
+    by_month = {}
+    for ordinal, row in by_date.items():
+        if ordinal != UNKNOWN_DATE:
+            day = date.fromordinal(ordinal)
+            _merge(by_month.setdefault((day.year, day.month), _row()), row)
+
+    # Occupancy: each booked tour date is a departure; it runs when the group
+    # reaches the tour's min_booking
+    occupancy = {}
+    for (tour_code, ordinal), people in departures.items():
+        minimum = tours[tour_code]['min_booking']
+        occ = occupancy.setdefault(tour_code, [0, 0, 0, 0.0])  # departures, confirmed, people, fill
+        occ[0] += 1
+        occ[1] += people >= minimum
+        occ[2] += people
+        occ[3] += people / minimum
+
+    tour_rows = []
+    for tour_code, row in by_tour.items():
+        tour = tours[tour_code]
+        count, confirmed, people, fill = occupancy.get(tour_code, (0, 0, 0, 0.0))
+        tour_rows.append(_as_dict(row, tour_id=tour['id'], title=tour['title'], min_booking=tour['min_booking'],
+                                  departures=count, confirmed_departures=confirmed, below_minimum=count - confirmed,
+                                  average_group=round(people / count, 1) if count else 0,
+                                  fill_rate=round(100 * fill / count) if count else 0))
+    tour_rows.sort(key=lambda r: (-r['revenue_cents'], -r['people']))
+
+    return {
+        'bookings_total': cube.count,
+        'totals': _as_dict(totals),
+        'tours': tour_rows,
+        'statuses': sorted((_as_dict(row, status=cube.statuses[code]) for code, row in by_status.items()),
+                           key=lambda r: r['status']),
+        'months': [_as_dict(row, month='%04d-%02d' % month) for month, row in sorted(by_month.items())],
+        'dates': [_as_dict(row, date=date.fromordinal(ordinal).isoformat())
+                  for ordinal, row in sorted(by_date.items()) if ordinal != UNKNOWN_DATE],
+    }
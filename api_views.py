@@ -0,0 +1,136 @@
+from flask import request, jsonify, url_for, g, make_response
+from datetime import datetime
+import logging
+from ratelimit import client_ip, rate_limited
+import booking_schema
+from catalog import load_tour, tour_summary
+import consent_store
+import tour_search
+from tour_locales import localized_tour
+
+# Public JSON API views, registered on the "api" blueprint by app.create_app()
+
+logger = logging.getLogger(__name__)
+
+# Save cookie consent data
+def save_cookie_consent(consent_data):
+    try:
+        consent_store.record_consent(consent_data['status'], consent_data['ip_address'], consent_data['user_agent'])
+        return True
+    except Exception:
+        logger.exception('Error saving cookie consent', extra={'event': 'cookie_consent_save_failed'})
+        return False
+
+def consent_from_request():
+    data = request.get_json(silent=True)
+    return {
+        'status': consent_store.consent_status(data.get('status') if isinstance(data, dict) else None),
+        'ip_address': client_ip(),
+        'user_agent': request.headers.get('User-Agent', 'Unknown')
+    }
+
+@rate_limited('cookie_consent')
+def track_cookie_consent():
+    try:
+        consent_data = consent_from_request()
+        if save_cookie_consent(consent_data):
+            logger.info('Cookie consent recorded', extra={'event': 'cookie_consent', 'status': consent_data['status']})
+        return jsonify({'success': True})
+    except Exception:
+        logger.exception('Error tracking cookie consent', extra={'event': 'cookie_consent_failed'})
+        return jsonify({'success': False}), 500
+
+def search_tours():
+    args = request.args
+    errors = []
+
+    def number_arg(name):
+        value = args.get(name, '').strip()
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            errors.append(f'{name} must be a number')
+            return None
+
+    def date_arg(name):
+        value = args.get(name, '').strip()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            errors.append(f'{name} must be a date in YYYY-MM-DD format')
+            return None
+
+    # Multi-valued filters accept repeated params or comma-separated lists
+    def list_arg(name):
+        values = []
+        for value in args.getlist(name):
+            values.extend(v.strip() for v in value.split(',') if v.strip())
+        return values
+
+    durations = list_arg('duration')
+    for bucket in durations:
+        if bucket not in tour_search.DURATION_BUCKETS:
+            errors.append(f'duration must be one of: {", ".join(tour_search.DURATION_BUCKETS)}')
+            break
+
+    filters = {
+        'q': args.get('q', ''),
+        'languages': list_arg('language'),
+        'durations': durations,
+        'min_price': number_arg('min_price'),
+        'max_price': number_arg('max_price'),
+        'include_flexible_price': args.get('include_flexible', '1') != '0',
+        'min_hours': number_arg('min_hours'),
+        'max_hours': number_arg('max_hours'),
+        'date_from': date_arg('date_from'),
+        'date_to': date_arg('date_to'),
+    }
+
+    sort = args.get('sort', 'relevance' if filters['q'].strip() else 'catalog')
+    if sort not in ('catalog', 'relevance', 'price_asc', 'price_desc'):
+        errors.append('sort must be one of: catalog, relevance, price_asc, price_desc')
+
+    try:
+        limit = min(max(int(args.get('limit', 20)), 1), 100)
+        offset = max(int(args.get('offset', 0)), 0)
+    except ValueError:
+        errors.append('limit and offset must be integers')
+        limit, offset = 20, 0
+
+    if errors:
+        return jsonify({'success': False, 'message': '; '.join(errors)}), 400
+
+    index = tour_search.get_index()
+    positions, relevance = index.search(**filters)
+    ordered = tour_search.sort_results(index, positions, relevance, sort)
+
+    results = []
+    for pos in ordered[offset:offset + limit]:
+        tour = localized_tour(index.tours[pos]['id'], g.locale) or index.tours[pos]
+        summary = tour_summary(tour)
+        summary['booking_status'] = tour.get('booking_status', 'open')
+        summary['url'] = url_for('tour_detail', tour_id=summary['id'])
+        results.append(summary)
+
+    return jsonify({
+        'success': True,
+        'total': len(ordered),
+        'offset': offset,
+        'limit': limit,
+        'results': results
+    })
+
+# The rules /book validates against, for script.js to check the form first
+def tour_booking_schema(tour_id):
+    tour = load_tour(tour_id)
+    if tour is None:
+        return jsonify({'success': False, 'message': 'Tour not found'}), 404
+    schema = booking_schema.get_schema(tour)
+    response = make_response(schema.body)
+    response.headers['Content-Type'] = 'application/json'
+    response.set_etag(schema.etag)
+    return response.make_conditional(request)
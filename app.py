@@ -1,90 +1,49 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, make_response
-import json
+from flask import Flask, Blueprint, render_template, request, jsonify, redirect, url_for, make_response, g, has_request_context
+from werkzeug.utils import cached_property, import_string
 import os
 from datetime import datetime
 import uuid
-
-app = Flask(__name__)
-app.secret_key = os.environ.get('SESSION_SECRET', 'TiTirana')
-
-
-
-# Admin credentials (from environment variables for security)
-ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'TiTirana')
-ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'TiTirana')
-
-# Load tour data
-def load_tours():
-    try:
-        with open('tours.json', 'r') as f:
-            tours = json.load(f)
-            return tours
-    except FileNotFoundError:
-        return []
+import logging
+from ratelimit import rate_limited
+from catalog import load_summaries, load_tour
+import booking_store
+import booking_schema
+from tour_dates import get_schedule
+from tour_locales import requested_locale, select_locale, localized_summaries, localized_tour, text_direction
+import profiling
+import io_audit
+import app_logging
+import maintenance
+import static_export
+import cdn_cache
+
+logger = logging.getLogger(__name__)
 
 # Save booking data
 def save_booking(booking_data):
     try:
-        # Load existing bookings
-        if os.path.exists('bookings.json'):
-            with open('bookings.json', 'r') as f:
-                bookings = json.load(f)
-        else:
-            bookings = []
-
-        # Add new booking
-        bookings.append(booking_data)
-
-        # Save back to file
-        with open('bookings.json', 'w') as f:
-            json.dump(bookings, f, indent=2)
-
+        # Append under the bookings lock so concurrent workers don't lose records
+        booking_store.append_booking(booking_data)
         return True
-    except Exception as e:
-        print(f"Error saving booking: {e}")
+    except Exception:
+        logger.exception('Error saving booking', extra={'event': 'booking_save_failed', 'booking_id': booking_data.get('booking_id')})
         return False
 
-# Save cookie consent data
-def save_cookie_consent(consent_data):
-    try:
-        # Load existing consent records
-        if os.path.exists('cookie_consents.json'):
-            with open('cookie_consents.json', 'r') as f:
-                consents = json.load(f)
-        else:
-            consents = []
-
-        # Add new consent record
-        consents.append(consent_data)
-
-        # Save back to file
-        with open('cookie_consents.json', 'w') as f:
-            json.dump(consents, f, indent=2)
-
-        return True
-    except Exception as e:
-        print(f"Error saving cookie consent: {e}")
-        return False
-
-# WhatsApp notification function
-def send_whatsapp_notification(booking_data, tour):
-    try:
-        # Check if Twilio credentials are available
-        twilio_account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
-        twilio_auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
-        twilio_whatsapp_from = os.environ.get('TWILIO_WHATSAPP_FROM')
-        admin_whatsapp = os.environ.get('ADMIN_WHATSAPP_NUMBER')
-
-        if not all([twilio_account_sid, twilio_auth_token, twilio_whatsapp_from, admin_whatsapp]):
-            print("WhatsApp notification skipped: Twilio credentials not configured")
-            return False
-
-        from twilio.rest import Client
-
-        client = Client(twilio_account_sid, twilio_auth_token)
+# Twilio credentials and numbers, or None (logged) when not configured
+def twilio_settings():
+    settings = {
+        'account_sid': os.environ.get('TWILIO_ACCOUNT_SID'),
+        'auth_token': os.environ.get('TWILIO_AUTH_TOKEN'),
+        'whatsapp_from': os.environ.get('TWILIO_WHATSAPP_FROM'),
+        'admin_whatsapp': os.environ.get('ADMIN_WHATSAPP_NUMBER'),
+    }
+    if not all(settings.values()):
+        logger.info('WhatsApp notification skipped: Twilio credentials not configured', extra={'event': 'whatsapp_skipped'})
+        return None
+    return settings
 
-        # Format the message
-        message_body = f"""
+def whatsapp_message(booking_data, tour):
+    return f"""
 🎉 New Tour Booking!
 
 Tour: {tour['title'] if tour else 'Unknown'}
@@ -99,23 +58,69 @@ Special Requests: {booking_data.get('special_requests', 'None')}
 Booking ID: {booking_data['booking_id']}
         """.strip()
 
+# WhatsApp notification function
+def send_whatsapp_notification(booking_data, tour):
+    try:
+        # Check if Twilio credentials are available
+        settings = twilio_settings()
+        if settings is None:
+            return False
+
+        # Twilio is imported on the first notification, not at worker boot
+        try:
+            from twilio.rest import Client
+        except ImportError:
+            logger.error('WhatsApp notification failed: twilio is not installed', extra={'event': 'whatsapp_failed', 'booking_id': booking_data.get('booking_id')})
+            return False
+
+        client = Client(settings['account_sid'], settings['auth_token'])
+
         # Send WhatsApp message
         message = client.messages.create(
-            from_=f'whatsapp:{twilio_whatsapp_from}',
-            body=message_body,
-            to=f'whatsapp:{admin_whatsapp}'
+            from_=f"whatsapp:{settings['whatsapp_from']}",
+            body=whatsapp_message(booking_data, tour),
+            to=f"whatsapp:{settings['admin_whatsapp']}"
         )
 
-        print(f"WhatsApp notification sent successfully: {message.sid}")
+        logger.info('WhatsApp notification sent', extra={'event': 'whatsapp_sent', 'message_sid': message.sid, 'booking_id': booking_data.get('booking_id')})
         return True
 
-    except Exception as e:
-        print(f"Error sending WhatsApp notification: {e}")
+    except Exception:
+        logger.exception('Error sending WhatsApp notification', extra={'event': 'whatsapp_failed', 'booking_id': booking_data.get('booking_id')})
         return False
 
-@app.route('/')
+# PayPal payment link - use tour-specific link if available, otherwise use default
+def payment_url_for(tour):
+    if tour and tour.get('paypal_link'):
+        return tour['paypal_link']
+    return os.environ.get('PAYPAL_PAYMENT_URL', 'https://www.paypal.com/ncp/payment/Q3PQ3TCYUA7L4')
+
+# Locale for tour content, from ?lang= or Accept-Language
+def set_locale():
+    g.locale = select_locale()
+    g.text_direction = text_direction(g.locale)
+
+# Public pages rendered in the visitor's locale
+LOCALIZED_ENDPOINTS = ('index', 'tour_detail', 'about', 'booking_confirmation')
+
+# Links from one localized page to another keep the ?lang= it was opened with
+def add_locale_to_urls(endpoint, values):
+    if endpoint not in LOCALIZED_ENDPOINTS or 'lang' in values or not has_request_context():
+        return
+    if request.endpoint in LOCALIZED_ENDPOINTS:
+        locale = requested_locale()
+        if locale:
+            values['lang'] = locale
+
+# Pages vary by locale, so tell browsers and caches which header picked it
+def add_locale_headers(response):
+    if not request.path.startswith('/admin') and getattr(g, 'locale', None):
+        response.headers['Content-Language'] = g.locale
+        response.vary.add('Accept-Language')
+    return response
+
 def index():
-    tours = load_tours()
+    tours = localized_summaries(g.locale)
     # Add meta tags for SEO
     meta_tags = {
         'title': 'Albania Walk Tours - Discover Albania with Us!',
@@ -124,10 +129,8 @@ def index():
     }
     return render_template('index.html', tours=tours, meta_tags=meta_tags)
 
-@app.route('/tour/<tour_id>')
 def tour_detail(tour_id):
-    tours = load_tours()
-    tour = next((t for t in tours if t['id'] == tour_id), None)
+    tour = localized_tour(tour_id, g.locale)
     if not tour:
         return redirect(url_for('index'))
     
@@ -137,9 +140,11 @@ def tour_detail(tour_id):
         'description': tour.get('short_description', 'Discover this amazing tour in Albania.'),
         'keywords': f"Albania tour, {tour.get('title', '')}, guided tour, {tour.get('id', '')}"
     }
-    return render_template('tour_detail.html', tour=tour, meta_tags=meta_tags)
+    # Bounded list of upcoming dates for the booking form
+    schedule = get_schedule(tour)
+    date_options = schedule.window() if schedule.has_rules else None
+    return render_template('tour_detail.html', tour=tour, date_options=date_options, meta_tags=meta_tags)
 
-@app.route('/about')
 def about():
     # Add meta tags for about page SEO
     meta_tags = {
@@ -149,530 +154,89 @@ def about():
     }
     return render_template('about.html', meta_tags=meta_tags)
 
-@app.route('/booking/<booking_id>')
 def booking_confirmation(booking_id):
     try:
-        with open('bookings.json', 'r') as f:
-            bookings = json.load(f)
-
-        booking = next((b for b in bookings if b['booking_id'] == booking_id), None)
+        booking = booking_store.find_booking(booking_id)
 
         if not booking:
             return render_template('booking_not_found.html'), 404
 
         # Get tour details
-        tours = load_tours()
-        tour = next((t for t in tours if t['id'] == booking.get('tour_id')), None)
-
-        # Get payment URL - use tour-specific link if available, otherwise use default
-        payment_url = ''
-        if tour and tour.get('paypal_link'):
-            payment_url = tour['paypal_link']
-        else:
-            payment_url = os.environ.get('PAYPAL_PAYMENT_URL', 'https://www.paypal.com/ncp/payment/Q3PQ3TCYUA7L4')
-        
-        # Add meta tags for booking confirmation page SEO
-        meta_tags = {
-            'title': f'Booking Confirmation - {booking.get("booking_id", "")}',
-            'description': f'Your booking for {tour.get("title", "a tour")} is confirmed. Please proceed to payment.',
-            'keywords': 'booking confirmation, tour booking, payment, Albania tours'
-        }
-
-        return render_template('booking_confirmation.html', 
-                             booking=booking, 
-                             tour=tour,
-                             payment_url=payment_url,
-                             meta_tags=meta_tags)
+        tour = localized_tour(booking.get('tour_id'), g.locale)
+        return render_confirmation(booking, tour)
     except FileNotFoundError:
         return render_template('booking_not_found.html'), 404
 
-@app.route('/api/cookie-consent', methods=['POST'])
-def track_cookie_consent():
-    try:
-        consent_data = {
-            'timestamp': datetime.now().isoformat(),
-            'status': request.json.get('status', 'unknown'),
-            'ip_address': request.headers.get('X-Forwarded-For', request.remote_addr),
-            'user_agent': request.headers.get('User-Agent', 'Unknown')
-        }
-        
-        save_cookie_consent(consent_data)
-        return jsonify({'success': True})
-    except Exception as e:
-        print(f"Error tracking cookie consent: {e}")
-        return jsonify({'success': False}), 500
-
-@app.route('/book', methods=['POST'])
-def book_tour():
-    # Validation
-    required_fields = ['tour_id', 'user_name', 'user_email', 'user_phone', 'preferred_date_time', 'number_of_people']
-    errors = []
-
-    # Check required fields
-    for field in required_fields:
-        if not request.form.get(field) or not str(request.form.get(field)).strip():
-            errors.append(f'{field.replace("_", " ").title()} is required')
-
-    # Email validation
-    import re
-    email = request.form.get('user_email', '').strip()
-    if email and not re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', email):
-        errors.append('Please enter a valid email address')
-
-    # Number of people validation
-    try:
-        num_people = int(request.form.get('number_of_people', 0))
-        if num_people < 1 or num_people > 20:
-            errors.append('Number of people must be between 1 and 20')
-    except (ValueError, TypeError):
-        errors.append('Number of people must be a valid number')
-        num_people = 1
-
-    # Tour exists validation
-    tours = load_tours()
-    tour_id = request.form.get('tour_id')
-    tour = next((t for t in tours if t['id'] == tour_id), None)
-    
-    if not tour:
-        errors.append('Invalid tour selected')
-    else:
-        # Check minimum booking requirement
-        min_booking = tour.get('min_booking', 1)
-        if num_people < min_booking:
-            errors.append(f'Minimum booking requirement is {min_booking} people')
-        
-        # Check if booking is open
-        booking_status = tour.get('booking_status', 'open')
-        if booking_status != 'open':
-            errors.append('Booking is currently closed for this tour')
-        
-        # Check if selected date is available and enabled
-        preferred_date = request.form.get('preferred_date_time', '').strip()
-        dates_data = tour.get('dates_data', [])
-        
-        if dates_data and preferred_date:
-            date_only = preferred_date.split('T')[0] if 'T' in preferred_date else preferred_date.split(' ')[0]
-            # Check if date exists and is enabled
-            date_found = False
-            date_enabled = False
-            for date_obj in dates_data:
-                if date_obj.get('date') == date_only:
-                    date_found = True
-                    date_enabled = date_obj.get('enabled', True)
-                    break
-            
-            if not date_found:
-                errors.append('Selected date is not available for booking')
-            elif not date_enabled:
-                errors.append('Selected date is currently disabled. Please choose another date')
-        elif tour.get('available_dates') and preferred_date:
-            # Backward compatibility check
-            date_only = preferred_date.split('T')[0] if 'T' in preferred_date else preferred_date.split(' ')[0]
-            if date_only not in tour.get('available_dates', []):
-                errors.append('Selected date is not available for booking')
-
-    if errors:
-        return jsonify({'success': False, 'message': '; '.join(errors)})
-
-    booking_data = {
-        'booking_id': str(uuid.uuid4()),
-        'tour_id': tour_id,
-        'user_name': (request.form.get('user_name') or '').strip(),
-        'user_email': email,
-        'user_phone': (request.form.get('user_phone') or '').strip(),
-        'number_of_people': num_people,
-        'preferred_date_time': (request.form.get('preferred_date_time') or '').strip(),
-        'special_requests': (request.form.get('special_requests') or '').strip(),
-        'booking_time': datetime.now().isoformat(),
-        'payment_status': 'pending'
-    }
-
-    if save_booking(booking_data):
-        # Get tour details for the notification
-        tour = next((t for t in tours if t['id'] == tour_id), None)
-
-        # Send WhatsApp notification (requires Twilio credentials)
-        send_whatsapp_notification(booking_data, tour)
-
-        # PayPal payment link - use tour-specific link if available, otherwise use default
-        payment_url = ''
-        if tour and tour.get('paypal_link'):
-            payment_url = tour['paypal_link']
-        else:
-            payment_url = os.environ.get('PAYPAL_PAYMENT_URL', 'https://www.paypal.com/ncp/payment/Q3PQ3TCYUA7L4')
-
-        return jsonify({
-            'success': True, 
-            'message': 'Booking successful! Redirecting to payment...',
-            'payment_url': payment_url,
-            'booking_id': booking_data['booking_id']
-        })
-    else:
-        return jsonify({'success': False, 'message': 'Booking failed due to server error. Please try again or contact us directly.'})
-
-# Admin login decorator
-def admin_required(f):
-    def wrapper(*args, **kwargs):
-        if not session.get('admin_logged_in'):
-            return redirect(url_for('admin_login'))
-        return f(*args, **kwargs)
-    wrapper.__name__ = f.__name__
-    return wrapper
-
-@app.route('/admin/login', methods=['GET', 'POST'])
-def admin_login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-
-        if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
-            session['admin_logged_in'] = True
-            return redirect(url_for('admin_dashboard'))
-        else:
-            flash('Invalid credentials')
-
-    # Add meta tags for admin login page SEO (though typically not indexed)
+def render_confirmation(booking, tour):
+    # Add meta tags for booking confirmation page SEO
     meta_tags = {
-        'title': 'Admin Login - Albania Walk Tours',
-        'description': 'Administrator login page for Albania Walk Tours.',
-        'robots': 'noindex, nofollow' # Prevent indexing of login page
+        'title': f'Booking Confirmation - {booking.get("booking_id", "")}',
+        'description': f'Your booking for {tour.get("title", "a tour")} is confirmed. Please proceed to payment.',
+        'keywords': 'booking confirmation, tour booking, payment, Albania tours'
     }
-    return render_template('admin/login.html', meta_tags=meta_tags)
 
-@app.route('/admin/logout')
-def admin_logout():
-    session.pop('admin_logged_in', None)
-    return redirect(url_for('admin_login'))
-
-@app.route('/admin')
-@admin_required
-def admin_dashboard():
-    tours = load_tours()
-
-    # Load bookings
-    try:
-        with open('bookings.json', 'r') as f:
-            bookings = json.load(f)
-    except FileNotFoundError:
-        bookings = []
-
-    # Calculate recent bookings (last 7 days)
-    from datetime import datetime, timedelta
-    week_ago = datetime.now() - timedelta(days=7)
-    recent_bookings_count = 0
-
-    for booking in bookings:
-        if 'booking_time' in booking:
-            try:
-                booking_date = datetime.fromisoformat(booking['booking_time'].replace('Z', '+00:00'))
-                if booking_date >= week_ago:
-                    recent_bookings_count += 1
-            except (ValueError, TypeError):
-                continue
-
-    # Add meta tags for admin dashboard SEO (prevent indexing)
-    meta_tags = {
-        'title': 'Admin Dashboard - Albania Walk Tours',
-        'robots': 'noindex, nofollow'
-    }
-    return render_template('admin/dashboard.html', 
-                         tours=tours, 
-                         bookings=bookings, 
-                         recent_bookings_count=recent_bookings_count,
+    return render_template('booking_confirmation.html', 
+                         booking=booking, 
+                         tour=tour,
+                         payment_url=payment_url_for(tour),
                          meta_tags=meta_tags)
 
-@app.route('/admin/tours')
-@admin_required
-def admin_tours():
-    tours = load_tours()
-    # Add meta tags for admin tours page SEO (prevent indexing)
-    meta_tags = {
-        'title': 'Admin Tours Management - Albania Walk Tours',
-        'robots': 'noindex, nofollow'
-    }
-    return render_template('admin/tours.html', tours=tours, meta_tags=meta_tags)
-
-@app.route('/admin/tours/add', methods=['GET', 'POST'])
-@admin_required
-def admin_add_tour():
-    if request.method == 'POST':
-        tours = load_tours()
-
-        new_tour = {
-            'id': request.form.get('id') or '',
-            'title': request.form.get('title') or '',
-            'short_description': request.form.get('short_description') or '',
-            'long_description': request.form.get('long_description') or '',
-            'price': int(request.form.get('price') or 0),
-            'duration': request.form.get('duration') or '',
-            'starting_point': request.form.get('starting_point') or '',
-            'schedule': (request.form.get('schedule') or '').split('\n'),
-            'images': [img.strip() for img in (request.form.get('images') or '').split('\n') if img.strip()], # Process images, ensure no empty strings
-            'highlights': [h.strip() for h in (request.form.get('highlights') or '').split('\n') if h.strip()], # Process highlights
-            'included': [i.strip() for i in (request.form.get('included') or '').split('\n') if i.strip()], # Process included
-            'meeting_point_details': request.form.get('meeting_point_details') or '',
-            'languages': [lang.strip() for lang in (request.form.get('languages') or '').split(',') if lang.strip()],
-            'paypal_link': request.form.get('paypal_link') or ''
-        }
-        
-        # Basic validation for new tour fields
-        if not new_tour['id'] or not new_tour['title'] or not new_tour['short_description']:
-            flash('Error: Tour ID, Title, and Short Description are required.')
-            return render_template('admin/add_tour.html', tour=new_tour) # Re-render with entered data
+# The tour a /book form is for, and what is wrong with the form. Validation
+# uses the same schema script.js checks the form against.
+def validate_booking(form):
+    tour = load_tour(form.get('tour_id'))
+    return tour, booking_schema.get_schema(tour).validate(form)
 
-        tours.append(new_tour)
-
-        try:
-            with open('tours.json', 'w') as f:
-                json.dump(tours, f, indent=2)
-            flash('Tour added successfully!')
-            return redirect(url_for('admin_tours'))
-        except Exception as e:
-            flash(f'Error saving tour: {e}')
-            return render_template('admin/add_tour.html', tour=new_tour) # Re-render with entered data
-
-    # Add meta tags for admin add tour page SEO (prevent indexing)
-    meta_tags = {
-        'title': 'Add New Tour - Albania Walk Tours',
-        'robots': 'noindex, nofollow'
-    }
-    return render_template('admin/add_tour.html', meta_tags=meta_tags)
-
-@app.route('/admin/tours/edit/<tour_id>', methods=['GET', 'POST'])
-@admin_required
-def admin_edit_tour(tour_id):
-    tours = load_tours()
-    tour = next((t for t in tours if t['id'] == tour_id), None)
-
-    if not tour:
-        flash('Tour not found')
-        return redirect(url_for('admin_tours'))
-
-    if request.method == 'POST':
-        tour['title'] = request.form.get('title') or tour.get('title', '')
-        tour['short_description'] = request.form.get('short_description') or tour.get('short_description', '')
-        tour['long_description'] = request.form.get('long_description') or tour.get('long_description', '')
-        tour['price'] = int(request.form.get('price') or tour.get('price', 0))
-        tour['duration'] = request.form.get('duration') or tour.get('duration', '')
-        tour['starting_point'] = request.form.get('starting_point') or tour.get('starting_point', '')
-        tour['schedule'] = [s.strip() for s in (request.form.get('schedule') or '').split('\n') if s.strip()]
-        tour['images'] = [img.strip() for img in (request.form.get('images') or '').split('\n') if img.strip()]
-        tour['highlights'] = [h.strip() for h in (request.form.get('highlights') or '').split('\n') if h.strip()]
-        tour['included'] = [i.strip() for i in (request.form.get('included') or '').split('\n') if i.strip()]
-        tour['meeting_point_details'] = request.form.get('meeting_point_details') or tour.get('meeting_point_details', '')
-        tour['languages'] = [lang.strip() for lang in (request.form.get('languages') or '').split(',') if lang.strip()]
-        tour['paypal_link'] = request.form.get('paypal_link') or ''
-        
-        # Basic validation for edited tour fields
-        if not tour['id'] or not tour['title'] or not tour['short_description']:
-            flash('Error: Tour ID, Title, and Short Description are required.')
-            return render_template('admin/edit_tour.html', tour=tour) # Re-render with edited data
-
-        try:
-            with open('tours.json', 'w') as f:
-                json.dump(tours, f, indent=2)
-            flash('Tour updated successfully!')
-            return redirect(url_for('admin_tours'))
-        except Exception as e:
-            flash(f'Error saving tour: {e}')
-            return render_template('admin/edit_tour.html', tour=tour) # Re-render with edited data
-
-    # Add meta tags for admin edit tour page SEO (prevent indexing)
-    meta_tags = {
-        'title': f"Edit Tour: {tour.get('title', 'Unknown Tour')} - Albania Walk Tours",
-        'robots': 'noindex, nofollow'
-    }
-    return render_template('admin/edit_tour.html', tour=tour, meta_tags=meta_tags)
-
-@app.route('/admin/tours/delete/<tour_id>', methods=['POST'])
-@admin_required
-def admin_delete_tour(tour_id):
-    tours = load_tours()
-    initial_tour_count = len(tours)
-    tours = [t for t in tours if t['id'] != tour_id]
-    
-    if len(tours) == initial_tour_count:
-        flash('Tour not found. No changes made.')
-        return redirect(url_for('admin_tours'))
-
-    try:
-        with open('tours.json', 'w') as f:
-            json.dump(tours, f, indent=2)
-        flash('Tour deleted successfully!')
-    except Exception as e:
-        flash(f'Error deleting tour: {e}')
-
-    return redirect(url_for('admin_tours'))
-
-@app.route('/admin/tours/manage-dates/<tour_id>', methods=['GET', 'POST'])
-@admin_required
-def admin_manage_tour_dates(tour_id):
-    tours = load_tours()
-    tour = next((t for t in tours if t['id'] == tour_id), None)
-
-    if not tour:
-        flash('Tour not found')
-        return redirect(url_for('admin_tours'))
-    
-    # Initialize dates_data if it doesn't exist
-    if 'dates_data' not in tour:
-        tour['dates_data'] = []
-    
-    # Initialize min_booking if it doesn't exist
-    if 'min_booking' not in tour:
-        tour['min_booking'] = 2
-    
-    # Initialize booking_status if it doesn't exist
-    if 'booking_status' not in tour:
-        tour['booking_status'] = 'open'
-
-    if request.method == 'POST':
-        # Get minimum booking requirement
-        min_booking = int(request.form.get('min_booking', 2))
-        
-        # Get dates data as JSON
-        dates_data_str = request.form.get('dates_data', '[]')
-        try:
-            dates_data = json.loads(dates_data_str)
-        except:
-            dates_data = []
-        
-        # Update tour with new fields
-        tour['min_booking'] = min_booking
-        tour['dates_data'] = dates_data
-        tour['booking_status'] = request.form.get('booking_status', 'open')
-        
-        # Keep backward compatibility with available_dates
-        tour['available_dates'] = [d['date'] for d in dates_data if d.get('enabled', True)]
-        
-        try:
-            with open('tours.json', 'w') as f:
-                json.dump(tours, f, indent=2)
-            flash('Tour dates and booking settings updated successfully!')
-            return redirect(url_for('admin_tours'))
-        except Exception as e:
-            flash(f'Error updating tour: {e}')
-
-    # Add meta tags for admin manage dates page SEO (prevent indexing)
-    meta_tags = {
-        'title': f"Manage Dates: {tour.get('title', 'Unknown Tour')} - Albania Walk Tours",
-        'robots': 'noindex, nofollow'
-    }
-    return render_template('admin/manage_dates.html', tour=tour, meta_tags=meta_tags)
-
-@app.route('/admin/bookings')
-@admin_required
-def admin_bookings():
-    try:
-        with open('bookings.json', 'r') as f:
-            bookings = json.load(f)
-    except FileNotFoundError:
-        bookings = []
-
-    # Add meta tags for admin bookings page SEO (prevent indexing)
-    meta_tags = {
-        'title': 'Admin Bookings Management - Albania Walk Tours',
-        'robots': 'noindex, nofollow'
-    }
-    return render_template('admin/bookings.html', bookings=bookings, meta_tags=meta_tags)
-
-@app.route('/admin/cookies')
-@admin_required
-def admin_cookies():
-    try:
-        with open('cookie_consents.json', 'r') as f:
-            cookie_records = json.load(f)
-    except FileNotFoundError:
-        cookie_records = []
-
-    # Calculate statistics
-    total = len(cookie_records)
-    accepted = sum(1 for r in cookie_records if r.get('status') == 'accepted')
-    declined = sum(1 for r in cookie_records if r.get('status') == 'declined')
-    acceptance_rate = round((accepted / total * 100) if total > 0 else 0, 1)
-
-    cookie_stats = {
-        'total': total,
-        'accepted': accepted,
-        'declined': declined,
-        'acceptance_rate': acceptance_rate
-    }
-
-    # Sort records by timestamp (most recent first)
-    cookie_records.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-
-    # Add meta tags for admin cookies page SEO (prevent indexing)
-    meta_tags = {
-        'title': 'Cookie Consent - Albania Walk Tours',
-        'robots': 'noindex, nofollow'
+# Booking record for a /book form that passed validation
+def booking_from_form(form):
+    return {
+        'booking_id': str(uuid.uuid4()),
+        'tour_id': form.get('tour_id'),
+        'user_name': (form.get('user_name') or '').strip(),
+        'user_email': form.get('user_email', '').strip(),
+        'user_phone': (form.get('user_phone') or '').strip(),
+        'number_of_people': int(form['number_of_people']),
+        'preferred_date_time': (form.get('preferred_date_time') or '').strip(),
+        'special_requests': (form.get('special_requests') or '').strip(),
+        'booking_time': datetime.now().isoformat(),
+        'payment_status': 'pending'
     }
-    return render_template('admin/cookies.html', 
-                         cookie_stats=cookie_stats, 
-                         cookie_records=cookie_records[:50],  # Show last 50 records
-                         meta_tags=meta_tags)
-
-@app.route('/admin/bookings/delete/<booking_id>', methods=['POST'])
-@admin_required
-def admin_delete_booking(booking_id):
-    try:
-        with open('bookings.json', 'r') as f:
-            bookings = json.load(f)
-
-        initial_booking_count = len(bookings)
-        bookings = [b for b in bookings if b['booking_id'] != booking_id]
 
-        if len(bookings) == initial_booking_count:
-            flash('Booking not found. No changes made.')
-            return redirect(url_for('admin_bookings'))
+def booking_errors_response(errors):
+    return jsonify({'success': False, 'message': '; '.join(errors)})
 
-        with open('bookings.json', 'w') as f:
-            json.dump(bookings, f, indent=2)
-
-        flash('Booking deleted successfully!')
-    except FileNotFoundError:
-        flash('No bookings found')
-    except Exception as e:
-        flash(f'Error deleting booking: {e}')
-
-    return redirect(url_for('admin_bookings'))
-
-@app.route('/admin/bookings/update-payment/<booking_id>', methods=['POST'])
-@admin_required
-def admin_update_payment_status(booking_id):
-    try:
-        with open('bookings.json', 'r') as f:
-            bookings = json.load(f)
+def booking_created_response(booking_data, tour):
+    return jsonify({
+        'success': True, 
+        'message': 'Booking successful! Redirecting to payment...',
+        'payment_url': payment_url_for(tour),
+        'booking_id': booking_data['booking_id']
+    })
 
-        new_status = request.form.get('payment_status', 'pending')
+def booking_failed_response():
+    return jsonify({'success': False, 'message': 'Booking failed due to server error. Please try again or contact us directly.'})
 
-        booking_found = False
-        for booking in bookings:
-            if booking['booking_id'] == booking_id:
-                booking['payment_status'] = new_status
-                booking_found = True
-                break
+@rate_limited('book')
+def book_tour():
+    tour, errors = validate_booking(request.form)
+    if errors:
+        return booking_errors_response(errors)
 
-        if not booking_found:
-            flash('Booking not found. Payment status not updated.')
-            return redirect(url_for('admin_bookings'))
+    booking_data = booking_from_form(request.form)
+    if not save_booking(booking_data):
+        return booking_failed_response()
 
-        with open('bookings.json', 'w') as f:
-            json.dump(bookings, f, indent=2)
+    logger.info('Booking created', extra={'event': 'booking_created', 'booking_id': booking_data['booking_id'], 'tour_id': booking_data['tour_id']})
 
-        flash(f'Payment status updated to {new_status}!')
-    except FileNotFoundError:
-        flash('Booking data not found. Payment status not updated.')
-    except Exception as e:
-        flash(f'Error updating payment status: {e}')
-
-    return redirect(url_for('admin_bookings'))
+    # Send WhatsApp notification (requires Twilio credentials)
+    send_whatsapp_notification(booking_data, tour)
+    return booking_created_response(booking_data, tour)
 
 # --- SEO Related Routes ---
 
-@app.route('/sitemap.xml')
 def sitemap():
     # Fetch all tours
-    tours = load_tours()
+    tours = load_summaries()
     
     # Generate URLs
     urls = [
@@ -690,7 +254,7 @@ def sitemap():
         xml_content += f"""
   <url>
     <loc>{url}</loc>
-    <lastmod>{datetime.now().strftime('%Y-%m-%dT%H:%M:%S+00:00')}</lastmod>
+    <lastmod>{datetime.now().strftime('%Y-%m-%d')}</lastmod>
     <changefreq>weekly</changefreq>
     <priority>0.8</priority>
   </url>
@@ -701,7 +265,6 @@ def sitemap():
     response.headers['Content-Type'] = 'application/xml'
     return response
 
-@app.route('/robots.txt')
 def robots_txt():
     # Define robots.txt content
     robots_content = """User-agent: *
@@ -717,435 +280,90 @@ Disallow: /admin/
     response.headers['Content-Type'] = 'text/plain'
     return response
 
-if __name__ == '__main__':
-    # Create dummy files if they don't exist
-    if not os.path.exists('tours.json'):
-        with open('tours.json', 'w') as f:
-            json.dump([], f)
-    if not os.path.exists('bookings.json'):
-        with open('bookings.json', 'w') as f:
-            json.dump([], f)
-    
-    # Create dummy admin/login.html if it doesn't exist
-    if not os.path.exists('templates/admin/login.html'):
-        os.makedirs('templates/admin', exist_ok=True)
-        with open('templates/admin/login.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Admin Login</title>
-    <meta name="robots" content="noindex, nofollow">
-</head>
-<body>
-    <h2>Admin Login</h2>
-    {% with messages = get_flashed_messages() %}
-      {% if messages %}
-        <ul class=flashes>
-        {% for message in messages %}
-          <li>{{ message }}</li>
-        {% endfor %}
-        </ul>
-      {% endif %}
-    {% endwith %}
-    <form method="post">
-        Username: <input type="text" name="username"><br>
-        Password: <input type="password" name="password"><br>
-        <input type="submit" value="Login">
-    </form>
-</body>
-</html>
-""")
-            
-    # Create dummy admin/dashboard.html if it doesn't exist
-    if not os.path.exists('templates/admin/dashboard.html'):
-        os.makedirs('templates/admin', exist_ok=True)
-        with open('templates/admin/dashboard.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Admin Dashboard</title>
-    <meta name="robots" content="noindex, nofollow">
-</head>
-<body>
-    <h1>Admin Dashboard</h1>
-    <p><a href="{{ url_for('admin_tours') }}">Manage Tours</a></p>
-    <p><a href="{{ url_for('admin_bookings') }}">Manage Bookings</a></p>
-    <p><a href="{{ url_for('admin_logout') }}">Logout</a></p>
-
-    <h2>Summary</h2>
-    <p>Recent Bookings (Last 7 Days): {{ recent_bookings_count }}</p>
-    
-    <h3>Tours</h3>
-    <ul>
-        {% for tour in tours %}
-            <li>{{ tour.title }} ({{ tour.id }})</li>
-        {% else %}
-            <li>No tours added yet.</li>
-        {% endfor %}
-    </ul>
-
-    <h3>Bookings</h3>
-    <ul>
-        {% for booking in bookings %}
-            <li>{{ booking.user_name }} - {{ booking.tour_id }} - {{ booking.booking_time }}</li>
-        {% else %}
-            <li>No bookings yet.</li>
-        {% endfor %}
-    </ul>
-</body>
-</html>
-""")
-
-    # Create dummy index.html if it doesn't exist
-    if not os.path.exists('templates/index.html'):
-        os.makedirs('templates', exist_ok=True)
-        with open('templates/index.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>{{ meta_tags.title }}</title>
-    <meta name="description" content="{{ meta_tags.description }}">
-    <meta name="keywords" content="{{ meta_tags.keywords }}">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-    {% include 'includes/og_tags.html' %}
-</head>
-<body>
-    <header>
-        <h1>Albania Walk Tours</h1>
-        <nav>
-            <a href="{{ url_for('index') }}">Home</a>
-            <a href="{{ url_for('about') }}">About</a>
-            <!-- Add other navigation links -->
-        </nav>
-    </header>
-    
-    <main>
-        <h2>Explore Our Tours</h2>
-        <div class="tours-grid">
-            {% for tour in tours %}
-            <div class="tour-card">
-                <img src="{{ tour.images[0] if tour.images else url_for('static', filename='placeholder.jpg') }}" alt="{{ tour.title }} image">
-                <h3>{{ tour.title }}</h3>
-                <p>{{ tour.short_description }}</p>
-                <a href="{{ url_for('tour_detail', tour_id=tour.id) }}" class="btn">View Details</a>
-            </div>
-            {% else %}
-            <p>No tours available at the moment. Please check back soon!</p>
-            {% endfor %}
-        </div>
-    </main>
-
-    <footer>
-        <p>&copy; 2023 Albania Walk Tours. All rights reserved.</p>
-    </footer>
-</body>
-</html>
-""")
-
-    # Create dummy tour_detail.html if it doesn't exist
-    if not os.path.exists('templates/tour_detail.html'):
-        os.makedirs('templates', exist_ok=True)
-        with open('templates/tour_detail.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>{{ meta_tags.title }}</title>
-    <meta name="description" content="{{ meta_tags.description }}">
-    <meta name="keywords" content="{{ meta_tags.keywords }}">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-    {% include 'includes/og_tags.html' %}
-</head>
-<body>
-    <header>
-        <h1>{{ tour.title }}</h1>
-        <nav>
-            <a href="{{ url_for('index') }}">Home</a>
-            <a href="{{ url_for('about') }}">About</a>
-            <!-- Add other navigation links -->
-        </nav>
-    </header>
-
-    <main>
-        <div class="tour-details">
-            {% if tour %}
-                <h2>{{ tour.title }}</h2>
-                {% for image in tour.images %}
-                    <img src="{{ image }}" alt="{{ tour.title }} image" style="max-width: 500px; margin-bottom: 15px;">
-                {% endfor %}
-                
-                <p><strong>Short Description:</strong> {{ tour.short_description }}</p>
-                <p><strong>Long Description:</strong> {{ tour.long_description }}</p>
-                <p><strong>Price:</strong> ${{ tour.price }}</p>
-                <p><strong>Duration:</strong> {{ tour.duration }}</p>
-                <p><strong>Starting Point:</strong> {{ tour.starting_point }}</p>
-                
-                <p><strong>Schedule:</strong></p>
-                <ul>
-                    {% for item in tour.schedule %}
-                        <li>{{ item }}</li>
-                    {% endfor %}
-                </ul>
-
-                <p><strong>Highlights:</strong></p>
-                <ul>
-                    {% for highlight in tour.highlights %}
-                        <li>{{ highlight }}</li>
-                    {% endfor %}
-                </ul>
-                
-                <p><strong>Included:</strong></p>
-                <ul>
-                    {% for item in tour.included %}
-                        <li>{{ item }}</li>
-                    {% endfor %}
-                </ul>
-
-                <p><strong>Meeting Point Details:</strong> {{ tour.meeting_point_details }}</p>
-                <p><strong>Languages:</strong> {{ tour.languages|join(', ') }}</p>
-
-                <div class="booking-form">
-                    <h3>Book This Tour</h3>
-                    <form id="booking-form">
-                        <input type="hidden" name="tour_id" value="{{ tour.id }}">
-                        
-                        <label for="user_name">Name:</label>
-                        <input type="text" id="user_name" name="user_name" required>
-                        
-                        <label for="user_email">Email:</label>
-                        <input type="email" id="user_email" name="user_email" required>
-                        
-                        <label for="user_phone">Phone:</label>
-                        <input type="tel" id="user_phone" name="user_phone" required>
-                        
-                        <label for="preferred_date_time">Preferred Date & Time:</label>
-                        <input type="datetime-local" id="preferred_date_time" name="preferred_date_time" required>
-                        
-                        <label for="number_of_people">Number of People:</label>
-                        <input type="number" id="number_of_people" name="number_of_people" min="1" max="20" value="1" required>
-                        
-                        <label for="special_requests">Special Requests:</label>
-                        <textarea id="special_requests" name="special_requests"></textarea>
-                        
-                        <button type="submit">Book Now</button>
-                    </form>
-                    <div id="booking-message"></div>
-                </div>
-
-            {% else %}
-                <p>Tour not found.</p>
-            {% endif %}
-        </div>
-    </main>
-
-    <footer>
-        <p>&copy; 2023 Albania Walk Tours. All rights reserved.</p>
-    </footer>
-    
-    <script>
-        document.getElementById('booking-form').addEventListener('submit', function(event) {
-            event.preventDefault();
-            const formData = new FormData(this);
-            fetch('/book', {
-                method: 'POST',
-                body: formData
-            })
-            .then(response => response.json())
-            .then(data => {
-                const messageDiv = document.getElementById('booking-message');
-                if (data.success) {
-                    messageDiv.innerHTML = `<p style='color: green;'>${data.message}</p>`;
-                    window.location.href = data.payment_url + '&booking_id=' + data.booking_id; // Redirect to payment
-                } else {
-                    messageDiv.innerHTML = `<p style='color: red;'>${data.message}</p>`;
-                }
-            })
-            .catch(error => {
-                document.getElementById('booking-message').innerHTML = `<p style='color: red;'>An error occurred. Please try again.</p>`;
-                console.error('Error:', error);
-            });
-        });
-    </script>
-</body>
-</html>
-""")
-    # Create dummy about.html if it doesn't exist
-    if not os.path.exists('templates/about.html'):
-        os.makedirs('templates', exist_ok=True)
-        with open('templates/about.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>{{ meta_tags.title }}</title>
-    <meta name="description" content="{{ meta_tags.description }}">
-    <meta name="keywords" content="{{ meta_tags.keywords }}">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-    {% include 'includes/og_tags.html' %}
-</head>
-<body>
-    <header>
-        <h1>About Albania Walk Tours</h1>
-        <nav>
-            <a href="{{ url_for('index') }}">Home</a>
-            <a href="{{ url_for('about') }}">About</a>
-            <!-- Add other navigation links -->
-        </nav>
-    </header>
-
-    <main>
-        <h2>Our Story</h2>
-        <p>Albania Walk Tours was founded with a passion for showcasing the incredible beauty, rich history, and vibrant culture of Albania.</p>
-        <p>We believe that the best way to experience a place is on foot, allowing you to connect with the local environment and people on a deeper level.</p>
-        <p>Our team is dedicated to providing unique, memorable, and safe walking tours for every type of traveler.</p>
-        
-        <h3>Our Mission</h3>
-        <p>To inspire exploration and appreciation of Albania through authentic and engaging walking experiences.</p>
-        
-        <h3>Contact Us</h3>
-        <p>Email: info@albaniawalktours.com</p>
-        <p>Phone: +355 XXX XXX XXX</p>
-    </main>
-
-    <footer>
-        <p>&copy; 2023 Albania Walk Tours. All rights reserved.</p>
-    </footer>
-</body>
-</html>
-""")
-
-    # Create dummy booking_confirmation.html if it doesn't exist
-    if not os.path.exists('templates/booking_confirmation.html'):
-        os.makedirs('templates', exist_ok=True)
-        with open('templates/booking_confirmation.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>{{ meta_tags.title }}</title>
-    <meta name="description" content="{{ meta_tags.description }}">
-    <meta name="keywords" content="{{ meta_tags.keywords }}">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-    {% include 'includes/og_tags.html' %}
-</head>
-<body>
-    <header>
-        <h1>Booking Confirmation</h1>
-        <nav>
-            <a href="{{ url_for('index') }}">Home</a>
-            <a href="{{ url_for('about') }}">About</a>
-            <!-- Add other navigation links -->
-        </nav>
-    </header>
-
-    <main>
-        <h2>Thank you for your booking!</h2>
-        {% if booking %}
-            <p><strong>Booking ID:</strong> {{ booking.booking_id }}</p>
-            <p><strong>Tour:</strong> {{ tour.title if tour else 'N/A' }}</p>
-            <p><strong>Name:</strong> {{ booking.user_name }}</p>
-            <p><strong>Email:</strong> {{ booking.user_email }}</p>
-            <p><strong>Phone:</strong> {{ booking.user_phone }}</p>
-            <p><strong>Number of People:</strong> {{ booking.number_of_people }}</p>
-            <p><strong>Preferred Date & Time:</strong> {{ booking.preferred_date_time }}</p>
-            <p><strong>Special Requests:</strong> {{ booking.special_requests }}</p>
-            <p><strong>Booking Time:</strong> {{ booking.booking_time }}</p>
-            <p><strong>Payment Status:</strong> {{ booking.payment_status }}</p>
-
-            {% if booking.payment_status != 'paid' %}
-                <p>Please proceed to payment to confirm your booking.</p>
-                <a href="{{ payment_url }}" class="btn" target="_blank">Proceed to Payment</a>
-            {% else %}
-                <p>Your booking is confirmed and paid!</p>
-            {% endif %}
-        {% else %}
-            <p>Booking details not found.</p>
-        {% endif %}
-    </main>
-
-    <footer>
-        <p>&copy; 2023 Albania Walk Tours. All rights reserved.</p>
-    </footer>
-</body>
-</html>
-""")
-
-    # Create dummy booking_not_found.html if it doesn't exist
-    if not os.path.exists('templates/booking_not_found.html'):
-        os.makedirs('templates', exist_ok=True)
-        with open('templates/booking_not_found.html', 'w') as f:
-            f.write("""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Booking Not Found</title>
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-</head>
-<body>
-    <header>
-        <h1>Error</h1>
-        <nav>
-            <a href="{{ url_for('index') }}">Home</a>
-            <a href="{{ url_for('about') }}">About</a>
-        </nav>
-    </header>
-    <main>
-        <h2>Booking Not Found</h2>
-        <p>The booking you are looking for could not be found.</p>
-        <p><a href="{{ url_for('index') }}">Go back to Home</a></p>
-    </main>
-    <footer>
-        <p>&copy; 2023 Albania Walk Tours. All rights reserved.</p>
-    </footer>
-</body>
-</html>
-""")
-
-    # Create dummy static/style.css if it doesn't exist
-    if not os.path.exists('static/style.css'):
-        os.makedirs('static', exist_ok=True)
-        with open('static/style.css', 'w') as f:
-            f.write("""
-body { font-family: sans-serif; margin: 0; padding: 0; }
-header { background-color: #f8f8f8; padding: 1em; text-align: center; }
-nav a { margin: 0 1em; text-decoration: none; color: #333; }
-main { padding: 2em; }
-.tours-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; }
-.tour-card { border: 1px solid #ddd; padding: 1em; text-align: center; }
-.tour-card img { max-width: 100%; height: auto; margin-bottom: 1em; }
-.btn { background-color: #4CAF50; color: white; padding: 0.8em 1.5em; text-decoration: none; border-radius: 5px; }
-footer { background-color: #333; color: white; text-align: center; padding: 1em; margin-top: 2em; }
-.tour-details img { max-width: 100%; height: auto; margin-bottom: 1em; }
-.booking-form label { display: block; margin-top: 1em; }
-.booking-form input, .booking-form textarea { width: calc(100% - 20px); padding: 10px; margin-top: 5px; border: 1px solid #ccc; border-radius: 4px; }
-.booking-form button { background-color: #2196F3; color: white; padding: 10px 15px; border: none; border-radius: 5px; cursor: pointer; margin-top: 1em; }
-.flashes { list-style: none; padding: 0; margin-top: 1em; }
-.flashes li { background-color: #f0ad4e; color: white; padding: 10px; margin-bottom: 5px; border-radius: 4px; }
-""")
-    
-    # Create dummy includes/og_tags.html if it doesn't exist
-    if not os.path.exists('templates/includes/og_tags.html'):
-        os.makedirs('templates/includes', exist_ok=True)
-        with open('templates/includes/og_tags.html', 'w') as f:
-            f.write("""
-{% if meta_tags %}
-    <meta property="og:title" content="{{ meta_tags.title }}">
-    <meta property="og:description" content="{{ meta_tags.description }}">
-    {# Add og:image if available #}
-    {% if meta_tags.image %}
-        <meta property="og:image" content="{{ meta_tags.image }}">
-    {% endif %}
-    <meta property="og:url" content="{{ request.url }}">
-    <meta property="og:type" content="website">
-{% endif %}
-""")
-
-
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+# --- Application factory ---
+
+# Admin and API views live in admin_views.py and api_views.py. Their routes are
+# declared here so the modules (and what they import) only load on first use.
+ADMIN_ROUTES = [
+    ('/admin/login', 'admin_login', ['GET', 'POST']),
+    ('/admin/logout', 'admin_logout', ['GET']),
+    ('/admin', 'admin_dashboard', ['GET']),
+    ('/admin/tours', 'admin_tours', ['GET']),
+    ('/admin/tours/add', 'admin_add_tour', ['GET', 'POST']),
+    ('/admin/tours/edit/<tour_id>', 'admin_edit_tour', ['GET', 'POST']),
+    ('/admin/tours/delete/<tour_id>', 'admin_delete_tour', ['POST']),
+    ('/admin/tours/manage-dates/<tour_id>', 'admin_manage_tour_dates', ['GET', 'POST']),
+    ('/admin/bookings', 'admin_bookings', ['GET']),
+    ('/admin/bookings/search', 'admin_search_bookings', ['GET']),
+    ('/admin/cookies', 'admin_cookies', ['GET']),
+    ('/admin/cookies/export.csv', 'admin_cookies_export', ['GET']),
+    ('/admin/bookings/delete/<booking_id>', 'admin_delete_booking', ['POST']),
+    ('/admin/bookings/update-payment/<booking_id>', 'admin_update_payment_status', ['POST']),
+    ('/admin/bookings/bulk-delete', 'admin_bulk_delete_bookings', ['POST']),
+    ('/admin/bookings/bulk-update-payment', 'admin_bulk_update_payment_status', ['POST']),
+    ('/admin/reports', 'admin_reports', ['GET']),
+    ('/admin/profiles', 'admin_profiles', ['GET', 'POST']),
+    ('/admin/profiles/<filename>', 'admin_profile_view', ['GET']),
+]
+
+API_ROUTES = [
+    ('/api/cookie-consent', 'track_cookie_consent', ['POST']),
+    ('/api/tours/search', 'search_tours', ['GET']),
+    ('/api/tours/<tour_id>/booking-schema', 'tour_booking_schema', ['GET']),
+]
+
+PUBLIC_ROUTES = [
+    ('/', index, ['GET']),
+    ('/tour/<tour_id>', tour_detail, ['GET']),
+    ('/about', about, ['GET']),
+    ('/booking/<booking_id>', booking_confirmation, ['GET']),
+    ('/book', book_tour, ['POST']),
+    ('/sitemap.xml', sitemap, ['GET']),
+    ('/robots.txt', robots_txt, ['GET']),
+]
+
+
+# View that imports its module the first time it is called
+class LazyView:
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def lazy_blueprint(name, module, routes):
+    blueprint = Blueprint(name, __name__)
+    for rule, endpoint, methods in routes:
+        blueprint.add_url_rule(rule, endpoint, LazyView(f'{module}.{endpoint}'), methods=methods)
+    return blueprint
+
+
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SESSION_SECRET', 'TiTirana')
+
+    # Logging first so every other hook runs with a request ID, then the
+    # profiler so profiles cover the remaining hooks
+    app_logging.init_app(app)
+    profiling.init_app(app)
+    io_audit.init_app(app)
+    app.before_request(set_locale)
+    app.after_request(add_locale_headers)
+    app.url_defaults(add_locale_to_urls)
+    maintenance.init_app(app)
+    static_export.init_app(app)
+    cdn_cache.init_app(app)
+
+    for rule, view, methods in PUBLIC_ROUTES:
+        app.add_url_rule(rule, view.__name__, view, methods=methods)
+
+    app.register_blueprint(lazy_blueprint('admin', 'admin_views', ADMIN_ROUTES))
+    app.register_blueprint(lazy_blueprint('api', 'api_views', API_ROUTES))
+
+    return app
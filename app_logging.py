@@ -0,0 +1,255 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+import zlib
+
+from flask import g, has_request_context, request
+
+# Structured, non-blocking logging.
+#
+# Request threads only format the record's message and put it on a bounded
+# in-memory queue; a QueueListener thread writes JSON lines to stdout. When the
+# queue is full new records are dropped and counted instead of blocking the
+# request, and a "dropped N records" warning is logged once there is room.
+#
+# Every record logged during a request carries its request ID (taken from an
+# incoming X-Request-ID header or generated, and echoed on the response) and
+# endpoint. High-volume INFO events can be sampled per route: the decision is
+# made once per request ID, so a sampled request keeps all of its lines.
+#
+#   logger = logging.getLogger(__name__)
+#   logger.info('Booking saved', extra={'event': 'booking_created', 'booking_id': booking_id})
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Share of INFO/DEBUG records kept, by endpoint or event name. Override with
+# LOG_SAMPLE_RATES="track_cookie_consent=0.1,search_tours=0.5".
+DEFAULT_SAMPLE_RATES = {
+    'track_cookie_consent': 0.1,
+}
+
+_request_id_re = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else came in through extra=
+_standard_attrs = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+_pipeline = {'handler': None, 'listener': None, 'pid': None}
+_pipeline_lock = threading.Lock()
+
+
+def parse_sample_rates(value, default=DEFAULT_SAMPLE_RATES):
+    rates = dict(default)
+    for item in (value or '').split(','):
+        name, _, rate = item.partition('=')
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+SAMPLE_RATES = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES'))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _standard_attrs and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+# Adds request ID and endpoint, and drops sampled-out INFO/DEBUG records
+class RequestContextFilter(logging.Filter):
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        request_id = getattr(g, 'request_id', None)
+        record.request_id = request_id
+        record.endpoint = request.endpoint
+        record.method = request.method
+        record.path = request.path
+
+        if record.levelno >= logging.WARNING or not self.sample_rates:
+            return True
+        rate = self.sample_rates.get(getattr(record, 'event', None))
+        if rate is None and request.endpoint:
+            rate = self.sample_rates.get(request.endpoint, self.sample_rates.get(request.endpoint.rsplit('.', 1)[-1]))
+        if rate is None or rate >= 1.0:
+            return True
+        record.sample_rate = rate
+        if request_id and _request_bucket(request_id) < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+# Stable value in [0, 1) per request ID, the same in every worker
+def _request_bucket(request_id):
+    return zlib.crc32(request_id.encode()) / 0x100000000
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.reported = 0
+        self._drop_lock = threading.Lock()
+
+    # Format on the calling thread only what cannot be done later: the message
+    # (args may be mutable) and the traceback (exc_info holds live frames)
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.dropped != self.reported:
+            self._report_drops()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    def _report_drops(self):
+        with self._drop_lock:
+            count = self.dropped - self.reported
+            if count <= 0:
+                return
+            record = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'Log queue full, dropped {count} records', 'event': 'log_records_dropped',
+                'dropped': count, 'dropped_total': self.dropped,
+            })
+            try:
+                self.queue.put_nowait(record)
+                self.reported = self.dropped
+            except queue.Full:
+                pass
+
+
+def _build_output_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+    return handler
+
+
+def _start_listener():
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _pipeline['handler']
+    handler.queue = log_queue
+    listener = logging.handlers.QueueListener(log_queue, _build_output_handler(), respect_handler_level=False)
+    listener.start()
+    _pipeline['listener'] = listener
+    _pipeline['pid'] = os.getpid()
+
+
+# gunicorn --preload forks workers after import; the listener thread does not
+# survive the fork, so each child starts its own
+def _after_fork():
+    if _pipeline['handler'] is not None:
+        _start_listener()
+
+
+def _stop():
+    listener = _pipeline['listener']
+    if listener is not None and _pipeline['pid'] == os.getpid():
+        listener.stop()
+        _pipeline['listener'] = None
+
+
+# Route all logging through the queue. Safe to call more than once.
+def configure_logging():
+    with _pipeline_lock:
+        if _pipeline['handler'] is not None:
+            return _pipeline['handler']
+        handler = DroppingQueueHandler(None)
+        handler.addFilter(RequestContextFilter(SAMPLE_RATES))
+        _pipeline['handler'] = handler
+        _start_listener()
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_after_fork)
+        atexit.register(_stop)
+        return handler
+
+
+# Pipeline counters, shown on /admin/profiles
+def log_stats():
+    handler = _pipeline['handler']
+    if handler is None:
+        return {'queued': 0, 'dropped': 0, 'sampled_out': 0}
+    return {
+        'queued': handler.queue.qsize(),
+        'dropped': handler.dropped,
+        'sampled_out': sum(getattr(f, 'sampled_out', 0) for f in handler.filters),
+    }
+
+
+def assign_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if _request_id_re.match(incoming) else uuid.uuid4().hex
+
+
+def add_request_id_header(response):
+    request_id = getattr(g, 'request_id', None)
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+def init_app(app):
+    configure_logging()
+    app.before_request(assign_request_id)
+    app.after_request(add_request_id_header)
@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import io
+import os
+import sys
+
+from werkzeug.exceptions import HTTPException
+
+import async_views
+from app import create_app
+
+# ASGI entry point: uvicorn asgi:app --workers 4
+#
+# The booking, cookie consent and booking confirmation endpoints run as
+# coroutines (async_views.py) on the event loop, so a worker can hold many of
+# them in flight while they wait on disk or on Twilio. Their blocking storage
+# calls go to the loop's default executor, a pool of ASGI_IO_THREADS threads.
+# Every other route is the unchanged Flask app, called as WSGI in a separate
+# pool of ASGI_WSGI_THREADS threads, so slow admin pages can't starve the
+# async endpoints of I/O threads.
+#
+# Request bodies are read in full before a view runs (ASGI_MAX_BODY_BYTES
+# caps them) and responses are sent in one piece; nothing this app serves
+# streams. main:app under gunicorn remains the default deployment.
+
+ASGI_IO_THREADS = int(os.environ.get('ASGI_IO_THREADS', 16))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))
+ASGI_MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', 10 * 1024 * 1024))
+
+
+# WSGI environ for an ASGI HTTP scope and its body
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-length':
+            continue
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+# Run a WSGI app to completion: (status code, headers, body)
+def call_wsgi(wsgi_app, environ):
+    started = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+        return chunks.append
+
+    app_iter = wsgi_app(environ, start_response)
+    try:
+        chunks.extend(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return started['status'], started['headers'], b''.join(chunks)
+
+
+class AsgiApp:
+    def __init__(self, flask_app, views):
+        self.flask_app = flask_app
+        self.views = views
+        self._wsgi_pool = ThreadPoolExecutor(ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+        self._loops = set()
+
+    # Bound the threads asyncio.to_thread() uses, once per event loop
+    def _configure_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._loops:
+            loop.set_default_executor(ThreadPoolExecutor(ASGI_IO_THREADS, thread_name_prefix='asgi-io'))
+            self._loops.add(loop)
+        return loop
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._configure_loop()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._wsgi_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # The request body, or None if the client went away or sent too much
+    async def _read_body(self, receive, send):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > ASGI_MAX_BODY_BYTES:
+                await self._send(send, 413, [('Content-Type', 'text/plain')], b'Request body too large')
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _http(self, scope, receive, send):
+        loop = self._configure_loop()
+        body = await self._read_body(receive, send)
+        if body is None:
+            return
+        environ = wsgi_environ(scope, body)
+
+        view = self.views.get(self._endpoint(environ))
+        if view is None:
+            status, headers, body = await loop.run_in_executor(self._wsgi_pool, call_wsgi, self.flask_app, environ)
+        else:
+            status, headers, body = await self._dispatch_async(view, environ)
+        await self._send(send, status, headers, body)
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        return endpoint
+
+    # Flask's full_dispatch_request(), awaiting the view instead of calling it
+    async def _dispatch_async(self, view, environ):
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**ctx.request.view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            response = app.handle_exception(e)
+        try:
+            return call_wsgi(response, environ)
+        finally:
+            ctx.pop(error)
+
+    async def _send(self, send, status, headers, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(flask_app=None):
+    return AsgiApp(flask_app or create_app(), async_views.VIEWS)
+
+
+app = create_asgi_app()
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+
+from flask import g, jsonify, render_template, request
+
+import api_views
+import booking_store
+from app import (booking_created_response, booking_errors_response, booking_failed_response,
+                 booking_from_form, render_confirmation, save_booking, twilio_settings,
+                 validate_booking, whatsapp_message)
+import app as sync_views
+from ratelimit import async_write_slot, rate_limited, service_busy
+from tour_locales import localized_tour
+
+# Async versions of the I/O-bound public endpoints, served by asgi.py.
+#
+# They behave exactly like their sync counterparts in app.py and api_views.py
+# (same validation, responses and log events) but never block the event loop:
+# storage calls run in the ASGI worker's bounded I/O thread pool (see
+# ASGI_IO_THREADS), and the WhatsApp notification goes out over Twilio's
+# aiohttp client, so a slow Twilio only delays that one response. A write slot
+# (ratelimit.async_write_slot) is held only while the write itself runs.
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for Twilio before giving up on a notification
+WHATSAPP_TIMEOUT = float(os.environ.get('WHATSAPP_TIMEOUT', 10))
+
+
+async def send_whatsapp_notification(booking_data, tour):
+    settings = twilio_settings()
+    if settings is None:
+        return False
+
+    # The async client needs aiohttp (a twilio dependency); without it (or
+    # without twilio at all) fall back to the sync sender in a thread
+    try:
+        from twilio.http.async_http_client import AsyncTwilioHttpClient
+        from twilio.rest import Client
+    except ImportError:
+        return await asyncio.to_thread(sync_views.send_whatsapp_notification, booking_data, tour)
+
+    try:
+        async with AsyncTwilioHttpClient(timeout=WHATSAPP_TIMEOUT) as http_client:
+            client = Client(settings['account_sid'], settings['auth_token'], http_client=http_client)
+            message = await client.messages.create_async(
+                from_=f"whatsapp:{settings['whatsapp_from']}",
+                body=whatsapp_message(booking_data, tour),
+                to=f"whatsapp:{settings['admin_whatsapp']}"
+            )
+        logger.info('WhatsApp notification sent', extra={'event': 'whatsapp_sent', 'message_sid': message.sid, 'booking_id': booking_data.get('booking_id')})
+        return True
+    except Exception:
+        logger.exception('Error sending WhatsApp notification', extra={'event': 'whatsapp_failed', 'booking_id': booking_data.get('booking_id')})
+        return False
+
+
+@rate_limited('book')
+async def book_tour():
+    tour, errors = await asyncio.to_thread(validate_booking, request.form)
+    if errors:
+        return booking_errors_response(errors)
+
+    booking_data = booking_from_form(request.form)
+    async with async_write_slot() as acquired:
+        if not acquired:
+            return service_busy()
+        saved = await asyncio.to_thread(save_booking, booking_data)
+    if not saved:
+        return booking_failed_response()
+
+    logger.info('Booking created', extra={'event': 'booking_created', 'booking_id': booking_data['booking_id'], 'tour_id': booking_data['tour_id']})
+
+    # Send WhatsApp notification (requires Twilio credentials)
+    await send_whatsapp_notification(booking_data, tour)
+    return booking_created_response(booking_data, tour)
+
+
+@rate_limited('cookie_consent')
+async def track_cookie_consent():
+    try:
+        consent_data = api_views.consent_from_request()
+        async with async_write_slot() as acquired:
+            if not acquired:
+                return service_busy()
+            saved = await asyncio.to_thread(api_views.save_cookie_consent, consent_data)
+        if saved:
+            logger.info('Cookie consent recorded', extra={'event': 'cookie_consent', 'status': consent_data['status']})
+        return jsonify({'success': True})
+    except Exception:
+        logger.exception('Error tracking cookie consent', extra={'event': 'cookie_consent_failed'})
+        return jsonify({'success': False}), 500
+
+
+def _find_booking(booking_id, locale):
+    booking = booking_store.find_booking(booking_id)
+    if not booking:
+        return None, None
+    return booking, localized_tour(booking.get('tour_id'), locale)
+
+
+async def booking_confirmation(booking_id):
+    try:
+        booking, tour = await asyncio.to_thread(_find_booking, booking_id, g.locale)
+    except FileNotFoundError:
+        booking = None
+    if not booking:
+        return render_template('booking_not_found.html'), 404
+    return render_confirmation(booking, tour)
+
+
+# Flask endpoint -> async view
+VIEWS = {
+    'book_tour': book_tour,
+    'api.track_cookie_consent': track_cookie_consent,
+    'booking_confirmation': booking_confirmation,
+}
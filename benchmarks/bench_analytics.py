@@ -0,0 +1,92 @@
+import argparse
+from datetime import date, timedelta
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+import booking_store
+from catalog import load_summaries
+
+# Time the booking analytics on a synthetic booking journal.
+#
+#   python benchmarks/bench_analytics.py                    # 1,000,000 bookings
+#   python benchmarks/bench_analytics.py --bookings 200000
+#
+# Reports loading the whole journal into a cube (once per worker, or after the
+# journal is rebuilt), following it after one more booking and one payment
+# status change (after every booking write) and one full report (every page
+# view) separately.
+
+
+def make_bookings(count, seed):
+    rng = random.Random(seed)
+    tour_ids = [summary['id'] for summary in load_summaries()]
+    start = date.today() - timedelta(days=365)
+    days = [(start + timedelta(days=i)).isoformat() for i in range(730)]
+    times = ['', 'T09:00:00', 'T14:00:00']
+    return [{
+        'booking_id': str(i),
+        'tour_id': rng.choice(tour_ids),
+        'number_of_people': rng.randint(1, 12),
+        'preferred_date_time': rng.choice(days) + rng.choice(times),
+        'payment_status': 'paid' if rng.random() < 0.7 else 'pending',
+    } for i in range(count)]
+
+
+def timed(label, f):
+    start = time.perf_counter()
+    result = f()
+    print(f'{label:<16}{(time.perf_counter() - start) * 1000:>10.0f} ms')
+    return result
+
+
+def write_lines(path, lines):
+    with open(path, 'a') as f:
+        f.write(''.join(json.dumps(line) + '\n' for line in lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark booking analytics')
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    bookings = make_bookings(args.bookings, args.seed)
+    print(f'{len(bookings)} bookings')
+    path = tempfile.mkdtemp(prefix='bench-analytics-')
+    journal = os.path.join(path, booking_store.JOURNAL_FILE)
+    try:
+        write_lines(journal, [{'format': booking_store.JOURNAL_FORMAT}]
+                    + [booking_store.journal_entry(booking) for booking in bookings] + [{'v': '1'}])
+        cube = analytics.BookingCube()
+        timed('journal load', lambda: cube.follow(journal))
+        print(f'{"":<16}{len(cube.cells):>10} cells')
+
+        new = dict(bookings[0], booking_id='new', payment_status='pending')
+        paid = dict(new, payment_status='paid')
+        write_lines(journal, [booking_store.journal_entry(new), {'v': '2'},
+                              {'pay': booking_store.journal_record(paid), 'was': 'pending'}, {'v': '3'}])
+        timed('follow', lambda: cube.follow(journal))
+        bookings.append(paid)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    report = timed('report', lambda: analytics.summarize(cube))
+    month = date.today().replace(day=1)
+    timed('report (month)', lambda: analytics.summarize(cube, month, month + timedelta(days=30)))
+
+    assert report['totals']['bookings'] == len(bookings)
+    assert report['totals']['people'] == sum(b['number_of_people'] for b in bookings)
+    paid_row = next(row for row in report['statuses'] if row['status'] == 'paid')
+    assert paid_row['bookings'] == sum(b['payment_status'] == 'paid' for b in bookings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import argparse
+from collections import Counter, defaultdict
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stress_writes import ROOT, form, free_port, percentile, pick_tour, post, prepare_data_dir
+
+# Throughput of the sync (gunicorn main:app) and async (uvicorn asgi:app)
+# serving modes at high concurrency.
+#
+# Each mode gets the same number of worker processes and a fresh copy of the
+# data files. Client threads then loop for --seconds over a booking (/book),
+# its confirmation page (/booking/<id>) and a cookie consent. The WhatsApp
+# notification is replaced by a --notify-delay sleep (time.sleep in the sync
+# app, asyncio.sleep in the async one), standing in for a slow Twilio.
+#
+#   python benchmarks/bench_asgi.py --workers 4 --clients 8 --client-threads 32
+#   python benchmarks/bench_asgi.py --modes uvicorn --notify-delay 0
+#
+# Reports requests per second and latency per request type for each mode.
+# Rate limiting runs with its default budgets and write slots. The servers
+# trust one proxy hop, and every booking comes from a different visitor
+# address in X-Forwarded-For, so the per-IP budgets don't shape the load.
+
+MODES = ('gunicorn', 'uvicorn')
+
+# Imported by the servers instead of main/asgi, to slow the notification down
+SERVER_MODULE = '''
+import asyncio
+import os
+import time
+
+import app
+import async_views
+
+DELAY = float(os.environ['BENCH_NOTIFY_DELAY'])
+
+
+def send_whatsapp_notification(booking_data, tour):
+    time.sleep(DELAY)
+    return True
+
+
+async def send_whatsapp_notification_async(booking_data, tour):
+    await asyncio.sleep(DELAY)
+    return True
+
+
+app.send_whatsapp_notification = send_whatsapp_notification
+async_views.send_whatsapp_notification = send_whatsapp_notification_async
+
+from main import app as wsgi_app
+from asgi import app as asgi_app
+'''
+
+
+def start_server(mode, path, port, workers, notify_delay, log_path):
+    env = dict(os.environ, PYTHONPATH=f'{path}{os.pathsep}{ROOT}', LOG_LEVEL='WARNING', SCHEDULER_ENABLED='0',
+               TRUSTED_PROXY_COUNT='1', RATE_LIMIT_DIR=os.path.join(path, 'ratelimit'),
+               BENCH_NOTIFY_DELAY=str(notify_delay))
+    if mode == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+                   '--timeout', '120', '--backlog', '4096', 'bench_server:wsgi_app']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--host', '127.0.0.1',
+                   '--port', str(port), '--backlog', '4096', '--log-level', 'warning', '--no-access-log',
+                   'bench_server:asgi_app']
+    log = open(log_path, 'w')
+    server = subprocess.Popen(command, cwd=path, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'{mode} exited with {server.returncode}; see {log_path}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/robots.txt', timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit(f'{mode} did not start; see {log_path}')
+
+
+def get(opener, url, headers):
+    started = time.perf_counter()
+    try:
+        with opener.open(urllib.request.Request(url, headers=headers), timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def client_thread(base_url, index, thread, deadline, tour_id, people, results):
+    opener = urllib.request.build_opener()
+    i = 0
+    while time.monotonic() < deadline:
+        marker = f'bench-{index}-{thread}-{i}'
+        visitor = {'X-Forwarded-For': f'10.{index}.{thread}.{i % 256}'}
+        i += 1
+
+        status, body, elapsed = post(opener, base_url + '/book', form({
+            'tour_id': tour_id, 'user_name': marker, 'user_email': f'{marker}@example.com',
+            'user_phone': '+355000000', 'preferred_date_time': '2030-01-01', 'number_of_people': people,
+        }), visitor)
+        results['timings']['book'].append(elapsed)
+        booking_id = json.loads(body).get('booking_id') if status == 200 else None
+        if not booking_id:
+            results['errors']['book', status] += 1
+            continue
+
+        status, elapsed = get(opener, f'{base_url}/booking/{booking_id}', visitor)
+        results['timings']['confirmation'].append(elapsed)
+        if status != 200:
+            results['errors']['confirmation', status] += 1
+
+        status, body, elapsed = post(opener, base_url + '/api/cookie-consent', json.dumps({'status': 'accepted'}).encode(),
+                                     dict(visitor, **{'Content-Type': 'application/json', 'User-Agent': marker}))
+        results['timings']['consent'].append(elapsed)
+        if status != 200:
+            results['errors']['consent', status] += 1
+
+
+def client_process(base_url, index, threads, deadline, tour_id, people):
+    results = {'timings': defaultdict(list), 'errors': Counter()}
+    workers = [threading.Thread(target=client_thread, args=(base_url, index, t, deadline, tour_id, people, results))
+               for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results['timings'] = dict(results['timings'])
+    return results
+
+
+def run(mode, args):
+    path = tempfile.mkdtemp(prefix=f'bench-asgi-{mode}-')
+    prepare_data_dir(path)
+    with open(os.path.join(path, 'bench_server.py'), 'w') as f:
+        f.write(SERVER_MODULE)
+    tour_id, people = pick_tour(path)
+    port = free_port()
+    server = start_server(mode, path, port, args.workers, args.notify_delay, os.path.join(path, 'server.log'))
+    try:
+        # Clients start together once every process is up
+        deadline = time.monotonic() + args.seconds + 1
+        started = deadline - args.seconds
+        with multiprocessing.Pool(args.clients) as pool:
+            all_results = pool.starmap(client_process, [
+                (f'http://127.0.0.1:{port}', i, args.client_threads, deadline, tour_id, people)
+                for i in range(args.clients)])
+        wall = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(path, ignore_errors=True)
+
+    timings = defaultdict(list)
+    errors = Counter()
+    for results in all_results:
+        for kind, values in results['timings'].items():
+            timings[kind].extend(values)
+        errors.update(results['errors'])
+    return timings, errors, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sync gunicorn and async uvicorn throughput')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--workers', type=int, default=4, help='server worker processes')
+    parser.add_argument('--clients', type=int, default=8, help='client processes')
+    parser.add_argument('--client-threads', type=int, default=32, help='threads per client process')
+    parser.add_argument('--seconds', type=float, default=20, help='how long each mode is loaded')
+    parser.add_argument('--notify-delay', type=float, default=0.3, help='seconds the WhatsApp notification takes')
+    args = parser.parse_args()
+
+    print(f'{args.workers} workers, {args.clients * args.client_threads} concurrent clients, '
+          f'{args.seconds:g} s per mode, notification {args.notify_delay * 1000:.0f} ms')
+    print(f"{'mode':9} {'request':13} {'count':>7} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes:
+        timings, errors, wall = run(mode, args)
+        total = sum(len(values) for values in timings.values())
+        for kind in ('book', 'confirmation', 'consent'):
+            values = timings.get(kind, [])
+            print(f'{mode:9} {kind:13} {len(values):7} {len(values) / wall:8.1f} {percentile(values, 0.5) * 1000:8.1f} '
+                  f'{percentile(values, 0.95) * 1000:8.1f} {percentile(values, 0.99) * 1000:8.1f}')
+        print(f"{mode:9} {'all':13} {total:7} {total / wall:8.1f}")
+        for (kind, status), count in sorted(errors.items()):
+            print(f'{mode:9} failed {kind}: {count} with HTTP {status or "connection error"}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
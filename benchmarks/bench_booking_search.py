@@ -0,0 +1,124 @@
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import booking_search
+import booking_store
+
+# Time the admin booking search at scale.
+#
+# Writes N generated bookings to a temporary bookings.json, then times
+# building the search journal, indexing it, a new worker loading the saved
+# index, a set of typical queries, and picking up a new booking and a deletion
+# incrementally.
+#
+#   python benchmarks/bench_booking_search.py --bookings 300000
+
+FIRST = ['Ana', 'Besa', 'Arben', 'Elira', 'Dritan', 'Jonida', 'Klaus', 'Marco', 'Sophie', 'Ahmed', 'Lena', 'Tom',
+         'Giulia', 'Erion', 'Mira', 'Hans', 'Fatima', 'Luca', 'Emma', 'Noah']
+LAST = ['Hoxha', 'Krasniqi', 'Shehu', 'Berisha', 'Muller', 'Rossi', 'Smith', 'Dubois', 'Kola', 'Gashi', 'Weber',
+        'Bianchi', 'Leka', 'Dervishi', 'Schmidt', 'Martin', 'Brown', 'Meta', 'Cela', 'Rama']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'web.de', 'libero.it', 'icloud.com', 'mail.al']
+
+
+def make_bookings(count, seed):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    bookings = []
+    for i in range(count):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        bookings.append({
+            'booking_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'tour_id': 'tirana-walking-tour',
+            'user_name': f'{first} {last}',
+            'user_email': f'{first.lower()}.{last.lower()}{rng.randint(1, 9999)}@{rng.choice(DOMAINS)}',
+            'user_phone': f'+355 6{rng.randint(7, 9)} {rng.randint(100, 999)} {rng.randint(1000, 9999)}',
+            'number_of_people': rng.randint(1, 8),
+            'preferred_date_time': (start + timedelta(days=rng.randint(0, 700))).strftime('%Y-%m-%d'),
+            'special_requests': '',
+            'booking_time': (start + timedelta(minutes=i)).isoformat(),
+            'payment_status': 'pending',
+        })
+    return bookings
+
+
+def timed(function, *args, repeat=1):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the admin booking search')
+    parser.add_argument('--bookings', type=int, default=300000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    bookings = make_bookings(args.bookings, args.seed)
+    sample = bookings[len(bookings) // 2]
+    queries = [
+        ('name substring', 'hoxh'),
+        ('full name', sample['user_name']),
+        ('email prefix', sample['user_email'][:8]),
+        ('email exact', sample['user_email']),
+        ('phone digits', sample['user_phone'].replace(' ', '')[-7:]),
+        ('phone as typed', sample['user_phone'][:9]),
+        ('booking id prefix', sample['booking_id'][:8]),
+        ('common domain', 'gmail.com'),
+        ('no match', 'zzqx'),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        with open(booking_store.BOOKINGS_FILE, 'w') as f:
+            json.dump(bookings, f)
+        del bookings
+
+        with booking_store.bookings_lock():
+            _, rebuild_ms = timed(booking_search.rebuild_journal)
+        _, build_ms = timed(booking_search.current_index)
+        # A new worker: loads the snapshot the first one saved
+        booking_search._state['index'] = None
+        _, load_ms = timed(booking_search.current_index)
+        # Memory separately: tracemalloc slows the load down
+        booking_search._state['index'] = None
+        tracemalloc.start()
+        booking_search.current_index()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print(f'{args.bookings} bookings: journal {os.path.getsize(booking_store.JOURNAL_FILE) / 1e6:.1f} MB '
+              f'written in {rebuild_ms:.0f} ms')
+        print(f'index built from the journal in {build_ms:.0f} ms, loaded from its snapshot '
+              f'({os.path.getsize(booking_search.SNAPSHOT_FILE) / 1e6:.1f} MB) in {load_ms:.0f} ms; '
+              f'{memory / 1e6:.0f} MB in memory')
+        print(f"{'query':20} {'text':28} {'hits':>6} {'ms':>8}")
+        for label, query in queries:
+            results, ms = timed(booking_search.search, query, 50, repeat=5)
+            print(f'{label:20} {query[:28]:28} {len(results):6} {ms:8.2f}')
+
+        new = make_bookings(1, args.seed + 1)[0]
+        new['user_name'] = 'Zana Incremental'
+        booking_store.append_booking(new)
+        results, ms = timed(booking_search.search, 'incremental', 50)
+        print(f"after a new booking: {len(results)} hit in {ms:.2f} ms (journal catch-up included)")
+        booking_store.delete_bookings([new['booking_id']])
+        results, ms = timed(booking_search.search, 'incremental', 50)
+        print(f"after deleting it:   {len(results)} hits in {ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog_snapshot
+
+# Compare the two catalog load paths: json.load of the pretty-printed
+# tours.json versus the compiled binary snapshot. Last run: json 0.12 ms vs
+# snapshot 0.18 ms on the real catalog, 7.3 vs 9.3 ms at --scale 50.
+#
+#   python benchmarks/bench_catalog_load.py                # real catalog
+#   python benchmarks/bench_catalog_load.py --scale 200    # catalog x200
+
+
+# Every copy gets its own strings: repeating the same text would let the
+# snapshot's string table store it once and flatter its load time
+def distinct(value, suffix):
+    if isinstance(value, str):
+        return value + suffix
+    if isinstance(value, list):
+        return [distinct(v, suffix) for v in value]
+    if isinstance(value, dict):
+        return {k: distinct(v, suffix) for k, v in value.items()}
+    return value
+
+
+def scaled_catalog(tours, scale):
+    if scale <= 1:
+        return tours
+    return [distinct(tour, f'-{i}') for i in range(scale) for tour in tours]
+
+
+def time_load(load, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def memory_of(load):
+    gc.collect()
+    tracemalloc.start()
+    tours = load()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tours
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare JSON and snapshot catalog loads')
+    parser.add_argument('--catalog', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tours.json'))
+    parser.add_argument('--scale', type=int, default=1, help='repeat the catalog this many times')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.catalog, 'r') as f:
+        tours = scaled_catalog(json.load(f), args.scale)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'tours.json')
+        snapshot_path = os.path.join(tmp, 'tours.snapshot')
+        with open(json_path, 'w') as f:
+            json.dump(tours, f, indent=2)
+        catalog_snapshot.write_snapshot(tours, catalog_snapshot.source_signature(json_path), snapshot_path)
+
+        def load_json():
+            with open(json_path, 'r') as f:
+                return json.load(f)
+
+        def load_snapshot():
+            return catalog_snapshot.read_snapshot(json_path, snapshot_path)
+
+        assert load_snapshot() == load_json(), 'snapshot does not round-trip the catalog'
+
+        rows = []
+        for name, load, path in (('json', load_json, json_path), ('snapshot', load_snapshot, snapshot_path)):
+            rows.append((name, time_load(load, args.repeat), memory_of(load), os.path.getsize(path)))
+
+    print(f'{len(tours)} tours, median of {args.repeat} loads')
+    print(f"{'path':<10}{'load ms':>10}{'KiB/tour':>10}{'file KiB':>10}")
+    for name, seconds, memory, file_size in rows:
+        print(f'{name:<10}{seconds * 1000:>10.3f}{memory / len(tours) / 1024:>10.2f}{file_size / 1024:>10.1f}')
+    json_time, snapshot_time = rows[0][1], rows[1][1]
+    faster, ratio = ('snapshot', json_time / snapshot_time) if snapshot_time < json_time else ('json', snapshot_time / json_time)
+    print(f'{faster} loads {ratio:.2f}x faster; snapshot memory: {rows[1][2] / rows[0][2]:.2f}x of json')
+
+
+if __name__ == '__main__':
+    main()
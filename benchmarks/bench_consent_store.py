@@ -0,0 +1,129 @@
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import consent_store
+
+# Compare the old cookie_consents.json format (a list of full records) with
+# the compact one: file size, load time and memory, and the time to build the
+# admin page's stats and last 50 records.
+#
+#   python benchmarks/bench_consent_store.py --records 100000
+#   python benchmarks/bench_consent_store.py --records 100000 --dedupe-window 3600
+#
+# Generated traffic comes from a few hundred IPs and a dozen user agents, with
+# some visitors answering the banner several times.
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.0 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 18_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.0 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:131.0) Gecko/20100101 Firefox/131.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:131.0) Gecko/20100101 Firefox/131.0',
+    'Mozilla/5.0 (iPad; CPU OS 17_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.6 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Unknown',
+]
+
+
+def make_records(count, seed):
+    rng = random.Random(seed)
+    ips = [f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}, 10.84.0.{rng.randint(1, 254)}'
+           for _ in range(max(count // 50, 10))]
+    now = datetime(2025, 10, 1)
+    records = []
+    while len(records) < count:
+        now += timedelta(seconds=rng.randint(1, 120))
+        ip, agent = rng.choice(ips), rng.choices(USER_AGENTS, weights=range(len(USER_AGENTS), 0, -1))[0]
+        status = 'accepted' if rng.random() < 0.7 else 'declined'
+        # Some visitors answer again a few minutes later
+        for _ in range(1 + (rng.random() < 0.2) * rng.randint(1, 3)):
+            records.append({'timestamp': now.isoformat(), 'status': status, 'ip_address': ip, 'user_agent': agent})
+    return records[:count]
+
+
+# Best of three load times, then the memory held by what was loaded
+def measure(load):
+    elapsed = []
+    for _ in range(3):
+        started = time.perf_counter()
+        load()
+        elapsed.append(time.perf_counter() - started)
+    tracemalloc.start()
+    data = load()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, min(elapsed), memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare legacy and compact consent storage')
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--dedupe-window', type=int, default=0, help='collapse repeats within this many seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.json')
+        with open(legacy_path, 'w') as f:
+            json.dump(records, f, indent=2)
+
+        store = consent_store.ConsentStore()
+        for record in records:
+            store.add(record['status'], record['ip_address'], record['user_agent'],
+                      consent_store._parse_timestamp(record['timestamp']), dedupe_window=args.dedupe_window)
+        compact_path = os.path.join(tmp, 'compact.json')
+        with open(compact_path, 'w') as f:
+            json.dump(store.to_json(), f, separators=(',', ':'))
+
+        def load_legacy():
+            with open(legacy_path) as f:
+                return json.load(f)
+
+        def load_compact():
+            with open(compact_path) as f:
+                return consent_store.ConsentStore.from_json(json.load(f))
+
+        legacy, legacy_load, legacy_memory = measure(load_legacy)
+        compact, compact_load, compact_memory = measure(load_compact)
+
+        started = time.perf_counter()
+        sum(1 for r in legacy if r.get('status') == 'accepted')
+        sum(1 for r in legacy if r.get('status') == 'declined')
+        sorted(legacy, key=lambda r: r.get('timestamp', ''), reverse=True)[:50]
+        legacy_page = time.perf_counter() - started
+
+        started = time.perf_counter()
+        compact.status_counts()
+        compact.expand(limit=50)
+        compact_page = time.perf_counter() - started
+
+        rows = [
+            ('file size (KB)', os.path.getsize(legacy_path) / 1024, os.path.getsize(compact_path) / 1024),
+            ('load (ms)', legacy_load * 1000, compact_load * 1000),
+            ('memory (KB)', legacy_memory / 1024, compact_memory / 1024),
+            ('admin page (ms)', legacy_page * 1000, compact_page * 1000),
+        ]
+
+    print(f'{args.records} consents, {len(compact.records)} rows, {len(compact.user_agents)} user agents, '
+          f'dedupe window {args.dedupe_window}s')
+    print(f"{'':18} {'legacy':>12} {'compact':>12} {'ratio':>8}")
+    for label, old, new in rows:
+        print(f'{label:18} {old:12.1f} {new:12.1f} {old / new if new else 0:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
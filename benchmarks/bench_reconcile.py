@@ -0,0 +1,136 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import booking_store
+import reconcile
+
+# Time a full reconciliation run against generated fixtures.
+#
+# Builds N bookings plus a PayPal CSV export and a webhook stream covering
+# them (some by booking ID, some only by email and amount, plus refunds,
+# duplicates and strangers), then reconciles them in a temporary directory.
+#
+#   python benchmarks/bench_reconcile.py --bookings 20000
+#   python benchmarks/bench_reconcile.py --bookings 500 --keep ./fixtures
+#
+# --keep writes the fixture files (bookings.json, paypal.csv, events.jsonl) to
+# a directory so reconcile.py can be run on them by hand.
+
+CSV_HEADER = ['Date', 'Time', 'TimeZone', 'Name', 'Type', 'Status', 'Currency', 'Gross', 'Fee', 'Net',
+              'From Email Address', 'To Email Address', 'Transaction ID', 'Invoice Number', 'Note']
+
+
+def make_fixtures(count, seed):
+    rng = random.Random(seed)
+    prices = {tour_id: cents for tour_id, cents in reconcile.tour_prices().items() if cents}
+    tour_ids = sorted(prices)
+
+    bookings = []
+    for i in range(count):
+        tour_id = rng.choice(tour_ids)
+        bookings.append({
+            'booking_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'tour_id': tour_id,
+            'user_name': f'Guest {i}',
+            'user_email': f'guest{i}@example.com',
+            'user_phone': '',
+            'number_of_people': rng.randint(1, 6),
+            'preferred_date_time': '2026-06-01',
+            'special_requests': '',
+            'booking_time': '2026-05-01T10:00:00',
+            'payment_status': 'paid' if rng.random() < 0.1 else 'pending',
+        })
+
+    rows = []
+    events = []
+    for i, booking in enumerate(bookings):
+        roll = rng.random()
+        if roll < 0.2:
+            continue  # not paid yet
+        gross = prices[booking['tour_id']] * booking['number_of_people']
+        if roll < 0.22:
+            gross += 500  # paid the wrong amount
+        amount = reconcile.format_cents(gross)
+        txn_id = f'TXN{i:08d}'
+        by_id = roll < 0.6
+        if roll < 0.8:
+            rows.append(['01/05/2026', '10:00:00', 'CET', booking['user_name'], 'Website Payment', 'Completed',
+                         'EUR', amount, '-0.50', amount, booking['user_email'], 'shop@example.com', txn_id,
+                         booking['booking_id'] if by_id else '', ''])
+        else:
+            events.append({'id': f'WH-{i}', 'event_type': 'PAYMENT.CAPTURE.COMPLETED', 'resource': {
+                'id': txn_id, 'status': 'COMPLETED', 'custom_id': booking['booking_id'],
+                'amount': {'value': amount, 'currency_code': 'EUR'},
+            }})
+        if roll > 0.98:
+            rows.append(['02/05/2026', '10:00:00', 'CET', booking['user_name'], 'Payment Refund', 'Completed',
+                         'EUR', '-' + amount, '0.00', '-' + amount, booking['user_email'], 'shop@example.com',
+                         f'REF{i:08d}', booking['booking_id'], ''])
+
+    for i in range(count // 50):
+        rows.append(['03/05/2026', '10:00:00', 'CET', 'Stranger', 'Website Payment', 'Completed', 'EUR',
+                     '25.00', '-0.50', '24.50', f'stranger{i}@example.org', 'shop@example.com',
+                     f'STR{i:08d}', '', ''])
+    # The same payment arriving through both channels
+    events.extend(dict(e, id=e['id'] + '-retry') for e in events[:count // 100])
+    rng.shuffle(rows)
+    return bookings, rows, events
+
+
+def write_fixtures(directory, bookings, rows, events):
+    with open(os.path.join(directory, 'bookings.json'), 'w') as f:
+        json.dump(bookings, f, indent=2)
+    with open(os.path.join(directory, 'paypal.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+    with open(os.path.join(directory, 'events.jsonl'), 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark payment reconciliation')
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', help='also write the fixture files to this directory')
+    args = parser.parse_args()
+
+    bookings, rows, events = make_fixtures(args.bookings, args.seed)
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+        write_fixtures(args.keep, bookings, rows, events)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_fixtures(tmp, bookings, rows, events)
+        booking_store.BOOKINGS_FILE = os.path.join(tmp, 'bookings.json')
+        booking_store.LOCK_FILE = booking_store.BOOKINGS_FILE + '.lock'
+
+        start = time.perf_counter()
+        exit_code = reconcile.main(['--csv', os.path.join(tmp, 'paypal.csv'),
+                                    '--webhooks', os.path.join(tmp, 'events.jsonl'),
+                                    '--currency', 'EUR', '--report', os.path.join(tmp, 'report.csv')])
+        elapsed = time.perf_counter() - start
+
+        with open(os.path.join(tmp, 'report.csv'), newline='') as f:
+            reasons = {}
+            for row in csv.DictReader(f):
+                reasons[row['reason']] = reasons.get(row['reason'], 0) + 1
+
+    print(f'{args.bookings} bookings, {len(rows)} CSV rows, {len(events)} webhook events')
+    print(f'reconciled in {elapsed * 1000:.0f} ms (exit {exit_code})')
+    for reason, count in sorted(reasons.items()):
+        print(f'  {reason:<24}{count:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Fail when a request does more I/O, or takes longer, than its budget.
+#
+# Budgets live in benchmarks/perf_budgets.json, one entry per request:
+#
+#   {"name": "tour page", "path": "/tour/{tour_id}",
+#    "budget": {"files": {"tours*": 0, "bookings.json*": 0}, "templates": 1, "ms": 50}}
+#
+# Each request runs against a copy of tours.json and a generated bookings.json
+# in a scratch directory. It is sent "warmup" times first (default 1, so
+# per-worker caches are filled as they would be in production), then once
+# under io_audit, then "repeat" more times (default 20) to time it; "ms" is
+# the median. "touch" lists files to mark as modified before the audited run,
+# to budget the reload after an edit; "form" and "json" are POST bodies, and
+# every request is sent logged in as admin. {tour_id} (the first tour),
+# {bookable_tour_id} (one that takes bookings for any date) and {booking_id}
+# in paths and bodies are filled in.
+#
+# Budget keys: opens, bytes_read, bytes_written (characters, for text files),
+# json_parses, json_dumps, templates, ms, and files - glob patterns of paths
+# relative to the data directory, each with the number of opens allowed.
+#
+#   python benchmarks/perf_gate.py [--budgets FILE] [--only NAME] [--verbose]
+#
+# Exits 1 if any budget is exceeded. tests/test_perf_budgets.py runs the same
+# checks under pytest, on every budget but "ms" (timings vary too much between
+# machines to fail a test run).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGETS = os.path.join(ROOT, 'benchmarks', 'perf_budgets.json')
+
+# Before the app is imported: its settings are read at import time
+os.environ.update({
+    'LOG_LEVEL': 'WARNING',
+    'SCHEDULER_ENABLED': '0',
+    'RATE_LIMIT_ENABLED': '0',
+    'STATIC_EXPORT_DIR': '',
+    'CDN_PURGER': 'local',
+})
+os.environ.pop('IO_AUDIT', None)
+sys.path.insert(0, ROOT)
+
+COUNTERS = ('opens', 'bytes_read', 'bytes_written', 'json_parses', 'json_dumps', 'templates')
+
+
+def make_bookings(count, tour_id):
+    start = datetime(2025, 1, 1)
+    return [{
+        'booking_id': str(uuid.UUID(int=i + 1, version=4)),
+        'tour_id': tour_id,
+        'user_name': f'Guest {i}',
+        'user_email': f'guest{i}@example.com',
+        'user_phone': f'+355 69 {i:07d}',
+        'number_of_people': 2,
+        'preferred_date_time': (start + timedelta(days=i % 365)).strftime('%Y-%m-%d'),
+        'special_requests': '',
+        'booking_time': (start + timedelta(minutes=i)).isoformat(),
+        'payment_status': 'pending',
+    } for i in range(count)]
+
+
+def fill(value, names):
+    if isinstance(value, str):
+        return value.format(**names)
+    if isinstance(value, dict):
+        return {key: fill(item, names) for key, item in value.items()}
+    return value
+
+
+def send(client, check, names):
+    method = check.get('method', 'GET')
+    path = fill(check['path'], names)
+    if 'json' in check:
+        response = client.open(path, method=method, json=fill(check['json'], names))
+    else:
+        response = client.open(path, method=method, data=fill(check.get('form'), names))
+    if response.status_code >= 500:
+        raise RuntimeError(f"{check['name']}: {method} {path} returned HTTP {response.status_code}")
+    return response
+
+
+def measure(client, check, names, timed=True):
+    import io_audit
+
+    for _ in range(check.get('warmup', 1)):
+        send(client, check, names)
+    for path in check.get('touch', []):
+        # A later mtime than any cached signature, even on coarse clocks
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    with io_audit.audit() as counts:
+        send(client, check, names)
+    timings = []
+    for _ in range(check.get('repeat', 20) if timed else 0):
+        started = time.perf_counter()
+        send(client, check, names)
+        timings.append((time.perf_counter() - started) * 1000)
+    actual = {name: value for name, value in counts.as_dict().items() if name in COUNTERS}
+    actual['ms'] = statistics.median(timings) if timings else 0.0
+    return actual, counts
+
+
+# (metric, actual, allowed) for every budget the request exceeded
+def over_budget(budget, actual, counts):
+    failures = []
+    for name, allowed in budget.items():
+        if name == 'files':
+            for pattern, opens in allowed.items():
+                if counts.opened(pattern) > opens:
+                    failures.append((f'files[{pattern}]', counts.opened(pattern), opens))
+        elif actual[name] > allowed:
+            failures.append((name, actual[name], allowed))
+    return failures
+
+
+def load_config(path=DEFAULT_BUDGETS):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Write tours.json and a generated bookings.json into the current directory.
+# Returns the names filled into paths and bodies.
+def prepare_data(config):
+    shutil.copy(os.path.join(ROOT, 'tours.json'), '.')
+    with open('tours.json') as f:
+        tours = json.load(f)
+    tour_id = tours[0]['id']
+    # Open and without date restrictions, so a booking for any date goes through
+    bookable = [tour for tour in tours if tour.get('booking_status', 'open') == 'open'
+                and not (tour.get('dates_data') or tour.get('available_dates') or tour.get('date_rules'))]
+    bookings = make_bookings(config.get('bookings', 10000), tour_id)
+    with open('bookings.json', 'w') as f:
+        json.dump(bookings, f, indent=2)
+    return {'tour_id': tour_id, 'bookable_tour_id': (bookable or tours)[0]['id'],
+            'booking_id': bookings[len(bookings) // 2]['booking_id']}
+
+
+# A test client logged in as admin
+def admin_client():
+    from app import create_app
+
+    client = create_app().test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check per-request I/O and latency budgets')
+    parser.add_argument('--budgets', default=DEFAULT_BUDGETS)
+    parser.add_argument('--only', help='run only the checks whose name contains this')
+    parser.add_argument('--verbose', action='store_true', help='list the files each request opened')
+    args = parser.parse_args()
+
+    config = load_config(args.budgets)
+    checks = [check for check in config['checks'] if not args.only or args.only in check['name']]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        names = prepare_data(config)
+        client = admin_client()
+
+        failed = 0
+        print(f"{'request':32} {'opens':>6} {'read':>10} {'written':>10} {'parses':>7} {'dumps':>6} "
+              f"{'tmpl':>5} {'ms':>8}")
+        for check in checks:
+            actual, counts = measure(client, check, names)
+            failures = over_budget(check.get('budget', {}), actual, counts)
+            print(f"{check['name'][:32]:32} {actual['opens']:6} {actual['bytes_read']:10} {actual['bytes_written']:10} "
+                  f"{actual['json_parses']:7} {actual['json_dumps']:6} {actual['templates']:5} {actual['ms']:8.2f}"
+                  + ('  FAIL' if failures else ''))
+            if args.verbose:
+                for path, opens in sorted(counts.files.items()):
+                    print(f'    {opens} x {path}')
+            for metric, value, allowed in failures:
+                print(f'    over budget: {metric} = {round(value, 2)}, allowed {allowed}')
+            failed += bool(failures)
+
+    if failed:
+        sys.exit(f'{failed} of {len(checks)} requests over budget')
+    print(f'All {len(checks)} requests within budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Worker boot report.
+#
+# Starts a fresh interpreter with -X importtime, imports main (what gunicorn
+# does for "main:app"), then times the first request. Prints the slowest
+# imports so regressions in boot time are easy to spot.
+#
+#   python benchmarks/startup_report.py
+#   python benchmarks/startup_report.py --top 15 --budget-ms 400 --json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+client = main.app.test_client()
+client.get('/')
+first_request = time.perf_counter()
+sys.stdout.write('\nSTARTUP_REPORT ' + json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (first_request - imported) * 1000,
+    'modules': len(sys.modules),
+}) + '\n')
+'''
+
+
+# Parse "import time: self [us] | cumulative | imported package" lines
+def parse_importtime(stderr):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        except ValueError:
+            continue
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': depth,
+        })
+    return rows
+
+
+def boot(python):
+    # No maintenance scheduler: the measured request must not edit the catalog
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', SCHEDULER_ENABLED='0')
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', BOOT_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit(result.returncode)
+    # The app may log to stdout too; the report is on its own marked line
+    line = next(l for l in result.stdout.splitlines() if l.startswith('STARTUP_REPORT '))
+    return json.loads(line.split(' ', 1)[1]), parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report worker boot time')
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--top', type=int, default=10, help='number of slowest imports to list')
+    parser.add_argument('--budget-ms', type=float, help='exit non-zero when import time exceeds this')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    timings, imports = boot(args.python)
+    # Top-level imports (depth 1 under the -c script) add up to the total
+    top_level = [row for row in imports if row['depth'] == 1]
+    slowest = sorted(top_level, key=lambda row: row['cumulative_us'], reverse=True)[:args.top]
+    local = sorted(
+        (row for row in imports if os.path.exists(os.path.join(ROOT, row['module'].split('.')[0] + '.py'))),
+        key=lambda row: row['cumulative_us'], reverse=True,
+    )
+
+    report = dict(timings, slowest_imports=slowest, app_modules=local)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import main:     {timings['import_ms']:8.1f} ms ({timings['modules']} modules loaded)")
+        print(f"first request:   {timings['first_request_ms']:8.1f} ms")
+        print()
+        print(f"{'cumulative ms':>14}  {'self ms':>8}  top-level import")
+        for row in slowest:
+            print(f"{row['cumulative_us'] / 1000:>14.1f}  {row['self_us'] / 1000:>8.1f}  {row['module']}")
+        print()
+        print(f"{'cumulative ms':>14}  {'self ms':>8}  app module")
+        for row in local:
+            print(f"{row['cumulative_us'] / 1000:>14.1f}  {row['self_us'] / 1000:>8.1f}  {row['module']}")
+
+    if args.budget_ms is not None and timings['import_ms'] > args.budget_ms:
+        print(f"import time {timings['import_ms']:.1f} ms exceeds budget of {args.budget_ms:.1f} ms", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+import argparse
+from collections import Counter, defaultdict
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import consent_store
+from tour_dates import TourSchedule
+
+# Concurrent write stress test.
+#
+# Starts gunicorn with several workers on a copy of the data files, then has
+# client processes (each with several threads) fire bookings (/book), cookie
+# consents (/api/cookie-consent) and admin payment status updates at it. Every
+# request carries a unique marker, so once the server has stopped the harness
+# can check bookings.json and cookie_consents.json for records that were
+# acknowledged but lost, stored twice, or stored with the wrong contents.
+#
+#   python benchmarks/stress_writes.py --workers 4 --clients 8 --client-threads 4 --ops 50
+#   python benchmarks/stress_writes.py --workers 2 --worker-threads 8 --keep ./stress-run
+#
+# It reports throughput and latency per request type, and how long requests
+# waited for and held the bookings and consents locks (the "lock_timing"
+# events the stores log at DEBUG level). Exits non-zero if any check fails.
+
+ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'TiTirana')
+ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'TiTirana')
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Copy what the app reads into a scratch directory with empty write targets
+def prepare_data_dir(path):
+    os.makedirs(path, exist_ok=True)
+    shutil.copy(os.path.join(ROOT, 'tours.json'), path)
+    for name in ('tours', 'translations'):
+        if os.path.isdir(os.path.join(ROOT, name)):
+            shutil.copytree(os.path.join(ROOT, name), os.path.join(path, name), dirs_exist_ok=True)
+    with open(os.path.join(path, 'bookings.json'), 'w') as f:
+        json.dump([], f)
+
+
+# A tour that takes bookings on any day, and a valid group size for it
+def pick_tour(path):
+    with open(os.path.join(path, 'tours.json')) as f:
+        tours = json.load(f)
+    for tour in tours:
+        if tour.get('booking_status', 'open') == 'open' and not TourSchedule(tour).has_dates:
+            return tour['id'], max(int(tour.get('min_booking', 1) or 1), 1)
+    sys.exit('No open tour without date restrictions to book')
+
+
+def start_server(path, port, workers, worker_threads, log_path):
+    # Keep every log record: lock timings come from the log
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL='DEBUG', LOG_FORMAT='json',
+               LOG_SAMPLE_RATES='track_cookie_consent=1', RATE_LIMIT_ENABLED='0', WRITE_CONCURRENCY_LIMIT='100000', SCHEDULER_ENABLED='0',
+               RATE_LIMIT_DIR=os.path.join(path, 'ratelimit'), PROFILE_DIR=os.path.join(path, 'profiles'))
+    command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(worker_threads),
+               '--bind', f'127.0.0.1:{port}', '--timeout', '120', 'main:app']
+    log = open(log_path, 'w')
+    server = subprocess.Popen(command, cwd=path, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'gunicorn exited with {server.returncode}; see {log_path}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/robots.txt', timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit(f'gunicorn did not start; see {log_path}')
+
+
+def form(data):
+    return urllib.parse.urlencode(data, doseq=True).encode()
+
+
+def post(opener, url, body, headers=None):
+    request = urllib.request.Request(url, data=body, headers=headers or {})
+    started = time.perf_counter()
+    try:
+        with opener.open(request, timeout=60) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body, status = e.read(), e.code
+    except OSError:
+        body, status = b'', 0
+    return status, body, time.perf_counter() - started
+
+
+def client_thread(base_url, name, ops, admin_every, tour_id, people, results):
+    plain = urllib.request.build_opener()
+    admin = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    post(admin, base_url + '/admin/login', form({'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}))
+
+    for i in range(ops):
+        marker = f'stress-{name}-{i}'
+
+        status, body, elapsed = post(plain, base_url + '/book', form({
+            'tour_id': tour_id, 'user_name': marker, 'user_email': f'{marker}@example.com',
+            'user_phone': '+355000000', 'preferred_date_time': '2030-01-01', 'number_of_people': people,
+        }))
+        booking_id = None
+        if status == 200:
+            reply = json.loads(body)
+            booking_id = reply.get('booking_id') if reply.get('success') else None
+        results['timings']['book'].append(elapsed)
+        if booking_id:
+            results['bookings'][marker] = booking_id
+        else:
+            results['errors']['book', status] += 1
+
+        status, body, elapsed = post(plain, base_url + '/api/cookie-consent', json.dumps({'status': 'accepted'}).encode(),
+                                     {'Content-Type': 'application/json', 'User-Agent': marker})
+        results['timings']['consent'].append(elapsed)
+        if status == 200 and json.loads(body).get('success'):
+            results['consents'].append(marker)
+        else:
+            results['errors']['consent', status] += 1
+
+        if booking_id and admin_every and i % admin_every == 0:
+            status, body, elapsed = post(admin, base_url + '/admin/bookings/bulk-update-payment',
+                                         form({'booking_ids': [booking_id], 'payment_status': 'paid'}),
+                                         {'Accept': 'application/json'})
+            results['timings']['admin_update'].append(elapsed)
+            reply = json.loads(body) if status == 200 else {}
+            if reply.get('success') and reply['results'][0]['result'] == 'updated':
+                results['paid'].append(booking_id)
+            else:
+                results['errors']['admin_update', status] += 1
+
+
+def client_process(base_url, index, threads, ops, admin_every, tour_id, people):
+    results = {'timings': defaultdict(list), 'bookings': {}, 'consents': [], 'paid': [], 'errors': Counter()}
+    workers = [threading.Thread(target=client_thread, args=(base_url, f'{index}-{t}', ops, admin_every,
+                                                            tour_id, people, results))
+               for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results['timings'] = dict(results['timings'])
+    return results
+
+
+def merge(all_results):
+    merged = {'timings': defaultdict(list), 'bookings': {}, 'consents': [], 'paid': [], 'errors': Counter()}
+    for results in all_results:
+        for kind, values in results['timings'].items():
+            merged['timings'][kind].extend(values)
+        merged['bookings'].update(results['bookings'])
+        merged['consents'].extend(results['consents'])
+        merged['paid'].extend(results['paid'])
+        merged['errors'].update(results['errors'])
+    return merged
+
+
+# Compare what the server acknowledged with what is on disk
+def verify(path, merged, tour_id, people):
+    problems = []
+    try:
+        with open(os.path.join(path, 'bookings.json')) as f:
+            bookings = json.load(f)
+    except ValueError as e:
+        return [f'bookings.json is not valid JSON: {e}']
+
+    stored = defaultdict(list)
+    for booking in bookings:
+        stored[booking.get('user_name')].append(booking)
+    for marker, booking_id in merged['bookings'].items():
+        copies = stored.get(marker, [])
+        if not copies:
+            problems.append(f'lost booking {marker} ({booking_id})')
+            continue
+        if len(copies) > 1:
+            problems.append(f'booking {marker} stored {len(copies)} times')
+        booking = copies[0]
+        if (booking.get('booking_id') != booking_id or booking.get('tour_id') != tour_id
+                or booking.get('number_of_people') != people or booking.get('user_email') != f'{marker}@example.com'):
+            problems.append(f'booking {marker} stored with wrong contents: {booking}')
+    by_id = {booking.get('booking_id'): booking for booking in bookings}
+    for booking_id in merged['paid']:
+        if by_id.get(booking_id, {}).get('payment_status') != 'paid':
+            problems.append(f'payment update lost for {booking_id}')
+
+    try:
+        with open(os.path.join(path, consent_store.CONSENTS_FILE)) as f:
+            consents = consent_store.ConsentStore.from_json(json.load(f))
+    except FileNotFoundError:
+        consents = consent_store.ConsentStore()
+    except ValueError as e:
+        return problems + [f'{consent_store.CONSENTS_FILE} is not valid JSON: {e}']
+    counts = Counter()
+    for record in consents.expand():
+        counts[record['user_agent']] += record['count']
+    for marker in merged['consents']:
+        if counts[marker] == 0:
+            problems.append(f'lost consent {marker}')
+        elif counts[marker] > 1:
+            problems.append(f'consent {marker} stored {counts[marker]} times')
+    return problems
+
+
+def lock_timings(log_path):
+    timings = defaultdict(lambda: {'wait': [], 'held': []})
+    with open(log_path) as f:
+        for line in f:
+            if '"lock_timing"' not in line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            timings[entry['lock']]['wait'].append(entry['wait_ms'])
+            timings[entry['lock']]['held'].append(entry['held_ms'])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent write stress test against a local gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--worker-threads', type=int, default=1, help='threads per gunicorn worker')
+    parser.add_argument('--clients', type=int, default=8, help='client processes')
+    parser.add_argument('--client-threads', type=int, default=4, help='threads per client process')
+    parser.add_argument('--ops', type=int, default=50, help='bookings and consents per client thread')
+    parser.add_argument('--admin-every', type=int, default=5, help='mark every Nth booking paid (0: never)')
+    parser.add_argument('--keep', help='run in this directory and keep the data files and server log')
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.keep) if args.keep else tempfile.mkdtemp(prefix='stress-writes-')
+    prepare_data_dir(path)
+    tour_id, people = pick_tour(path)
+    port = free_port()
+    log_path = os.path.join(path, 'server.log')
+    server = start_server(path, port, args.workers, args.worker_threads, log_path)
+    base_url = f'http://127.0.0.1:{port}'
+
+    try:
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            all_results = pool.starmap(client_process, [
+                (base_url, i, args.client_threads, args.ops, args.admin_every, tour_id, people)
+                for i in range(args.clients)])
+        wall = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    merged = merge(all_results)
+    problems = verify(path, merged, tour_id, people)
+    locks = lock_timings(log_path)
+
+    print(f'{args.workers} workers x {args.worker_threads} threads, {args.clients} clients x '
+          f'{args.client_threads} threads x {args.ops} ops, {wall:.1f} s')
+    print(f"{'request':14} {'count':>7} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for kind, values in sorted(merged['timings'].items()):
+        print(f'{kind:14} {len(values):7} {len(values) / wall:8.1f} {percentile(values, 0.5) * 1000:8.1f} '
+              f'{percentile(values, 0.95) * 1000:8.1f} {percentile(values, 0.99) * 1000:8.1f}')
+    print(f"{'lock':14} {'count':>7} {'wait p50':>9} {'wait p95':>9} {'wait max':>9} {'held p50':>9} {'held p95':>9}")
+    for name, timing in sorted(locks.items()):
+        print(f"{name:14} {len(timing['wait']):7} {percentile(timing['wait'], 0.5):9.2f} "
+              f"{percentile(timing['wait'], 0.95):9.2f} {max(timing['wait']):9.2f} "
+              f"{percentile(timing['held'], 0.5):9.2f} {percentile(timing['held'], 0.95):9.2f}")
+    for (kind, status), count in sorted(merged['errors'].items()):
+        print(f'failed {kind}: {count} with HTTP {status or "connection error"}')
+
+    if not args.keep:
+        shutil.rmtree(path, ignore_errors=True)
+    if problems:
+        print(f'FAILED: {len(problems)} problems')
+        for problem in problems[:20]:
+            print('  ' + problem)
+        return 1
+    print(f"OK: {len(merged['bookings'])} bookings, {len(merged['consents'])} consents and "
+          f"{len(merged['paid'])} payment updates all stored exactly once")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+from datetime import date
+import hashlib
+import json
+import re
+import threading
+
+from catalog import catalog_version
+from tour_dates import DISABLED, ENABLED, MATERIALIZE_DAYS, get_schedule
+
+# Booking form validation, declared once and enforced twice.
+#
+# BookingSchema turns a tour into a JSON document describing every rule
+# /book applies: required fields, the email pattern, the 1-20 people range,
+# the tour's min_booking, whether booking is open, and which dates are offered
+# (for the next MATERIALIZE_DAYS days; dates outside that window are left to
+# the server). book_tour() validates with validate(), and static/js/script.js
+# fetches the same document from /api/tours/<id>/booking-schema and checks
+# the form before posting it, so most mistakes never reach the server.
+#
+# Schemas are cached per tour until the catalog changes or the day rolls over
+# (the date window starts today), each with an ETag for conditional requests.
+
+EMAIL_PATTERN = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
+MIN_PEOPLE = 1
+MAX_PEOPLE = 20
+
+REQUIRED_FIELDS = ('tour_id', 'user_name', 'user_email', 'user_phone', 'preferred_date_time', 'number_of_people')
+
+_email_re = re.compile(EMAIL_PATTERN)
+_integer_re = re.compile(r'^\s*[+-]?\d+\s*$')
+
+_schemas = {'key': None, 'by_tour': {}}
+_schemas_lock = threading.Lock()
+
+
+class BookingSchema:
+    def __init__(self, tour, today=None):
+        self.tour = tour
+        self.schedule = get_schedule(tour) if tour else None
+        self.data = _schema_data(tour, self.schedule, today or date.today())
+        self.body = json.dumps(self.data, separators=(',', ':')).encode()
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    # Error messages for a submitted form (a dict-like of strings), in the
+    # order /book has always reported them
+    def validate(self, form):
+        data = self.data
+        errors = []
+        for field in data['fields']:
+            if field.get('required') and not str(form.get(field['name']) or '').strip():
+                errors.append(field['required_message'])
+
+        email = str(form.get('user_email') or '').strip()
+        if email and not _email_re.match(email):
+            errors.append(_field(data, 'user_email')['pattern_message'])
+
+        people = _field(data, 'number_of_people')
+        value = str(form.get('number_of_people', '0'))
+        if _integer_re.match(value):
+            number = int(value)
+            if number < people['min'] or number > people['max']:
+                errors.append(people['range_message'])
+        else:
+            errors.append(people['type_message'])
+            number = 1
+
+        if self.tour is None:
+            errors.append(data['tour_message'])
+            return errors
+        if number < people['min_booking']:
+            errors.append(people['min_booking_message'])
+        if not data['booking_open']:
+            errors.append(data['closed_message'])
+
+        # Dates beyond the published window are checked against the schedule itself
+        dates = _field(data, 'preferred_date_time')
+        preferred = str(form.get('preferred_date_time') or '').strip()
+        if self.schedule.has_dates and preferred:
+            status = self.schedule.status(preferred)
+            if status is None:
+                errors.append(dates['unavailable_message'])
+            elif status == DISABLED:
+                errors.append(dates['disabled_message'])
+        return errors
+
+
+def _field(data, name):
+    for field in data['fields']:
+        if field['name'] == name:
+            return field
+    raise KeyError(name)
+
+
+def _schema_data(tour, schedule, today):
+    min_booking = int((tour or {}).get('min_booking') or 1)
+    fields = []
+    for name in REQUIRED_FIELDS:
+        fields.append({'name': name, 'required': True,
+                       'required_message': f'{name.replace("_", " ").title()} is required'})
+    by_name = {field['name']: field for field in fields}
+    by_name['user_email'].update(pattern=EMAIL_PATTERN, pattern_message='Please enter a valid email address')
+    by_name['number_of_people'].update(
+        type='integer', min=MIN_PEOPLE, max=MAX_PEOPLE, min_booking=min_booking,
+        type_message='Number of people must be a valid number',
+        range_message=f'Number of people must be between {MIN_PEOPLE} and {MAX_PEOPLE}',
+        min_booking_message=f'Minimum booking requirement is {min_booking} people')
+
+    dates = by_name['preferred_date_time']
+    dates.update(unavailable_message='Selected date is not available for booking',
+                 disabled_message='Selected date is currently disabled. Please choose another date')
+    if schedule is not None and schedule.has_dates:
+        window = schedule.window(today, MATERIALIZE_DAYS)
+        dates['dates'] = {
+            'from': today.isoformat(),
+            'to': date.fromordinal(today.toordinal() + MATERIALIZE_DAYS - 1).isoformat(),
+            ENABLED: [entry['date'] for entry in window if entry['enabled']],
+            DISABLED: [entry['date'] for entry in window if not entry['enabled']],
+        }
+    else:
+        dates['dates'] = None
+
+    return {
+        'tour_id': (tour or {}).get('id'),
+        'booking_open': (tour or {}).get('booking_status', 'open') == 'open',
+        'closed_message': 'Booking is currently closed for this tour',
+        'tour_message': 'Invalid tour selected',
+        'fields': fields,
+    }
+
+
+# Schema for a catalog tour (or for a missing one, when tour is None), cached
+# until the catalog changes or the day rolls over
+def get_schema(tour):
+    key = (catalog_version(), date.today())
+    tour_id = (tour or {}).get('id')
+    with _schemas_lock:
+        if _schemas['key'] != key:
+            _schemas['key'] = key
+            _schemas['by_tour'] = {}
+        schema = _schemas['by_tour'].get(tour_id)
+        if schema is None:
+            schema = BookingSchema(tour, key[1])
+            _schemas['by_tour'][tour_id] = schema
+        return schema
@@ -0,0 +1,354 @@
+from array import array
+from collections import defaultdict, deque
+import heapq
+from itertools import repeat
+import json
+import logging
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+
+import booking_store
+from booking_store import JOURNAL_FIELDS, JOURNAL_FILE
+
+# Customer search for the admin bookings page.
+#
+# Each worker keeps a trigram index over name, email, phone (lowercased, plus
+# the phone's digits alone so "+355 69" finds "35569...") and the start of the
+# booking ID; matching records are read back from the journal, from the
+# booking's "add" line or its latest "pay" line.
+# It is fed from booking_store's booking journal (bookings.json.search), never
+# from bookings.json itself: on each search the worker reads just the journal
+# lines added since its last search, so new and deleted bookings show up
+# without rebuilding anything. The journal is (re)built from bookings.json
+# only when it is missing, when bookings.json has a version the journal never
+# recorded (edited by hand, or written before the journal existed), or when
+# deletions have made it much longer than the live bookings.
+#
+# Indexing a large journal takes seconds, so the built index is saved to
+# bookings.json.search.index; a new worker loads that and replays only the
+# journal lines written after it.
+#
+# A query of three or more characters looks up the postings of its rarest
+# trigrams and checks each candidate with a substring test; matches where a
+# field starts with the query come first, then newest bookings first.
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY = 3
+# Candidates are narrowed with at most this many trigrams before checking them
+MAX_TRIGRAMS = 3
+
+SEARCH_FIELDS = ('booking_id', 'user_name', 'user_email', 'user_phone')
+_search_positions = [JOURNAL_FIELDS.index(field) for field in SEARCH_FIELDS]
+_id_position = JOURNAL_FIELDS.index('booking_id')
+_non_digits = re.compile(r'\D')
+_phone_like = re.compile(r'[\d\s+().-]+')
+_id_like = re.compile(r'[0-9a-f-]+')
+_append = array.append
+
+# Booking IDs are random hex: only this many leading characters go into the
+# trigram index (the part the bookings page shows), so IDs are found by prefix
+ID_PREFIX = 8
+
+_index_lock = threading.Lock()
+
+
+# Lowercased search text: booking ID, name, email, phone and the phone's
+# digits, each after a separator no query contains, so no match spans two
+# fields and "\x00" + query finds fields starting with it. Returns (text, the
+# part of it that is indexed).
+def _texts(record):
+    fields = [str(record[i] or '').lower() for i in _search_positions]
+    digits = _non_digits.sub('', fields[-1])
+    if digits and digits != fields[-1]:
+        fields.append(digits)
+    text = '\x00' + '\x00'.join(fields)
+    return text, text[:ID_PREFIX + 1] + text[len(fields[0]) + 1:]
+
+
+def _trigrams(text):
+    return set(map(''.join, zip(text, text[1:], text[2:])))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.texts = []                           # search text by doc number, None once deleted
+        self.offsets = array('Q')                 # journal offset of each doc's "add" line
+        self.postings = defaultdict(lambda: array('I'))  # trigram -> doc numbers, ascending
+        self.live = 0
+        self.format = None     # journal format, from its first line
+        self.version = None    # bookings.json version of the last journal line applied
+        self.lines = 0
+        self.inode = None
+        self.offset = 0
+
+    def __len__(self):
+        return self.live
+
+    def to_snapshot(self):
+        return marshal.dumps({
+            'texts': self.texts, 'offsets': self.offsets.tobytes(),
+            'postings': {trigram: postings.tobytes() for trigram, postings in self.postings.items()},
+            'live': self.live, 'format': self.format, 'version': self.version, 'lines': self.lines,
+            'inode': self.inode, 'offset': self.offset})
+
+    @classmethod
+    def from_snapshot(cls, data):
+        data = marshal.loads(data)
+        index = cls()
+        index.texts = data['texts']
+        index.offsets.frombytes(data['offsets'])
+        for trigram, postings in data['postings'].items():
+            index.postings[trigram].frombytes(postings)
+        for key in ('live', 'format', 'version', 'lines', 'inode', 'offset'):
+            setattr(index, key, data[key])
+        return index
+
+    def add(self, record, offset):
+        doc = len(self.texts)
+        text, indexed = _texts(record)
+        self.texts.append(text)
+        self.offsets.append(offset)
+        self.live += 1
+        # One C-level pass: postings[trigram].append(doc) for each trigram
+        deque(map(_append, map(self.postings.__getitem__, _trigrams(indexed)), repeat(doc)), maxlen=0)
+
+    # Live docs of a booking
+    def _docs(self, booking_id):
+        start = '\x00%s\x00' % str(booking_id or '').lower()
+        return [doc for doc in self._candidates(start[1:ID_PREFIX + 1], prefix=True)
+                if self.texts[doc] is not None and self.texts[doc].startswith(start)]
+
+    def delete(self, booking_id):
+        for doc in self._docs(booking_id):
+            self.texts[doc] = None
+            self.live -= 1
+
+    # A "pay" line holds the booking's current record
+    def update(self, record, offset):
+        for doc in self._docs(record[_id_position]):
+            self.offsets[doc] = offset
+
+    # Read journal lines appended since the last call. Only whole lines are
+    # applied, so a write in progress is picked up next time. Returns False if
+    # the journal was rebuilt since, so this index is obsolete.
+    def follow(self, path):
+        with open(path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if self.inode is not None and inode != self.inode:
+                return False
+            self.inode = inode
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        lines = data[:end].splitlines()
+        entries = json.loads('[' + b','.join(lines).decode() + ']')
+        offset = self.offset
+        for line, entry in zip(lines, entries):
+            if 'add' in entry:
+                self.add(entry['add'], offset)
+            elif 'del' in entry:
+                self.delete(entry['del'])
+            elif 'pay' in entry:
+                self.update(entry['pay'], offset)
+            elif 'v' in entry:
+                self.version = entry['v']
+            elif 'format' in entry:
+                self.format = entry['format']
+            offset += len(line) + 1
+        self.lines += len(lines)
+        self.offset += end
+        return True
+
+    def search(self, query, limit=50):
+        query = query.strip().lower()
+        needles = [query]
+        # "+355 69..." should also match phones stored as "35569..."
+        if _phone_like.fullmatch(query):
+            digits = _non_digits.sub('', query)
+            if digits != query:
+                needles.append(digits)
+        needles = [needle for needle in needles if len(needle) >= MIN_QUERY]
+        texts = self.texts
+        # Fields starting with the query first, newest first...
+        prefix = set()
+        for needle in needles:
+            start = '\x00' + needle
+            prefix.update(doc for doc in self._candidates(needle, prefix=True)
+                          if texts[doc] is not None and start in texts[doc])
+        docs = heapq.nlargest(limit, prefix)
+        if len(docs) < limit:
+            # ...then fields containing it
+            candidates = set()
+            for needle in needles:
+                candidates.update(self._candidates(needle))
+            for doc in sorted(candidates - prefix, reverse=True):
+                text = texts[doc]
+                if text is not None and any(needle in text for needle in needles):
+                    docs.append(doc)
+                    if len(docs) >= limit:
+                        break
+        return self._records(docs)
+
+    # Docs that may contain the needle (at the start of a field, with
+    # prefix=True): those in the postings of its rarest trigrams. Booking IDs
+    # are only indexed by prefix, so a needle that is longer than that and
+    # looks like one is looked up by its leading part.
+    def _candidates(self, needle, prefix=False):
+        if len(needle) > ID_PREFIX and _id_like.fullmatch(needle):
+            needle = needle[:ID_PREFIX]
+        if prefix:
+            needle = '\x00' + needle
+        lists = []
+        for trigram in _trigrams(needle):
+            postings = self.postings.get(trigram)
+            if postings is None:
+                return set()
+            lists.append(postings)
+        if not lists:
+            return set()  # too short for a trigram, e.g. an empty booking ID
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for postings in lists[1:MAX_TRIGRAMS]:
+            candidates.intersection_update(postings)
+        return candidates
+
+    # None if the journal was rebuilt after this index last followed it
+    def _records(self, docs):
+        if not docs:
+            return []
+        records = []
+        with open(JOURNAL_FILE, 'rb') as f:
+            if os.fstat(f.fileno()).st_ino != self.inode:
+                return None
+            for doc in docs:
+                f.seek(self.offsets[doc])
+                entry = json.loads(f.readline())
+                records.append(dict(zip(JOURNAL_FIELDS, entry.get('add') or entry['pay'])))
+        return records
+
+
+SNAPSHOT_FILE = JOURNAL_FILE + '.index'
+# Journal lines a worker replays on top of the snapshot before writing a new one
+SNAPSHOT_TAIL = 5000
+
+_state = {'index': None}
+
+
+# Write the journal from bookings.json. Callers hold bookings_lock().
+def rebuild_journal():
+    started = time.perf_counter()
+    bookings = booking_store.load_bookings()
+    lines = [{'format': booking_store.JOURNAL_FORMAT}]
+    lines += [booking_store.journal_entry(booking) for booking in bookings]
+    lines.append({'v': booking_store.bookings_version()})
+    tmp_path = JOURNAL_FILE + '.tmp.%d' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        f.write(''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines))
+    os.replace(tmp_path, JOURNAL_FILE)
+    try:
+        os.unlink(SNAPSHOT_FILE)
+    except FileNotFoundError:
+        pass
+    logger.info('Booking search journal rebuilt', extra={
+        'event': 'search_journal_rebuilt', 'bookings': len(bookings),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)})
+
+
+def _needs_rebuild(index):
+    return (index.format != booking_store.JOURNAL_FORMAT
+            or index.version != booking_store.bookings_version()
+            or index.lines > 2 * len(index) + 10000)
+
+
+# The saved index, if it was built from the current journal
+def _read_snapshot():
+    try:
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            index = SearchIndex.from_snapshot(f.read())
+        st = os.stat(JOURNAL_FILE)
+    except FileNotFoundError:
+        return None
+    except (ValueError, EOFError, TypeError, KeyError):
+        logger.warning('Ignoring unreadable search index snapshot', extra={'event': 'search_snapshot_invalid'})
+        return None
+    if index.inode != st.st_ino or index.offset > st.st_size:
+        return None
+    return index
+
+
+def _write_snapshot(index):
+    tmp_path = SNAPSHOT_FILE + '.tmp.%d' % os.getpid()
+    with open(tmp_path, 'wb') as f:
+        f.write(index.to_snapshot())
+    os.replace(tmp_path, SNAPSHOT_FILE)
+
+
+# Load the index from the snapshot plus the journal lines written after it,
+# or from the whole journal; save a new snapshot when that was a lot of lines
+def _load_index():
+    started = time.perf_counter()
+    index = _read_snapshot() or SearchIndex()
+    from_line = index.lines
+    index.follow(JOURNAL_FILE)
+    if index.lines - from_line > SNAPSHOT_TAIL:
+        _write_snapshot(index)
+    logger.info('Booking search index loaded', extra={
+        'event': 'search_index_loaded', 'bookings': len(index), 'journal_lines': index.lines - from_line,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)})
+    return index
+
+
+# Catch an index up with the journal. None when there is no journal.
+def _sync(index):
+    try:
+        if index is not None and index.follow(JOURNAL_FILE):
+            return index
+        return _load_index()
+    except FileNotFoundError:
+        return None
+
+
+# This worker's index, brought up to date with the journal
+def current_index():
+    with _index_lock:
+        index = _sync(_state['index'])
+        if index is None or _needs_rebuild(index):
+            # Check again under the writers' lock: a booking may have been
+            # between its bookings.json write and its journal line
+            with booking_store.bookings_lock():
+                index = _sync(index)
+                rebuild = index is None or _needs_rebuild(index)
+                if rebuild:
+                    rebuild_journal()
+            # Indexing the new journal can take seconds: not under the lock
+            if rebuild:
+                index = _load_index()
+        _state['index'] = index
+        return index
+
+
+# Matching bookings, as dicts of JOURNAL_FIELDS
+def search(query, limit=50):
+    if len(query.strip()) < MIN_QUERY:
+        return []
+    # Another worker may rebuild the journal between syncing the index and
+    # reading the matches back; the next sync loads the new journal
+    for _ in range(3):
+        records = current_index().search(query, limit)
+        if records is not None:
+            return records
+    return []
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python booking_search.py rebuild')
+    with booking_store.bookings_lock():
+        rebuild_journal()
+    index = _load_index()
+    print(f'Rebuilt {JOURNAL_FILE} ({len(index)} bookings)')
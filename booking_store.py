@@ -0,0 +1,198 @@
+from contextlib import contextmanager
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: only guard threads within one process
+    fcntl = None
+
+from catalog import write_json_atomic
+
+# Booking storage.
+#
+# Every write goes through bookings_transaction(), which holds an exclusive
+# lock across the read-modify-write so concurrent workers can't lose updates,
+# and replaces bookings.json atomically. Reads are cached per file signature.
+# With LOG_LEVEL=DEBUG every lock logs how long it waited and was held
+# (event "lock_timing"), which benchmarks/stress_writes.py collects.
+#
+# Once booking_search or analytics has created it, every transaction also
+# appends to a booking journal: one JSON line per booking added
+# ({"add": [fields]}), deleted ({"del": booking_id, "was": [fields]}) or given
+# a new payment status ({"pay": [fields], "was": old_status}), then the new
+# bookings.json version ({"v": version}). The search index and the report cube
+# follow the journal instead of re-reading bookings.json, and a version they
+# have not seen tells them bookings.json was changed some other way.
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_FILE = 'bookings.json'
+LOCK_FILE = BOOKINGS_FILE + '.lock'
+JOURNAL_FILE = BOOKINGS_FILE + '.search'
+# First line of a journal ({"format": n}); older journals are rebuilt
+JOURNAL_FORMAT = 2
+
+# Booking fields kept in the journal. Only payment_status changes after
+# booking, and each change gets its own "pay" line.
+JOURNAL_FIELDS = ('booking_id', 'user_name', 'user_email', 'user_phone', 'tour_id',
+                  'preferred_date_time', 'booking_time', 'number_of_people', 'payment_status')
+
+_thread_lock = threading.RLock()
+_cache = {'signature': None, 'bookings': []}
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# Opaque value that changes whenever bookings.json changes
+def bookings_version():
+    signature = _file_signature(BOOKINGS_FILE)
+    return '0' if signature is None else '%x-%x-%x' % signature
+
+
+def _read_bookings():
+    try:
+        with open(BOOKINGS_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+# Load booking data. The returned list is shared, so treat it as read-only.
+def load_bookings():
+    signature = _file_signature(BOOKINGS_FILE)
+    if signature is None:
+        return []
+    if signature != _cache['signature']:
+        bookings = _read_bookings()
+        _cache['bookings'] = bookings
+        _cache['signature'] = signature
+    return _cache['bookings']
+
+
+def find_booking(booking_id):
+    return next((b for b in load_bookings() if b.get('booking_id') == booking_id), None)
+
+
+# Drop cached reads after a write
+def invalidate():
+    _cache['signature'] = None
+
+
+@contextmanager
+def bookings_lock():
+    started = time.perf_counter()
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            acquired = time.perf_counter()
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        if logger.isEnabledFor(logging.DEBUG):
+            released = time.perf_counter()
+            logger.debug('Bookings lock released', extra={
+                'event': 'lock_timing', 'lock': 'bookings', 'wait_ms': round((acquired - started) * 1000, 3),
+                'held_ms': round((released - acquired) * 1000, 3)})
+
+
+class BookingsTransaction:
+    def __init__(self, bookings):
+        self.bookings = bookings
+        self.changed = False
+        # For the booking journal
+        self.added = []
+        self.deleted = []
+        self.paid = []
+
+
+# Read-modify-write under one lock. Set txn.changed = True to have the list
+# written back once when the block exits without an exception, and list
+# added and deleted bookings in txn.added / txn.deleted and (booking, old
+# payment_status) pairs in txn.paid.
+@contextmanager
+def bookings_transaction():
+    with bookings_lock():
+        txn = BookingsTransaction(_read_bookings())
+        yield txn
+        if txn.changed:
+            write_json_atomic(BOOKINGS_FILE, txn.bookings, indent=2)
+            invalidate()
+            _append_journal(txn)
+
+
+def journal_record(booking):
+    return [booking.get(field) for field in JOURNAL_FIELDS]
+
+
+def journal_entry(booking):
+    return {'add': journal_record(booking)}
+
+
+# Callers hold bookings_lock(), as booking_search does when it creates the journal
+def _append_journal(txn):
+    if not os.path.exists(JOURNAL_FILE):
+        return
+    lines = [journal_entry(booking) for booking in txn.added]
+    lines += [{'del': booking.get('booking_id'), 'was': journal_record(booking)} for booking in txn.deleted]
+    lines += [{'pay': journal_record(booking), 'was': status} for booking, status in txn.paid]
+    lines.append({'v': bookings_version()})
+    with open(JOURNAL_FILE, 'a') as f:
+        f.write(''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines))
+
+
+# Save booking data
+def append_booking(booking_data):
+    with bookings_transaction() as txn:
+        txn.bookings.append(booking_data)
+        txn.added.append(booking_data)
+        txn.changed = True
+
+
+# Delete many bookings in one write. Returns per-booking results.
+def delete_bookings(booking_ids):
+    wanted = list(dict.fromkeys(booking_ids))
+    with bookings_transaction() as txn:
+        existing = {b.get('booking_id') for b in txn.bookings}
+        targets = {booking_id for booking_id in wanted if booking_id in existing}
+        if targets:
+            txn.deleted = [b for b in txn.bookings if b.get('booking_id') in targets]
+            txn.bookings = [b for b in txn.bookings if b.get('booking_id') not in targets]
+            txn.changed = True
+    return [
+        {'booking_id': booking_id, 'result': 'deleted' if booking_id in targets else 'not_found'}
+        for booking_id in wanted
+    ]
+
+
+# Set payment_status on many bookings in one write. Returns per-booking results.
+def update_payment_statuses(updates):
+    results = []
+    with bookings_transaction() as txn:
+        by_id = {b.get('booking_id'): b for b in txn.bookings}
+        for booking_id, new_status in updates.items():
+            booking = by_id.get(booking_id)
+            if booking is None:
+                results.append({'booking_id': booking_id, 'result': 'not_found'})
+            elif booking.get('payment_status') == new_status:
+                results.append({'booking_id': booking_id, 'result': 'unchanged'})
+            else:
+                txn.paid.append((booking, booking.get('payment_status')))
+                booking['payment_status'] = new_status
+                txn.changed = True
+                results.append({'booking_id': booking_id, 'result': 'updated', 'payment_status': new_status})
+    return results
@@ -0,0 +1,447 @@
+from contextlib import contextmanager
+import copy
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: only guard threads within one process
+    fcntl = None
+
+import catalog_snapshot
+
+# Tour catalog storage.
+#
+# Two layouts are supported:
+#
+#   single file  tours.json holds every tour. Reads are served from an
+#                in-process cache refreshed whenever the file's stat signature
+#                changes. A compiled binary snapshot (catalog_snapshot.py)
+#                can be written alongside it; it is off by default because it
+#                does not load faster than the JSON (see CATALOG_SNAPSHOT).
+#
+#   sharded      tours/<id>.json holds one tour each, and tours/manifest.json
+#                lists them in display order with the few fields listing pages
+#                need. Listing pages read only the manifest, a tour page reads
+#                only its own file, and saving a tour rewrites just that file
+#                and its manifest entry.
+#
+# The sharded layout is used whenever tours/manifest.json exists. Convert
+# between the two with:
+#
+#   python catalog.py import tours.json     # single file -> sharded
+#   python catalog.py export tours.json     # sharded -> single file
+
+TOURS_FILE = 'tours.json'
+CATALOG_DIR = os.environ.get('CATALOG_DIR', 'tours')
+MANIFEST_NAME = 'manifest.json'
+# "0" (default) never uses the snapshot, "1" always does, "auto" once
+# tours.json reaches CATALOG_SNAPSHOT_MIN_BYTES. benchmarks/bench_catalog_load.py
+# measures the snapshot slower than json.load: 0.18 vs 0.12 ms for the real
+# 40 KB catalog, 9.3 vs 7.3 ms at x50 with distinct strings. It only wins
+# (about 2x) when most strings repeat, and saves under 10% memory.
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', '0')
+SNAPSHOT_MIN_BYTES = int(os.environ.get('CATALOG_SNAPSHOT_MIN_BYTES', 128 * 1024))
+
+MANIFEST_VERSION = 1
+# Tour fields copied into manifest entries for listing pages. Only the first
+# image is kept, still as a list so templates can use tour.images[0].
+SUMMARY_FIELDS = ('id', 'title', 'short_description', 'price', 'duration', 'languages')
+
+_cache = {'signature': None, 'tours': [], 'by_id': {}, 'summaries': None}
+_manifest_cache = {'signature': None, 'manifest': None}
+_shard_cache = {}
+_cache_lock = threading.Lock()
+_write_lock = threading.RLock()
+_safe_id_re = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _use_snapshot(size):
+    if CATALOG_SNAPSHOT == 'auto':
+        return size >= SNAPSHOT_MIN_BYTES
+    return CATALOG_SNAPSHOT != '0'
+
+
+def manifest_path():
+    return os.path.join(CATALOG_DIR, MANIFEST_NAME)
+
+
+def is_sharded():
+    return os.path.exists(manifest_path())
+
+
+# Opaque value that changes whenever the catalog on disk changes.
+# Indexes and caches built from the catalog are keyed on it. In the sharded
+# layout every save rewrites the manifest, so its signature covers all tours.
+def catalog_version():
+    signature = _file_signature(manifest_path()) or _file_signature(TOURS_FILE)
+    return '0' if signature is None else '%x-%x-%x' % signature
+
+
+def tour_summary(tour):
+    summary = {field: tour[field] for field in SUMMARY_FIELDS if field in tour}
+    summary['images'] = (tour.get('images') or [])[:1]
+    return summary
+
+
+def shard_filename(tour_id):
+    if _safe_id_re.match(tour_id or '') and tour_id + '.json' != MANIFEST_NAME:
+        return tour_id + '.json'
+    return 'tour-' + hashlib.sha1(str(tour_id).encode('utf-8')).hexdigest()[:16] + '.json'
+
+
+# --- Sharded layout ---
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_manifest():
+    path = manifest_path()
+    signature = _file_signature(path)
+    if signature is None:
+        return None
+    if signature != _manifest_cache['signature']:
+        with _cache_lock:
+            if signature != _manifest_cache['signature']:
+                try:
+                    manifest = _read_json(path)
+                except FileNotFoundError:
+                    return None
+                manifest['by_id'] = {entry['id']: entry for entry in manifest.get('tours', [])}
+                _manifest_cache['manifest'] = manifest
+                _manifest_cache['signature'] = signature
+    return _manifest_cache['manifest']
+
+
+def _load_shard(entry):
+    path = os.path.join(CATALOG_DIR, entry['file'])
+    signature = _file_signature(path)
+    if signature is None:
+        return None
+    cached = _shard_cache.get(entry['id'])
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    tour = _read_json(path)
+    _shard_cache[entry['id']] = (signature, tour)
+    return tour
+
+
+# --- Reads ---
+
+# Load tour data. The returned list is shared by all requests in this worker,
+# so callers must not modify it - use load_tours_for_update() for that.
+def load_tours():
+    manifest = load_manifest()
+    signature = ('sharded', _manifest_cache['signature']) if manifest is not None else _file_signature(TOURS_FILE)
+    if signature is None:
+        return []
+    if signature == _cache['signature']:
+        return _cache['tours']
+
+    with _cache_lock:
+        if signature != _cache['signature']:
+            try:
+                if manifest is not None:
+                    tours = [t for t in (_load_shard(e) for e in manifest.get('tours', [])) if t is not None]
+                else:
+                    tours = read_catalog()
+            except FileNotFoundError:
+                return []
+            _cache['tours'] = tours
+            _cache['by_id'] = {tour.get('id'): tour for tour in tours}
+            _cache['summaries'] = None
+            _cache['signature'] = signature
+        return _cache['tours']
+
+
+# Tour summaries in display order (see SUMMARY_FIELDS), for listing pages.
+# Sharded catalogs answer this from the manifest alone.
+def load_summaries():
+    manifest = load_manifest()
+    if manifest is not None:
+        return manifest.get('tours', [])
+    tours = load_tours()
+    if _cache['summaries'] is None:
+        _cache['summaries'] = [tour_summary(tour) for tour in tours]
+    return _cache['summaries']
+
+
+# One tour by id, or None. Sharded catalogs read only that tour's file.
+def load_tour(tour_id):
+    manifest = load_manifest()
+    if manifest is not None:
+        entry = manifest['by_id'].get(tour_id)
+        if entry is None:
+            return None
+        try:
+            return _load_shard(entry)
+        except (OSError, ValueError):
+            return None
+    load_tours()
+    return _cache['by_id'].get(tour_id)
+
+
+# Read the single-file catalog from the snapshot when it is current,
+# otherwise from the JSON file (and refresh the snapshot for the next worker)
+def read_catalog():
+    signature = _file_signature(TOURS_FILE)
+    use_snapshot = signature is not None and _use_snapshot(signature[1])
+    tours = catalog_snapshot.read_snapshot(TOURS_FILE) if use_snapshot else None
+    if tours is None:
+        with open(TOURS_FILE, 'r') as f:
+            # The signature of the file actually parsed, even if it is replaced meanwhile
+            st = os.fstat(f.fileno())
+            tours = json.load(f)
+        if _use_snapshot(st.st_size):
+            catalog_snapshot.write_snapshot(tours, catalog_snapshot.stat_signature(st))
+    return tours
+
+
+# Private copy of the catalog for admin routes that edit tours in place
+def load_tours_for_update():
+    return copy.deepcopy(load_tours())
+
+
+# Private copy of one tour for admin routes that edit it in place
+def load_tour_for_update(tour_id):
+    return copy.deepcopy(load_tour(tour_id))
+
+
+# --- Writes ---
+
+# Atomically replace a JSON file so readers never see a half-written document.
+# Returns the os.stat_result of the new file.
+def write_json_atomic(path, data, **dump_kwargs):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            st = os.fstat(f.fileno())
+        # mkstemp creates 0600 files; keep the permissions of the file we replace
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        return st
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# Serialise catalog writes across threads and workers
+@contextmanager
+def catalog_lock():
+    with _write_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path = os.path.join(CATALOG_DIR, '.lock') if is_sharded() else TOURS_FILE + '.lock'
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def _invalidate():
+    with _cache_lock:
+        _cache['signature'] = None
+        _manifest_cache['signature'] = None
+
+
+def _write_manifest(entries):
+    write_json_atomic(manifest_path(), {'version': MANIFEST_VERSION, 'tours': entries}, indent=2)
+
+
+def _manifest_entry(tour):
+    entry = tour_summary(tour)
+    entry['file'] = shard_filename(tour.get('id'))
+    return entry
+
+
+def _write_shard(tour):
+    write_json_atomic(os.path.join(CATALOG_DIR, shard_filename(tour.get('id'))), tour, indent=2)
+
+
+def _write_sharded(tours):
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    entries = []
+    for tour in tours:
+        _write_shard(tour)
+        entries.append(_manifest_entry(tour))
+    _write_manifest(entries)
+    # Remove files of tours that are no longer listed
+    keep = {entry['file'] for entry in entries} | {MANIFEST_NAME}
+    for name in os.listdir(CATALOG_DIR):
+        if name.endswith('.json') and name not in keep:
+            os.unlink(os.path.join(CATALOG_DIR, name))
+
+
+# Write the single-file catalog and its snapshot. Callers hold catalog_lock().
+def _write_catalog(tours):
+    st = write_json_atomic(TOURS_FILE, tours, indent=2)
+    if _use_snapshot(st.st_size):
+        catalog_snapshot.write_snapshot(tours, catalog_snapshot.stat_signature(st))
+
+
+# Save the whole catalog
+def save_tours(tours):
+    with catalog_lock():
+        if is_sharded():
+            _write_sharded(tours)
+        else:
+            _write_catalog(tours)
+        _invalidate()
+
+
+# Add or replace one tour. A new tour is appended to the display order.
+# Sharded catalogs rewrite only that tour's file and the manifest.
+def save_tour(tour):
+    with catalog_lock():
+        _put_tours([tour])
+        _invalidate()
+
+
+# Apply update(tour) to a private copy of every tour, under the catalog lock,
+# and save the tours it returns a new version of (it returns None to leave a
+# tour alone). All changes land in one catalog or manifest write. Returns the
+# updated tours.
+def update_tours(update):
+    with catalog_lock():
+        changed = [tour for tour in map(update, load_tours_for_update()) if tour is not None]
+        if changed:
+            _put_tours(changed)
+            _invalidate()
+        return changed
+
+
+# Replace or append tours by id. Callers hold catalog_lock().
+def _put_tours(tours):
+    manifest = load_manifest()
+    if manifest is None:
+        current = load_tours_for_update()
+        positions = {t.get('id'): i for i, t in enumerate(current)}
+        for tour in tours:
+            position = positions.get(tour.get('id'))
+            if position is None:
+                positions[tour.get('id')] = len(current)
+                current.append(tour)
+            else:
+                current[position] = tour
+        _write_catalog(current)
+    else:
+        # Tour files first: if we stop half way the manifest still points at
+        # complete files, just with stale summaries
+        entries = [dict(e) for e in manifest.get('tours', [])]
+        positions = {e['id']: i for i, e in enumerate(entries)}
+        for tour in tours:
+            _write_shard(tour)
+            entry = _manifest_entry(tour)
+            position = positions.get(entry['id'])
+            if position is None:
+                positions[entry['id']] = len(entries)
+                entries.append(entry)
+            else:
+                entries[position] = entry
+        _write_manifest(entries)
+
+
+# Remove one tour. Returns False if it did not exist.
+def delete_tour(tour_id):
+    with catalog_lock():
+        manifest = load_manifest()
+        if manifest is None:
+            tours = load_tours()
+            remaining = [t for t in tours if t.get('id') != tour_id]
+            if len(remaining) == len(tours):
+                return False
+            _write_catalog(remaining)
+        else:
+            entry = manifest['by_id'].get(tour_id)
+            if entry is None:
+                return False
+            _write_manifest([dict(e) for e in manifest.get('tours', []) if e['id'] != tour_id])
+            try:
+                os.unlink(os.path.join(CATALOG_DIR, entry['file']))
+            except FileNotFoundError:
+                pass
+        _invalidate()
+        return True
+
+
+# --- Import / export ---
+
+# Convert a single-file catalog into the sharded layout
+def import_catalog(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        tours = json.load(f)
+    if not isinstance(tours, list):
+        raise ValueError(f'{path} does not contain a list of tours')
+    ids = [tour.get('id') for tour in tours]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1}, key=str)
+    if duplicates:
+        raise ValueError(f'duplicate tour ids: {", ".join(map(str, duplicates))}')
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    with catalog_lock():
+        _write_sharded(tours)
+        _invalidate()
+    return len(tours)
+
+
+# Write the current catalog, whatever its layout, as a single JSON file
+def export_catalog(path):
+    tours = load_tours()
+    write_json_atomic(path, tours, indent=2)
+    return len(tours)
+
+
+def main(argv=None):
+    import argparse  # command line only; keeps it off the worker boot path
+
+    parser = argparse.ArgumentParser(description='Convert the tour catalog between storage layouts')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('import', help='split a single-file catalog into per-tour files').add_argument('path', nargs='?', default=TOURS_FILE)
+    commands.add_parser('export', help='write the catalog as a single JSON file').add_argument('path', nargs='?', default=TOURS_FILE)
+    commands.add_parser('status', help='show which layout is in use')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        count = import_catalog(args.path)
+        print(f'Imported {count} tours into {CATALOG_DIR}/ - the sharded layout is now in use.')
+        print(f'{args.path} is no longer read; export again to update it.')
+    elif args.command == 'export':
+        count = export_catalog(args.path)
+        print(f'Exported {count} tours to {args.path}.')
+        if is_sharded() and os.path.abspath(args.path) == os.path.abspath(TOURS_FILE):
+            print(f'{CATALOG_DIR}/ is still in use; remove {manifest_path()} to switch back to {TOURS_FILE}.')
+    else:
+        layout = f'sharded ({manifest_path()})' if is_sharded() else f'single file ({TOURS_FILE})'
+        print(f'{len(load_summaries())} tours, {layout}, version {catalog_version()}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
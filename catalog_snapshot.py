@@ -0,0 +1,186 @@
+from array import array
+from itertools import accumulate
+import json
+import logging
+import os
+import struct
+import sys
+
+# Compiled binary snapshot of the tour catalog.
+#
+# tours.json stays the source of truth; this is a derived cache written next to
+# it whenever the catalog is saved. The layout is:
+#
+#   header   magic, format version, source mtime_ns/size/inode, counts and lengths
+#   strings  every distinct string once, UTF-8, NUL separated
+#   codes    little-endian uint32 stream describing the tours column by column
+#
+# Tours with the same keys in the same order form a "shape". Each shape stores
+# the catalog positions of its tours, its key ids, then one column per key:
+#
+#   STR   one string id per tour
+#   LIST  one item count per tour, then all item string ids (lists of strings)
+#   JSON  a single string id holding the whole column as a JSON array
+#
+# Loading is a handful of C-level bulk operations per column (string table
+# split, map() over ids, one json.loads) plus zip() into dicts. Equal strings
+# are stored once and shared between tours in memory. In practice this is not
+# faster than json.load: benchmarks/bench_catalog_load.py measures 0.18 vs
+# 0.12 ms on the real catalog and 9.3 vs 7.3 ms at x50, and it is only ahead
+# when most strings repeat. It is off unless CATALOG_SNAPSHOT enables it.
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'tours.snapshot'
+MAGIC = b'AWTC'
+FORMAT_VERSION = 2
+
+_header = struct.Struct('<4sHqqqIII')
+
+# Column kinds
+STR = 0
+LIST = 1
+JSON = 2
+
+# The code stream is little-endian on disk
+_swap_bytes = sys.byteorder != 'little'
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings = {}
+        self.codes = array('I')
+
+    def string(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            if '\0' in value:
+                raise ValueError('catalog strings may not contain NUL characters')
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def column(self, values):
+        codes = self.codes
+        if all(isinstance(v, str) for v in values):
+            codes.append(STR)
+            codes.extend(self.string(v) for v in values)
+        elif all(isinstance(v, list) and all(isinstance(i, str) for i in v) for v in values):
+            codes.append(LIST)
+            codes.extend(len(v) for v in values)
+            for v in values:
+                codes.extend(self.string(i) for i in v)
+        else:
+            codes.append(JSON)
+            codes.append(self.string(json.dumps(values, separators=(',', ':'), ensure_ascii=False)))
+
+
+def encode(tours, source_signature):
+    shapes = {}
+    for position, tour in enumerate(tours):
+        shapes.setdefault(tuple(tour), []).append(position)
+
+    encoder = _Encoder()
+    codes = encoder.codes
+    codes.append(len(shapes))
+    for keys, positions in shapes.items():
+        codes.extend((len(keys), len(positions)))
+        codes.extend(positions)
+        codes.extend(encoder.string(key) for key in keys)
+        for key in keys:
+            encoder.column([tours[p][key] for p in positions])
+
+    table = '\0'.join(encoder.strings).encode('utf-8')
+    if _swap_bytes:
+        codes = array('I', codes)
+        codes.byteswap()
+
+    mtime_ns, size, inode = source_signature
+    header = _header.pack(MAGIC, FORMAT_VERSION, mtime_ns, size, inode, len(tours), len(table), len(codes))
+    return header + table + codes.tobytes()
+
+
+def decode(data, source_signature=None):
+    magic, version, mtime_ns, size, inode, tour_count, table_length, code_count = _header.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    if source_signature is not None and (mtime_ns, size, inode) != tuple(source_signature):
+        return None  # stale: tours.json was edited after the snapshot was written
+
+    offset = _header.size
+    table = data[offset:offset + table_length].decode('utf-8').split('\0')
+    offset += table_length
+    codes = array('I')
+    codes.frombytes(data[offset:offset + code_count * 4])
+    if _swap_bytes:
+        codes.byteswap()
+    codes = codes.tolist()
+
+    lookup = table.__getitem__
+    tours = [None] * tour_count
+    p = 1
+    for _ in range(codes[0]):
+        key_count, row_count = codes[p], codes[p + 1]
+        p += 2
+        positions = codes[p:p + row_count]
+        p += row_count
+        keys = list(map(lookup, codes[p:p + key_count]))
+        p += key_count
+
+        columns = []
+        for _ in range(key_count):
+            kind = codes[p]
+            p += 1
+            if kind == STR:
+                columns.append(list(map(lookup, codes[p:p + row_count])))
+                p += row_count
+            elif kind == LIST:
+                ends = list(accumulate(codes[p:p + row_count]))
+                p += row_count
+                total = ends[-1] if ends else 0
+                items = list(map(lookup, codes[p:p + total]))
+                p += total
+                starts = [0] + ends[:-1]
+                columns.append(list(map(items.__getitem__, map(slice, starts, ends))))
+            else:
+                columns.append(json.loads(table[codes[p]]))
+                p += 1
+
+        for position, row in zip(positions, zip(*columns)):
+            tours[position] = dict(zip(keys, row))
+    return tours
+
+
+# Signature of the source file from an os.stat()/os.fstat() result
+def stat_signature(st):
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def source_signature(path):
+    return stat_signature(os.stat(path))
+
+
+# Write the snapshot of tours, stamped with the signature of the source file
+# they were read from or written to. Take it with os.fstat() on that file's
+# descriptor: a later os.stat() of the path may already see a newer file.
+# Best effort: a failure only means the next worker parses the JSON.
+def write_snapshot(tours, source_signature, snapshot_path=SNAPSHOT_FILE):
+    try:
+        data = encode(tours, source_signature)
+        tmp_path = snapshot_path + '.tmp.%d' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, snapshot_path)
+        return True
+    except (OSError, ValueError) as e:
+        logger.warning('Error writing catalog snapshot: %s', e, extra={'event': 'snapshot_write_failed'})
+        return False
+
+
+# Tours from the snapshot, or None when it is missing, corrupt or stale
+def read_snapshot(source_path, snapshot_path=SNAPSHOT_FILE):
+    try:
+        with open(snapshot_path, 'rb') as f:
+            data = f.read()
+        return decode(data, source_signature(source_path))
+    except (OSError, ValueError, struct.error, IndexError, TypeError):
+        return None
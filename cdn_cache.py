@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import sys
+import threading
+
+from flask import request
+from werkzeug.utils import import_string
+
+# Cache headers for an edge cache (CDN) in front of gunicorn, and purging it.
+#
+# Public pages get
+#
+#   Cache-Control: public, max-age=0, s-maxage=<N>, stale-while-revalidate=<M>
+#   Surrogate-Key: site catalog tour:<id> ...
+#   ETag (conditional requests answer 304)
+#
+# so the CDN keeps them for N seconds and may serve a stale copy for up to M
+# more while it refetches, and browsers always revalidate (a browser cache can't
+# be purged). Pages vary by Accept-Language, which add_locale_headers already
+# declares. Booking pages are marked private so no shared cache keeps them.
+#
+# Every cached page has the "site" key; pages listing the catalog (home page,
+# sitemap) have "catalog" and a tour page has "tour:<id>". Saving or deleting a
+# tour in the admin panel, and the date maintenance job, purge "catalog" and
+# the tours' keys through the configured purger:
+#
+#   log    only log the keys (default)
+#   local  remember them in memory, a stand-in CDN for tests and development
+#   http   POST them to CDN_PURGE_URL (Fastly's purge-by-key API)
+#   any other value is imported as a purger class (module.Class) with a
+#   purge(keys) method
+#
+# Purge everything by hand with "python cdn_cache.py purge [KEY ...]".
+
+logger = logging.getLogger(__name__)
+
+# endpoint=s_maxage/stale_while_revalidate, or endpoint=off for no headers
+CDN_CACHE_POLICY = os.environ.get('CDN_CACHE_POLICY', '')
+CDN_SURROGATE_KEY_HEADER = os.environ.get('CDN_SURROGATE_KEY_HEADER', 'Surrogate-Key')
+CDN_PURGER = os.environ.get('CDN_PURGER', 'log')
+CDN_PURGE_URL = os.environ.get('CDN_PURGE_URL', '')
+CDN_PURGE_TOKEN = os.environ.get('CDN_PURGE_TOKEN', '')
+CDN_PURGE_TIMEOUT = float(os.environ.get('CDN_PURGE_TIMEOUT', 5))
+
+# Seconds a CDN may keep each public page, and serve it stale while refetching
+DEFAULT_POLICIES = {
+    'index': (300, 86400),
+    'tour_detail': (300, 86400),
+    'about': (3600, 86400),
+    'sitemap': (3600, 86400),
+    'robots_txt': (86400, 86400),
+    'api.tour_booking_schema': (300, 86400),
+}
+
+# Surrogate keys by endpoint, besides "site"; filled in from the URL's values
+SURROGATE_KEYS = {
+    'index': ['catalog'],
+    'sitemap': ['catalog'],
+    'tour_detail': ['tour:{tour_id}'],
+    'api.tour_booking_schema': ['tour:{tour_id}'],
+}
+
+# Pages with customer details: never kept by a shared cache
+PRIVATE_ENDPOINTS = ('booking_confirmation',)
+
+_state = {'purger': None}
+_purger_lock = threading.Lock()
+
+
+def parse_policies(value, default=DEFAULT_POLICIES):
+    policies = dict(default)
+    for item in (value or '').split(','):
+        name, _, policy = item.partition('=')
+        name, policy = name.strip(), policy.strip()
+        if not name:
+            continue
+        if policy == 'off':
+            policies.pop(name, None)
+            continue
+        s_maxage, _, stale = policy.partition('/')
+        try:
+            policies[name] = (int(s_maxage), int(stale or 0))
+        except ValueError:
+            continue
+    return policies
+
+
+POLICIES = parse_policies(CDN_CACHE_POLICY)
+
+
+def surrogate_keys(endpoint, view_args):
+    keys = ['site']
+    for key in SURROGATE_KEYS.get(endpoint, ()):
+        keys.append(key.format(**(view_args or {})).replace(' ', '_'))
+    return keys
+
+
+def tour_keys(tour_ids):
+    return ['catalog'] + [f'tour:{tour_id}' for tour_id in tour_ids]
+
+
+def add_cache_headers(response):
+    endpoint = request.endpoint
+    if endpoint in PRIVATE_ENDPOINTS:
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    policy = POLICIES.get(endpoint)
+    # Only successful GETs that don't set a cookie are safe to share (a 304
+    # from a view that handles conditional requests itself keeps the headers)
+    if (policy is None or request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304)
+            or 'Set-Cookie' in response.headers or response.is_streamed):
+        return response
+    s_maxage, stale = policy
+    cache_control = f'public, max-age=0, s-maxage={s_maxage}'
+    if stale:
+        cache_control += f', stale-while-revalidate={stale}'
+    response.headers['Cache-Control'] = cache_control
+    response.headers[CDN_SURROGATE_KEY_HEADER] = ' '.join(surrogate_keys(endpoint, request.view_args))
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+class LogPurger:
+    def purge(self, keys):
+        pass
+
+
+# Stand-in CDN for tests and development: keeps every purge in memory
+class LocalPurger:
+    def __init__(self):
+        self.purged = []
+
+    def purge(self, keys):
+        self.purged.append(list(keys))
+
+    def purged_keys(self):
+        return {key for keys in self.purged for key in keys}
+
+
+# Fastly's purge-by-key API: POST {"surrogate_keys": [...]} with the API token
+# in Fastly-Key, to https://api.fastly.com/service/<service id>/purge
+class HTTPPurger:
+    def __init__(self, url=CDN_PURGE_URL, token=CDN_PURGE_TOKEN, timeout=CDN_PURGE_TIMEOUT):
+        if not url:
+            raise ValueError('CDN_PURGE_URL is not set')
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def purge(self, keys):
+        import urllib.request  # only needed with this purger; keeps it off the worker boot path
+
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.token:
+            headers['Fastly-Key'] = self.token
+        body = json.dumps({'surrogate_keys': list(keys)}).encode()
+        req = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+PURGERS = {'log': LogPurger, 'local': LocalPurger, 'http': HTTPPurger}
+
+
+def get_purger():
+    with _purger_lock:
+        if _state['purger'] is None:
+            purger_class = PURGERS.get(CDN_PURGER)
+            if purger_class is None:
+                purger_class = import_string(CDN_PURGER)
+            _state['purger'] = purger_class()
+        return _state['purger']
+
+
+# Use this purger instead of CDN_PURGER's (tests pass a LocalPurger)
+def set_purger(purger):
+    with _purger_lock:
+        _state['purger'] = purger
+
+
+# Drop pages with any of these keys from the CDN. Never raises, so a CDN
+# outage cannot fail the admin save that triggered it.
+def purge(keys):
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return False
+    try:
+        get_purger().purge(keys)
+    except Exception:
+        logger.exception('CDN purge failed', extra={'event': 'cdn_purge_failed', 'keys': keys})
+        return False
+    logger.info('CDN purged', extra={'event': 'cdn_purge', 'keys': keys})
+    return True
+
+
+# A change to these tours: their pages and every page listing the catalog
+def purge_tours(tour_ids):
+    return purge(tour_keys(tour_ids))
+
+
+def init_app(app):
+    app.after_request(add_cache_headers)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ['purge']:
+        sys.exit('usage: python cdn_cache.py purge [KEY ...]')
+    keys = sys.argv[2:] or ['site']
+    if not purge(keys):
+        sys.exit('Purge failed, see the log')
+    print(f"Purged {' '.join(keys)}")
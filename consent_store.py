@@ -0,0 +1,212 @@
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: only guard threads within one process
+    fcntl = None
+
+from catalog import write_json_atomic
+
+# Cookie consent storage.
+#
+# cookie_consents.json holds one row per consent instead of one object:
+#
+#   {"format": 2,
+#    "statuses": ["accepted", "declined"],
+#    "user_agents": ["Mozilla/5.0 ...", ...],
+#    "records": [[timestamp, status, ip_address, user_agent, count], ...]}
+#
+# where timestamp is whole seconds since the epoch, status and user_agent are
+# indexes into the two tables (a few browsers make up most traffic, so each
+# User-Agent string is stored once) and count is how many consents the row
+# stands for. With CONSENT_DEDUPE_WINDOW set, a consent with the same status
+# from the same IP and user agent within that many seconds of the last one
+# bumps that row's count instead of adding a row.
+#
+# The old format (a list of full records) is still read, and is converted on
+# the next write or with "python consent_store.py compact". Reads are cached
+# per file signature; expand() rebuilds full records for the admin page and
+# CSV export.
+
+logger = logging.getLogger(__name__)
+
+CONSENTS_FILE = 'cookie_consents.json'
+LOCK_FILE = CONSENTS_FILE + '.lock'
+FORMAT = 2
+
+DEDUPE_WINDOW = int(os.environ.get('CONSENT_DEDUPE_WINDOW', 0))
+
+# Answers the consent banner sends; anything else is stored as "unknown"
+STATUSES = ('accepted', 'declined')
+
+# Row fields
+TIMESTAMP, STATUS, IP_ADDRESS, USER_AGENT, COUNT = range(5)
+
+_thread_lock = threading.RLock()
+_cache = {'signature': None, 'store': None}
+
+
+class ConsentStore:
+    def __init__(self, statuses=None, user_agents=None, records=None):
+        self.statuses = list(statuses or [])
+        self.user_agents = list(user_agents or [])
+        self.records = records if records is not None else []
+        self._status_codes = {status: code for code, status in enumerate(self.statuses)}
+        self._agent_codes = {agent: code for code, agent in enumerate(self.user_agents)}
+
+    @classmethod
+    def from_json(cls, data):
+        if isinstance(data, list):
+            return cls.from_records(data)
+        return cls(data.get('statuses'), data.get('user_agents'), data.get('records'))
+
+    # Convert old-format records, oldest first
+    @classmethod
+    def from_records(cls, records):
+        store = cls()
+        for record in sorted(records, key=lambda r: r.get('timestamp', '')):
+            store.add(record.get('status', 'unknown'), record.get('ip_address'), record.get('user_agent', 'Unknown'),
+                      _parse_timestamp(record.get('timestamp')), dedupe_window=0)
+        return store
+
+    def to_json(self):
+        return {'format': FORMAT, 'statuses': self.statuses, 'user_agents': self.user_agents, 'records': self.records}
+
+    def _intern(self, table, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    # Record one consent. Returns the row it was counted in.
+    def add(self, status, ip_address, user_agent, timestamp, dedupe_window=DEDUPE_WINDOW):
+        status_code = self._intern(self.statuses, self._status_codes, consent_status(status))
+        agent_code = self._intern(self.user_agents, self._agent_codes, user_agent)
+        if dedupe_window > 0:
+            # Rows are in time order: only the tail can be inside the window
+            for row in reversed(self.records):
+                if row[TIMESTAMP] < timestamp - dedupe_window:
+                    break
+                if row[IP_ADDRESS] == ip_address and row[USER_AGENT] == agent_code:
+                    if row[STATUS] != status_code:
+                        break  # changed their mind: keep both answers
+                    row[TIMESTAMP] = timestamp
+                    row[COUNT] += 1
+                    return row
+        row = [timestamp, status_code, ip_address, agent_code, 1]
+        self.records.append(row)
+        return row
+
+    # Consents per status, counting collapsed rows in full
+    def status_counts(self):
+        counts = [0] * len(self.statuses)
+        for row in self.records:
+            counts[row[STATUS]] += row[COUNT]
+        return dict(zip(self.statuses, counts))
+
+    # Full records, newest first
+    def expand(self, limit=None):
+        rows = self.records[::-1] if limit is None else self.records[:-limit - 1:-1]
+        return [{
+            'timestamp': datetime.fromtimestamp(row[TIMESTAMP]).isoformat(),
+            'status': self.statuses[row[STATUS]],
+            'ip_address': row[IP_ADDRESS],
+            'user_agent': self.user_agents[row[USER_AGENT]],
+            'count': row[COUNT],
+        } for row in rows]
+
+
+def consent_status(value):
+    return value if isinstance(value, str) and value in STATUSES else 'unknown'
+
+
+def _parse_timestamp(value):
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except ValueError:
+        return 0
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _read_store():
+    try:
+        with open(CONSENTS_FILE, 'r') as f:
+            return ConsentStore.from_json(json.load(f))
+    except FileNotFoundError:
+        return ConsentStore()
+
+
+# Load the consent store. The returned store is shared, so treat it as read-only.
+def load_consents():
+    signature = _file_signature(CONSENTS_FILE)
+    if signature is None:
+        return ConsentStore()
+    if signature != _cache['signature']:
+        _cache['store'] = _read_store()
+        _cache['signature'] = signature
+    return _cache['store']
+
+
+@contextmanager
+def consents_lock():
+    started = time.perf_counter()
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            acquired = time.perf_counter()
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        if logger.isEnabledFor(logging.DEBUG):
+            released = time.perf_counter()
+            logger.debug('Consents lock released', extra={
+                'event': 'lock_timing', 'lock': 'consents', 'wait_ms': round((acquired - started) * 1000, 3),
+                'held_ms': round((released - acquired) * 1000, 3)})
+
+
+def _write_store(store):
+    write_json_atomic(CONSENTS_FILE, store.to_json(), separators=(',', ':'))
+    _cache['signature'] = None
+
+
+# Save one consent
+def record_consent(status, ip_address, user_agent, timestamp=None):
+    with consents_lock():
+        store = _read_store()
+        store.add(status, ip_address, user_agent, int(timestamp if timestamp is not None else time.time()))
+        _write_store(store)
+
+
+# Rewrite the file in the compact format. Returns (bytes before, bytes after).
+def compact():
+    with consents_lock():
+        before = os.path.getsize(CONSENTS_FILE) if os.path.exists(CONSENTS_FILE) else 0
+        _write_store(_read_store())
+        return before, os.path.getsize(CONSENTS_FILE)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['compact']:
+        sys.exit('usage: python consent_store.py compact')
+    before, after = compact()
+    print(f'{CONSENTS_FILE}: {before} -> {after} bytes')
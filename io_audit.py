@@ -0,0 +1,223 @@
+from collections import Counter
+from contextlib import contextmanager
+import builtins
+import fnmatch
+import io
+import json
+import logging
+import os
+import threading
+
+from flask import g, template_rendered
+
+# Per-request I/O accounting, for benchmarks/perf_gate.py and for debugging.
+#
+# While installed, open() (and os.fdopen), json.loads/json.load, json.dump/
+# json.dumps and template rendering are counted for whichever audit is active
+# in the current thread: files opened (by path, relative to the working
+# directory), characters read and written through them, JSON documents parsed
+# and serialised, and templates rendered. Code outside an audit pays one
+# thread-local lookup per call.
+#
+#   with io_audit.audit() as counts:
+#       client.get('/tour/x')
+#   counts.opened('tours*')  # -> 1
+#
+# With IO_AUDIT=1 every request is audited and its counts are returned in the
+# X-IO-Audit header and logged (event "io_audit", DEBUG). Never enable it in
+# production: every open() returns a wrapper object.
+
+logger = logging.getLogger(__name__)
+
+IO_AUDIT = os.environ.get('IO_AUDIT', '0') == '1'
+
+HEADER = 'X-IO-Audit'
+
+_local = threading.local()
+_originals = {}
+_install_lock = threading.Lock()
+
+
+class IOCounts:
+    def __init__(self):
+        self.files = Counter()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.json_parses = 0
+        self.json_dumps = 0
+        self.templates = []
+
+    @property
+    def opens(self):
+        return sum(self.files.values())
+
+    # Files opened whose path matches a glob pattern
+    def opened(self, pattern):
+        return sum(count for path, count in self.files.items() if fnmatch.fnmatch(path, pattern))
+
+    def as_dict(self):
+        return {'opens': self.opens, 'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written,
+                'json_parses': self.json_parses, 'json_dumps': self.json_dumps,
+                'templates': len(self.templates), 'files': dict(self.files)}
+
+    def summary(self):
+        return (f'opens={self.opens} read={self.bytes_read} written={self.bytes_written} '
+                f'json_parses={self.json_parses} json_dumps={self.json_dumps} templates={len(self.templates)}')
+
+
+def _current():
+    return getattr(_local, 'counts', None)
+
+
+# File object that counts what passes through it (characters in text mode)
+class _CountedFile:
+    def __init__(self, f, counts):
+        self._f = f
+        self._counts = counts
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._counts.bytes_read += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        self._counts.bytes_read += len(data)
+        return data
+
+    def readlines(self, *args):
+        lines = self._f.readlines(*args)
+        self._counts.bytes_read += sum(map(len, lines))
+        return lines
+
+    def __iter__(self):
+        for line in self._f:
+            self._counts.bytes_read += len(line)
+            yield line
+
+    def write(self, data):
+        self._counts.bytes_written += len(data)
+        return self._f.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._f.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def _display_path(file):
+    if isinstance(file, int):
+        try:
+            file = os.readlink(f'/proc/self/fd/{file}')
+        except OSError:
+            return f'<fd {file}>'
+    path = os.fsdecode(file)
+    relative = os.path.relpath(os.path.abspath(path))
+    return path if relative.startswith('..') else relative
+
+
+def _open(file, *args, **kwargs):
+    counts = _current()
+    f = _originals['open'](file, *args, **kwargs)
+    if counts is None:
+        return f
+    counts.files[_display_path(file)] += 1
+    return _CountedFile(f, counts)
+
+
+def _loads(*args, **kwargs):
+    counts = _current()
+    if counts is not None:
+        counts.json_parses += 1
+    return _originals['loads'](*args, **kwargs)
+
+
+def _dumps(*args, **kwargs):
+    counts = _current()
+    if counts is not None:
+        counts.json_dumps += 1
+    return _originals['dumps'](*args, **kwargs)
+
+
+def _dump(*args, **kwargs):
+    counts = _current()
+    if counts is not None:
+        counts.json_dumps += 1
+    return _originals['dump'](*args, **kwargs)
+
+
+def _on_template_rendered(sender, template, context, **extra):
+    counts = _current()
+    if counts is not None:
+        counts.templates.append(template.name)
+
+
+# Patch the counted functions, once per process
+def install():
+    with _install_lock:
+        if _originals:
+            return
+        _originals.update(open=builtins.open, loads=json.loads, dumps=json.dumps, dump=json.dump)
+        # io.open is what os.fdopen calls; json.load calls json.loads
+        builtins.open = io.open = _open
+        json.loads, json.dumps, json.dump = _loads, _dumps, _dump
+        template_rendered.connect(_on_template_rendered)
+
+
+def uninstall():
+    with _install_lock:
+        if not _originals:
+            return
+        builtins.open = io.open = _originals['open']
+        json.loads, json.dumps, json.dump = _originals['loads'], _originals['dumps'], _originals['dump']
+        template_rendered.disconnect(_on_template_rendered)
+        _originals.clear()
+
+
+# Count I/O in this thread for the duration of the block
+@contextmanager
+def audit():
+    install()
+    counts = IOCounts()
+    previous = _current()
+    _local.counts = counts
+    try:
+        yield counts
+    finally:
+        _local.counts = previous
+
+
+def start_audit():
+    g.io_audit = audit()
+    g.io_counts = g.io_audit.__enter__()
+
+
+def finish_audit(response):
+    counts = g.get('io_counts')
+    if counts is not None:
+        response.headers[HEADER] = counts.summary()
+        logger.debug('Request I/O', extra=dict(counts.as_dict(), event='io_audit'))
+    return response
+
+
+def stop_audit(exc=None):
+    context = g.pop('io_audit', None)
+    if context is not None:
+        context.__exit__(None, None, None)
+
+
+def init_app(app):
+    if IO_AUDIT:
+        install()
+        app.before_request(start_audit)
+        app.after_request(finish_audit)
+        app.teardown_request(stop_audit)
@@ -0,0 +1,226 @@
+from datetime import date
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from catalog import update_tours, load_tours_for_update
+from tour_dates import MATERIALIZE_DAYS, TourSchedule, parse_date
+import static_export
+import cdn_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no leader election, no scheduler
+    fcntl = None
+
+# Catalog housekeeping: expire past tour dates and close tours that have run
+# out of dates.
+#
+# Past entries in dates_data / available_dates, expired weekly rules and past
+# excluded days are moved out of the catalog into DATES_ARCHIVE_FILE (one JSON
+# line per tour per run), so the live catalog only holds what is still
+# bookable. A tour that had dates but has no future enabled ones left is set to
+# booking_status "closed" - once its dates are gone it would otherwise read as
+# bookable on any day. The changes are saved with catalog.update_tours, which
+# bumps the catalog version so every worker's caches refresh, and the static
+# export (if enabled) is brought up to date afterwards.
+#
+# Run it daily from cron with "python maintenance.py", or set
+# SCHEDULER_ENABLED=1 on the production server to run it in a background
+# thread started by the first request each worker serves. It is off by default
+# because it rewrites the catalog: test clients, the static export CLI and the
+# benchmarks must not archive dates in whatever copy they run against.
+# Workers elect a leader with a non-blocking flock on SCHEDULER_LOCK_FILE, in
+# the data directory so only workers serving the same catalog compete: only
+# the holder runs the job, and when it exits the kernel releases the lock and
+# another worker takes over at its next attempt.
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '0').lower() in ('1', 'true', 'yes', 'on')
+SCHEDULER_INTERVAL = int(os.environ.get('SCHEDULER_INTERVAL', 3600))
+SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE', 'maintenance.lock')
+DATES_ARCHIVE_FILE = os.environ.get('DATES_ARCHIVE_FILE', 'tour_dates_archive.jsonl')
+
+_scheduler = {'pid': None, 'leader_fd': None, 'thread': None}
+_scheduler_lock = threading.Lock()
+
+
+def _is_past(value, today):
+    day = parse_date(value)
+    return day is not None and day < today
+
+
+# A tour has future dates when one is enabled within the booking window, or a
+# weekly rule carries on past it
+def _has_future_dates(schedule, today):
+    if schedule.enabled_dates(today, MATERIALIZE_DAYS):
+        return True
+    horizon = today.toordinal() + MATERIALIZE_DAYS
+    return any(end >= horizon for ranges in schedule.weekly for _, end in ranges)
+
+
+# Split a tour's dates into what stays and what is archived. Returns
+# (updated tour, archived dates) or (None, None) when nothing changes.
+def expire_tour_dates(tour, today):
+    updated = dict(tour)
+    archived = {}
+
+    dates_data = tour.get('dates_data') or []
+    past = [entry for entry in dates_data if _is_past(entry.get('date'), today)]
+    if past:
+        updated['dates_data'] = [entry for entry in dates_data if not _is_past(entry.get('date'), today)]
+        archived['dates_data'] = past
+
+    available = tour.get('available_dates') or []
+    past = [value for value in available if _is_past(value, today)]
+    if past:
+        updated['available_dates'] = [value for value in available if not _is_past(value, today)]
+        archived['available_dates'] = past
+
+    rules = tour.get('date_rules') or {}
+    weekly = rules.get('weekly') or []
+    exclude = rules.get('exclude') or []
+    expired_rules = [rule for rule in weekly if rule.get('end') and _is_past(rule['end'], today)]
+    past_excludes = [value for value in exclude if _is_past(value, today)]
+    if expired_rules or past_excludes:
+        kept = dict(rules)
+        kept['weekly'] = [rule for rule in weekly if rule not in expired_rules]
+        kept['exclude'] = [value for value in exclude if value not in past_excludes]
+        updated['date_rules'] = {key: value for key, value in kept.items() if value}
+        archived['date_rules'] = {key: value for key, value in
+                                  (('weekly', expired_rules), ('exclude', past_excludes)) if value}
+
+    if (tour.get('booking_status', 'open') == 'open' and TourSchedule(tour).has_dates
+            and not _has_future_dates(TourSchedule(updated), today)):
+        updated['booking_status'] = 'closed'
+        archived['closed'] = True
+
+    if not archived:
+        return None, None
+    return updated, archived
+
+
+def _append_archive(records):
+    with open(DATES_ARCHIVE_FILE, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+# Expire past dates across the catalog. Returns a summary of what changed.
+def run_maintenance(today=None, dry_run=False):
+    today = parse_date(today) or date.today()
+    stats = {'today': today.isoformat(), 'tours_updated': 0, 'dates_archived': 0, 'tours_closed': []}
+    archive = []
+
+    def expire(tour):
+        updated, archived = expire_tour_dates(tour, today)
+        if updated is None:
+            return None
+        stats['tours_updated'] += 1
+        stats['dates_archived'] += len(archived.get('dates_data', [])) + len(archived.get('available_dates', []))
+        if archived.pop('closed', False):
+            stats['tours_closed'].append(tour.get('id'))
+        archive.append(dict(archived, tour_id=tour.get('id'), archived_on=today.isoformat()))
+        return updated
+
+    if dry_run:
+        for tour in load_tours_for_update():
+            expire(tour)
+        return stats
+
+    started = time.perf_counter()
+    update_tours(expire)
+    if archive:
+        _append_archive(archive)
+    for tour_id in stats['tours_closed']:
+        logger.warning('Closed bookings for tour %s: no future dates left', tour_id,
+                       extra={'event': 'tour_auto_closed', 'tour_id': tour_id})
+    logger.info('Expired past tour dates', extra={
+        'event': 'dates_expired', 'tours_updated': stats['tours_updated'],
+        'dates_archived': stats['dates_archived'], 'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)})
+    if archive:
+        cdn_cache.purge_tours([entry['tour_id'] for entry in archive])
+    # Also picks up the new day: exported tour pages list dates from today
+    static_export.refresh_stale()
+    return stats
+
+
+# --- Background scheduler ---
+
+# Try to become the leader. The lock is held for the life of the process.
+def _acquire_leadership():
+    if _scheduler['leader_fd'] is not None:
+        return True
+    fd = os.open(SCHEDULER_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _scheduler['leader_fd'] = fd
+    logger.info('Scheduler leader elected', extra={'event': 'scheduler_leader', 'pid': os.getpid()})
+    return True
+
+
+def _run_scheduler(interval):
+    while True:
+        try:
+            if _acquire_leadership():
+                run_maintenance()
+        except Exception:
+            logger.exception('Scheduled maintenance failed', extra={'event': 'maintenance_failed'})
+        time.sleep(interval)
+
+
+# Start this worker's scheduler thread once. Runs on the first request rather
+# than at import so that with gunicorn --preload it starts in each worker, not
+# in the master before the fork.
+def ensure_scheduler():
+    if _scheduler['pid'] == os.getpid():
+        return
+    with _scheduler_lock:
+        if _scheduler['pid'] == os.getpid():
+            return
+        # A forked child has no scheduler thread, and must not keep its
+        # parent's leader lock alive
+        if _scheduler['leader_fd'] is not None:
+            os.close(_scheduler['leader_fd'])
+            _scheduler['leader_fd'] = None
+        _scheduler['pid'] = os.getpid()
+        thread = threading.Thread(target=_run_scheduler, args=(SCHEDULER_INTERVAL,),
+                                  name='maintenance-scheduler', daemon=True)
+        thread.start()
+        _scheduler['thread'] = thread
+
+
+def init_app(app):
+    if SCHEDULER_ENABLED and fcntl is not None:
+        app.before_request(ensure_scheduler)
+
+
+def main(argv=None):
+    import argparse  # command line only; keeps it off the worker boot path
+
+    parser = argparse.ArgumentParser(description='Archive past tour dates and close tours with no future dates')
+    parser.add_argument('--today', help='treat this date (YYYY-MM-DD) as today')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without saving')
+    args = parser.parse_args(argv)
+
+    if args.today and parse_date(args.today) is None:
+        parser.error(f'invalid date: {args.today}')
+    stats = run_maintenance(args.today, dry_run=args.dry_run)
+    prefix = 'Would update' if args.dry_run else 'Updated'
+    print(f"{prefix} {stats['tours_updated']} tours as of {stats['today']}: "
+          f"{stats['dates_archived']} past dates archived, {len(stats['tours_closed'])} tours closed"
+          + (f" ({', '.join(map(str, stats['tours_closed']))})" if stats['tours_closed'] else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+from collections import Counter
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from flask import g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: arming is per process only
+    fcntl = None
+
+# On-demand request profiling.
+#
+# Nothing is profiled unless asked for, in one of two ways:
+#   - an admin arms an endpoint on /admin/profiles, which profiles its next N
+#     requests in whichever worker serves them (the counter lives in
+#     PROFILE_DIR so all workers share it)
+#   - a request carries a valid X-Profile header, signed with PROFILE_SECRET
+#     (or SESSION_SECRET), which profiles just that request. Without either
+#     in the environment the header is ignored: the app's fallback secret is
+#     in the source, so anyone could sign one.
+#
+# Two modes: "cprofile" (deterministic, writes a .pstats file) and "sample"
+# (a thread samples the request's stack every few ms and writes a .collapsed
+# file for flame graph tools). When nothing is armed, the per-request cost is
+# a header lookup plus a cached check of the arm file, stat()ed at most once
+# a second per worker.
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'albaniawalktour-profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 2)) / 1000
+
+HEADER = 'X-Profile'
+# Key for signed header values; None turns header profiling off
+HEADER_SECRET = os.environ.get('PROFILE_SECRET') or os.environ.get('SESSION_SECRET') or None
+# Signed header values are valid for this long
+HEADER_MAX_AGE = 300
+# Armed endpoints disarm themselves after this long even if unused
+ARM_MAX_AGE = 3600
+
+MODES = ('cprofile', 'sample')
+
+ARM_FILE = 'armed.json'
+EXTENSIONS = {'cprofile': '.pstats', 'sample': '.collapsed'}
+
+_state = {'checked': 0.0, 'signature': None, 'armed': None}
+_state_lock = threading.Lock()
+_unsafe_chars = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _arm_path():
+    return os.path.join(PROFILE_DIR, ARM_FILE)
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _read_arm_file():
+    try:
+        with open(_arm_path(), 'r') as f:
+            armed = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not armed or armed.get('remaining', 0) <= 0 or armed.get('expires', 0) < time.time():
+        return None
+    return armed
+
+
+def _write_arm_file(armed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp_path = _arm_path() + '.tmp.%d' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump(armed, f)
+    os.replace(tmp_path, _arm_path())
+
+
+class _ArmLock:
+    def __enter__(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self.fd = os.open(_arm_path() + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+
+
+# Cached view of the arm file, refreshed at most once a second
+def armed_state():
+    now = time.monotonic()
+    if now - _state['checked'] < 1.0:
+        return _state['armed']
+    with _state_lock:
+        _state['checked'] = now
+        signature = _signature(_arm_path())
+        if signature != _state['signature']:
+            _state['signature'] = signature
+            _state['armed'] = _read_arm_file() if signature else None
+        return _state['armed']
+
+
+def _forget_state():
+    _state['checked'] = 0.0
+    _state['signature'] = None
+
+
+# Profile the next `count` requests to `endpoint` (e.g. "book_tour" or
+# "admin_dashboard"), in any worker
+def arm(endpoint, count, mode='cprofile'):
+    with _ArmLock():
+        _write_arm_file({
+            'endpoint': endpoint,
+            'remaining': int(count),
+            'total': int(count),
+            'mode': mode if mode in MODES else 'cprofile',
+            'expires': time.time() + ARM_MAX_AGE,
+        })
+    _forget_state()
+
+
+def disarm():
+    with _ArmLock():
+        try:
+            os.unlink(_arm_path())
+        except FileNotFoundError:
+            pass
+    _forget_state()
+
+
+def endpoint_matches(armed_endpoint, endpoint):
+    # Blueprint endpoints can be named with or without their prefix
+    return endpoint == armed_endpoint or endpoint.rsplit('.', 1)[-1] == armed_endpoint
+
+
+# Take one of the armed slots for this endpoint. Returns the mode or None.
+def _claim(endpoint):
+    with _ArmLock():
+        armed = _read_arm_file()
+        if armed is None or not endpoint_matches(armed['endpoint'], endpoint):
+            return None
+        armed['remaining'] -= 1
+        if armed['remaining'] > 0:
+            _write_arm_file(armed)
+        else:
+            os.unlink(_arm_path())
+    _forget_state()
+    return armed['mode']
+
+
+def sign_header(secret, mode='cprofile', timestamp=None):
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    message = f'{timestamp}.{mode}'
+    digest = hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+    return f'{message}.{digest}'
+
+
+# Mode requested by a signed X-Profile header value, or None if it is invalid
+def verify_header(value, secret):
+    try:
+        timestamp, mode, digest = value.split('.')
+        timestamp = int(timestamp)
+    except ValueError:
+        return None
+    if mode not in MODES or abs(time.time() - timestamp) > HEADER_MAX_AGE:
+        return None
+    expected = sign_header(secret, mode, timestamp).rsplit('.', 1)[1]
+    return mode if hmac.compare_digest(digest, expected) else None
+
+
+class StackSampler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    # One "frame;frame;frame count" line per distinct stack
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def start_profile():
+    endpoint = request.endpoint
+    if endpoint is None or endpoint == 'static':
+        return
+
+    mode = None
+    header = request.headers.get(HEADER)
+    if header and HEADER_SECRET:
+        mode = verify_header(header, HEADER_SECRET)
+    if mode is None:
+        armed = armed_state()
+        if armed is None or not endpoint_matches(armed['endpoint'], endpoint):
+            return
+        mode = _claim(endpoint)
+        if mode is None:
+            return  # another worker took the last slot
+
+    if mode == 'sample':
+        profiler = StackSampler(threading.get_ident())
+        profiler.start()
+    else:
+        import cProfile  # imported on first use to keep worker boot light
+        profiler = cProfile.Profile()
+        profiler.enable()
+    g.profile = (mode, profiler, time.perf_counter())
+
+
+def stop_profile(exc=None):
+    active = g.pop('profile', None)
+    if active is None:
+        return
+    mode, profiler, started = active
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if mode == 'sample':
+        profiler.stop()
+    else:
+        profiler.disable()
+    try:
+        save_profile(mode, profiler, request.endpoint, request.method, request.path, elapsed_ms)
+    except OSError as e:
+        logger.warning('Error saving profile: %s', e, extra={'event': 'profile_save_failed'})
+
+
+def save_profile(mode, profiler, endpoint, method, path, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    base = f'{stamp}-{_unsafe_chars.sub("_", endpoint)}-{os.getpid()}-{int(time.time() * 1000) % 1000:03d}'
+    filename = base + EXTENSIONS[mode]
+    if mode == 'sample':
+        with open(os.path.join(PROFILE_DIR, filename), 'w') as f:
+            f.write(profiler.collapsed())
+    else:
+        profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+    with open(os.path.join(PROFILE_DIR, base + '.json'), 'w') as f:
+        json.dump({'file': filename, 'mode': mode, 'endpoint': endpoint, 'method': method,
+                   'path': path, 'elapsed_ms': round(elapsed_ms, 2), 'pid': os.getpid(),
+                   'created': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+    prune_profiles()
+
+
+# Profiles newest first, as their metadata dicts
+def list_profiles():
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        if not name.endswith('.json') or name == ARM_FILE:
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), 'r') as f:
+                info = json.load(f)
+            info['size'] = os.path.getsize(os.path.join(PROFILE_DIR, info['file']))
+        except (OSError, ValueError, KeyError):
+            continue
+        profiles.append(info)
+    return profiles
+
+
+def prune_profiles(keep=PROFILE_KEEP):
+    for info in list_profiles()[keep:]:
+        for name in (info['file'], os.path.splitext(info['file'])[0] + '.json'):
+            try:
+                os.unlink(os.path.join(PROFILE_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+# Absolute path of a profile file, or None if the name is not one of ours
+def profile_path(filename):
+    if os.path.basename(filename) != filename or not filename.endswith(tuple(EXTENSIONS.values())):
+        return None
+    path = os.path.join(PROFILE_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+
+# Text summary of a profile for the admin page
+def render_profile(path, limit=40):
+    if path.endswith('.collapsed'):
+        with open(path, 'r') as f:
+            lines = f.readlines()
+        return ''.join(lines[:limit])
+    import pstats
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def init_app(app):
+    app.before_request(start_profile)
+    app.teardown_request(stop_profile)
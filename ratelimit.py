@@ -0,0 +1,291 @@
+from flask import request, jsonify
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
+import asyncio
+import inspect
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: fall back to per-process slots only
+    fcntl = None
+
+# Rate limiting and load shedding for the unauthenticated write endpoints.
+#
+# Token buckets live in a small SQLite file so every gunicorn worker on the
+# host draws from the same budget. The write concurrency cap uses a set of
+# flock()ed slot files, which the kernel releases automatically if a worker dies.
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DIR = os.environ.get('RATE_LIMIT_DIR', os.path.join(tempfile.gettempdir(), 'albaniawalktour-ratelimit'))
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+
+# Reverse proxies in front of the app that append to X-Forwarded-For. With the
+# default 0 the header is ignored and the socket's peer address is used.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# Per-route budgets as (burst capacity, refill period in seconds).
+# Override with e.g. RATE_LIMIT_BOOK="5/60" (5 requests per 60 seconds).
+DEFAULT_BUDGETS = {
+    'book': (5, 60),
+    'cookie_consent': (10, 60),
+}
+
+# Maximum number of write requests in flight across all workers
+WRITE_CONCURRENCY_LIMIT = int(os.environ.get('WRITE_CONCURRENCY_LIMIT', 4))
+
+# Seconds an async view waits for a free write slot before returning 503.
+# Sync views never wait: they would be holding a worker while they did.
+WRITE_SLOT_WAIT = float(os.environ.get('WRITE_SLOT_WAIT', 2))
+WRITE_SLOT_POLL = 0.005
+
+# Buckets untouched for this long are full again and can be dropped
+BUCKET_IDLE_SECONDS = 3600
+
+
+def parse_budget(value, default):
+    try:
+        capacity, period = value.split('/')
+        capacity, period = int(capacity), float(period)
+        if capacity > 0 and period > 0:
+            return capacity, period
+    except (AttributeError, ValueError):
+        pass
+    return default
+
+
+def get_budget(name):
+    default = DEFAULT_BUDGETS.get(name, (10, 60))
+    return parse_budget(os.environ.get(f'RATE_LIMIT_{name.upper()}'), default)
+
+
+# Client IP: the X-Forwarded-For hop added by the outermost trusted proxy
+# (TRUSTED_PROXY_COUNT from the right), else the peer address. Hops further
+# left are whatever the client sent, so they never pick the bucket.
+def client_ip():
+    if TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',')]
+        hops = [hop for hop in hops if hop]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            return hops[-TRUSTED_PROXY_COUNT]
+    return request.remote_addr or 'unknown'
+
+
+class TokenBucketStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=0.5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                ' key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    # Take one token from the bucket. Returns (allowed, seconds until next token).
+    def take(self, key, capacity, period):
+        rate = capacity / period
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                tokens = float(capacity)
+            else:
+                tokens = min(float(capacity), row[0] + (now - row[1]) * rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+
+            # Occasionally drop idle buckets so the table stays small
+            self._calls += 1
+            if self._calls % 500 == 0:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - BUCKET_IDLE_SECONDS,))
+
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        retry_after = 0 if allowed else (1 - tokens) / rate
+        return allowed, retry_after
+
+
+class WriteSlots:
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit
+        self._slots = None
+        self._init_lock = threading.Lock()
+
+    def _open_slots(self):
+        with self._init_lock:
+            if self._slots is None:
+                os.makedirs(self.directory, exist_ok=True)
+                slots = []
+                for i in range(self.limit):
+                    fd = None
+                    if fcntl:
+                        fd = os.open(os.path.join(self.directory, f'write-slot-{i}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                    slots.append((threading.Lock(), fd))
+                self._slots = slots
+        return self._slots
+
+    # Grab a free slot without blocking. Returns the slot or None when saturated.
+    def try_acquire(self):
+        for slot in self._open_slots():
+            thread_lock, fd = slot
+            if not thread_lock.acquire(blocking=False):
+                continue
+            if fd is None:
+                return slot
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except OSError:
+                thread_lock.release()
+        return None
+
+    def release(self, slot):
+        thread_lock, fd = slot
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        thread_lock.release()
+
+
+bucket_store = TokenBucketStore(os.path.join(RATE_LIMIT_DIR, 'buckets.sqlite3'))
+write_slots = WriteSlots(RATE_LIMIT_DIR, WRITE_CONCURRENCY_LIMIT)
+# Event loop -> asyncio.Semaphore queueing that loop's async_write_slot() waiters
+_async_gates = weakref.WeakKeyDictionary()
+
+
+def too_many_requests(retry_after):
+    response = jsonify({'success': False, 'message': 'Too many requests. Please wait a moment and try again.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def service_busy():
+    response = jsonify({'success': False, 'message': 'The server is busy right now. Please try again shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+# Take a token from the caller's bucket for this route
+def take_token(name):
+    capacity, period = get_budget(name)
+    try:
+        return bucket_store.take(f'{name}:{client_ip()}', capacity, period)
+    except sqlite3.Error as e:
+        # Never turn a limiter hiccup into a failed booking
+        logger.warning('Rate limiter unavailable, allowing request: %s', e, extra={'event': 'rate_limiter_unavailable'})
+        return True, 0
+
+
+# Hold one of the global write slots for the block. Yields False, without
+# holding anything, when all slots are taken.
+@contextmanager
+def write_slot():
+    if not RATE_LIMIT_ENABLED:
+        yield True
+        return
+    slot = write_slots.try_acquire()
+    if slot is None:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        write_slots.release(slot)
+
+
+# write_slot() for async views: waits up to WRITE_SLOT_WAIT seconds for a
+# slot. Waiters queue in order on a per-worker semaphore, so at most
+# WRITE_CONCURRENCY_LIMIT of them per worker poll the shared slots.
+@asynccontextmanager
+async def async_write_slot():
+    if not RATE_LIMIT_ENABLED:
+        yield True
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WRITE_SLOT_WAIT
+    gate = _async_gates.get(loop)
+    if gate is None:
+        gate = _async_gates[loop] = asyncio.Semaphore(WRITE_CONCURRENCY_LIMIT)
+    try:
+        await asyncio.wait_for(gate.acquire(), WRITE_SLOT_WAIT)
+    except TimeoutError:
+        yield False
+        return
+    try:
+        slot = write_slots.try_acquire()
+        while slot is None and loop.time() < deadline:
+            await asyncio.sleep(WRITE_SLOT_POLL)
+            slot = write_slots.try_acquire()
+        if slot is None:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            write_slots.release(slot)
+    finally:
+        gate.release()
+
+
+# Decorator for write endpoints: checks the caller's token bucket, then holds
+# one of the global write slots for the duration of the request.
+#
+# Async views (asgi.py) only get the bucket check, done in a thread since it
+# is a SQLite write. They spend most of their time awaiting other things, such
+# as Twilio, so they take a slot with async_write_slot() around the write itself;
+# holding one for the whole request would cap every worker together at
+# WRITE_CONCURRENCY_LIMIT requests in flight.
+def rate_limited(name):
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                if RATE_LIMIT_ENABLED:
+                    allowed, retry_after = await asyncio.to_thread(take_token, name)
+                    if not allowed:
+                        return too_many_requests(retry_after)
+                return await f(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+
+            allowed, retry_after = take_token(name)
+            if not allowed:
+                return too_many_requests(retry_after)
+
+            with write_slot() as acquired:
+                if not acquired:
+                    return service_busy()
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,391 @@
+import argparse
+import csv
+from decimal import Decimal, InvalidOperation
+import json
+import logging
+import re
+import sys
+
+import booking_store
+from catalog import load_summaries
+from tour_search import parse_price
+
+# Offline payment reconciliation.
+#
+# Reads PayPal payments - an activity CSV export and/or a stream of webhook
+# events (one JSON event per line) - and matches them to bookings:
+#
+#   1. by booking ID, when the payer left it in the invoice/custom/note fields
+#   2. otherwise by payer email plus the expected amount (tour price x people)
+#
+# Matching uses dict indexes built once per run, so it is linear in the number
+# of transactions and bookings. Every resulting status change is applied in a
+# single bookings.json write; everything that could not be applied safely ends
+# up in the mismatch report for a human to look at.
+#
+#   python reconcile.py --csv paypal.csv --webhooks events.jsonl --dry-run
+#   python reconcile.py --csv paypal.csv --report mismatches.csv
+
+logger = logging.getLogger(__name__)
+
+PAID = 'paid'
+
+# Normalised transaction statuses
+COMPLETED = 'completed'
+REFUNDED = 'refunded'
+OTHER = 'other'
+
+_completed_statuses = {'completed', 'success', 'succeeded', 'cleared', 'paid'}
+_refunded_statuses = {'refunded', 'partially_refunded', 'reversed', 'canceled_reversal', 'denied'}
+
+# "1,234" or "1.234.567": one kind of separator, each followed by three digits
+_grouped_amount_re = re.compile(r'[+-]?[1-9]\d{0,2}([.,])\d{3}(?:\1\d{3})*')
+_booking_id_re = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)
+
+# PayPal's activity export headers (matched case-insensitively) for each field
+CSV_COLUMNS = {
+    'transaction_id': ('transaction id', 'transaction_id', 'id'),
+    'email': ('from email address', 'payer email', 'email'),
+    'amount': ('gross', 'amount'),
+    'currency': ('currency',),
+    'status': ('status',),
+    'type': ('type',),
+}
+# Free-text columns searched for a booking ID
+CSV_REFERENCE_COLUMNS = ('invoice number', 'custom number', 'custom field', 'item id',
+                         'item title', 'subject', 'note', 'reference txn id', 'booking id')
+
+
+# Amount in cents from "1,234.56", "1.234,56", "1,234", "-25.00" or a number.
+# Exports give amounts two decimals, so a lone separator followed by three
+# digits groups thousands.
+def parse_amount(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        text = repr(value)
+    else:
+        text = str(value).strip().replace(' ', '').replace('\xa0', '')
+        if ',' in text and '.' in text:
+            # The later separator is the decimal point
+            thousands = ',' if text.rfind('.') > text.rfind(',') else '.'
+            text = text.replace(thousands, '')
+        else:
+            grouped = _grouped_amount_re.fullmatch(text)
+            if grouped:
+                text = text.replace(grouped.group(1), '')
+        text = text.replace(',', '.')
+    try:
+        return int((Decimal(text) * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def normalise_status(value):
+    status = str(value or '').strip().lower().replace(' ', '_')
+    if status in _completed_statuses:
+        return COMPLETED
+    if status in _refunded_statuses:
+        return REFUNDED
+    return OTHER
+
+
+def find_booking_id(*values):
+    for value in values:
+        if value:
+            match = _booking_id_re.search(str(value))
+            if match:
+                return match.group(0).lower()
+    return None
+
+
+def make_transaction(source, transaction_id, booking_id, email, amount, currency, status):
+    return {
+        'source': source,
+        'transaction_id': transaction_id or '',
+        'booking_id': booking_id,
+        'email': (email or '').strip().lower(),
+        'amount': amount,
+        'currency': (currency or '').strip().upper(),
+        'status': status,
+    }
+
+
+# Transactions from a PayPal activity CSV export
+def read_paypal_csv(f):
+    reader = csv.reader(f)
+    try:
+        header = [h.strip().lstrip('\ufeff').lower() for h in next(reader)]
+    except StopIteration:
+        return
+    position = {name: i for i, name in enumerate(header)}
+
+    def column(names):
+        return next((position[n] for n in names if n in position), None)
+
+    columns = {field: column(names) for field, names in CSV_COLUMNS.items()}
+    reference_columns = [position[n] for n in CSV_REFERENCE_COLUMNS if n in position]
+    width = len(header)
+
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+
+        def get(field):
+            i = columns[field]
+            return row[i] if i is not None else ''
+
+        amount = parse_amount(get('amount'))
+        status = normalise_status(get('status'))
+        kind = get('type').lower()
+        # Refund rows carry a negative gross amount
+        if 'refund' in kind or 'reversal' in kind or (amount is not None and amount < 0):
+            status = REFUNDED
+        yield make_transaction(
+            'csv',
+            get('transaction_id'),
+            find_booking_id(*(row[i] for i in reference_columns)),
+            get('email'),
+            abs(amount) if amount is not None else None,
+            get('currency'),
+            status,
+        )
+
+
+# Transactions from PayPal webhook events, one JSON object per line
+def read_webhook_events(f):
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            logger.warning('Skipping malformed webhook event on line %d', line_number)
+            continue
+
+        event_type = str(event.get('event_type', '')).upper()
+        resource = event.get('resource') or {}
+        # CHECKOUT.ORDER.* events nest the payment in the first purchase unit
+        unit = (resource.get('purchase_units') or [{}])[0]
+        amount = resource.get('amount') or unit.get('amount') or {}
+        payer = resource.get('payer') or {}
+
+        if 'REFUND' in event_type or 'REVERSED' in event_type or 'DENIED' in event_type:
+            status = REFUNDED
+        else:
+            status = normalise_status(resource.get('status') or event_type.rsplit('.', 1)[-1])
+
+        yield make_transaction(
+            'webhook',
+            resource.get('id') or event.get('id'),
+            find_booking_id(resource.get('custom_id'), resource.get('invoice_id'),
+                            unit.get('custom_id'), unit.get('invoice_id'),
+                            unit.get('reference_id'), unit.get('description')),
+            payer.get('email_address') or resource.get('payer_email'),
+            parse_amount(amount.get('value')),
+            amount.get('currency_code'),
+            status,
+        )
+
+
+# Expected charge in cents per tour id, None for flexible prices
+def tour_prices():
+    prices = {}
+    for tour in load_summaries():
+        price = parse_price(tour.get('price'))
+        prices[tour.get('id')] = None if price is None else parse_amount(price)
+    return prices
+
+
+def expected_amount(booking, prices):
+    price = prices.get(booking.get('tour_id'))
+    if price is None:
+        return None
+    try:
+        return price * int(booking.get('number_of_people') or 1)
+    except (TypeError, ValueError):
+        return None
+
+
+def mismatch(transaction, reason, booking=None, expected=None, detail=''):
+    return {
+        'reason': reason,
+        'transaction_id': transaction['transaction_id'],
+        'source': transaction['source'],
+        'booking_id': (booking or {}).get('booking_id') or transaction['booking_id'] or '',
+        'email': transaction['email'],
+        'amount': format_cents(transaction['amount']),
+        'expected_amount': format_cents(expected),
+        'currency': transaction['currency'],
+        'detail': detail,
+    }
+
+
+def format_cents(cents):
+    if cents is None:
+        return ''
+    return '%s%d.%02d' % ('-' if cents < 0 else '', abs(cents) // 100, abs(cents) % 100)
+
+
+# Match transactions to bookings. Returns ({booking_id: status}, mismatches, stats).
+def match_transactions(transactions, bookings, prices, currency=None):
+    by_id = {}
+    by_email = {}
+    for booking in bookings:
+        booking_id = str(booking.get('booking_id') or '').lower()
+        if not booking_id:
+            continue
+        by_id[booking_id] = booking
+        email = str(booking.get('user_email') or '').strip().lower()
+        if email:
+            by_email.setdefault(email, []).append(booking)
+
+    updates = {}
+    paid_by = {}   # booking_id -> transaction_id that paid it in this run
+    seen = set()
+    mismatches = []
+    stats = {'transactions': 0, 'matched_by_id': 0, 'matched_by_email': 0,
+             'already_paid': 0, 'skipped': 0}
+
+    for txn in transactions:
+        stats['transactions'] += 1
+        if txn['transaction_id']:
+            if txn['transaction_id'] in seen:
+                stats['skipped'] += 1
+                continue  # the same payment from both the CSV and a webhook
+            seen.add(txn['transaction_id'])
+
+        if txn['status'] == OTHER:
+            stats['skipped'] += 1  # pending, held or non-payment rows
+            continue
+        if currency and txn['currency'] and txn['currency'] != currency:
+            mismatches.append(mismatch(txn, 'currency_mismatch', detail=f'expected {currency}'))
+            continue
+
+        booking = None
+        expected = None
+        if txn['booking_id']:
+            booking = by_id.get(txn['booking_id'])
+            if booking is None:
+                mismatches.append(mismatch(txn, 'unknown_booking'))
+                continue
+            expected = expected_amount(booking, prices)
+            if txn['status'] == COMPLETED and expected is not None and txn['amount'] != expected:
+                mismatches.append(mismatch(txn, 'amount_mismatch', booking, expected))
+                continue
+            matched_by = 'matched_by_id'
+        else:
+            candidates = by_email.get(txn['email'], [])
+            if txn['status'] == COMPLETED:
+                # Prefer unpaid bookings whose expected amount matches exactly
+                unpaid = [b for b in candidates
+                          if b.get('payment_status') != PAID and b.get('booking_id') not in paid_by]
+                exact = [b for b in unpaid if expected_amount(b, prices) == txn['amount']]
+                flexible = [b for b in unpaid if expected_amount(b, prices) is None]
+                pool = exact or flexible
+            else:
+                pool = [b for b in candidates if b.get('payment_status') == PAID or b.get('booking_id') in paid_by]
+                pool = [b for b in pool if expected_amount(b, prices) in (txn['amount'], None)]
+
+            if not candidates:
+                mismatches.append(mismatch(txn, 'unmatched_transaction'))
+                continue
+            if len(pool) != 1:
+                reason = 'ambiguous_match' if pool else 'no_matching_amount'
+                detail = ', '.join(b.get('booking_id', '')[:8] for b in (pool or candidates))
+                mismatches.append(mismatch(txn, reason, detail=f'candidates: {detail}'))
+                continue
+            booking = pool[0]
+            expected = expected_amount(booking, prices)
+            matched_by = 'matched_by_email'
+
+        booking_id = booking.get('booking_id')
+        if txn['status'] == REFUNDED:
+            # Status changes away from paid are left to a human
+            mismatches.append(mismatch(txn, 'refunded_payment', booking, expected,
+                                       detail=f"booking is {booking.get('payment_status', 'pending')}"))
+            continue
+
+        stats[matched_by] += 1
+        if booking_id in paid_by:
+            mismatches.append(mismatch(txn, 'duplicate_payment', booking, expected,
+                                       detail=f'also paid by {paid_by[booking_id]}'))
+            continue
+        paid_by[booking_id] = txn['transaction_id']
+        if booking.get('payment_status') == PAID:
+            stats['already_paid'] += 1
+            continue
+        updates[booking_id] = PAID
+
+    return updates, mismatches, stats
+
+
+def write_report(mismatches, f):
+    fields = ['reason', 'transaction_id', 'source', 'booking_id', 'email',
+              'amount', 'expected_amount', 'currency', 'detail']
+    writer = csv.DictWriter(f, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(mismatches)
+
+
+# Run a reconciliation. With dry_run nothing is written.
+def reconcile(transactions, currency=None, dry_run=False):
+    updates, mismatches, stats = match_transactions(
+        transactions, booking_store.load_bookings(), tour_prices(), currency)
+
+    results = []
+    if updates and not dry_run:
+        # One locked read-modify-write for the whole batch; bookings removed or
+        # paid since we read them come back as not_found/unchanged
+        results = booking_store.update_payment_statuses(updates)
+        for r in results:
+            if r['result'] == 'not_found':
+                mismatches.append({'reason': 'booking_removed', 'booking_id': r['booking_id']})
+    stats['updated'] = sum(1 for r in results if r['result'] == 'updated') if not dry_run else len(updates)
+    stats['mismatches'] = len(mismatches)
+    return {'updates': updates, 'mismatches': mismatches, 'stats': stats, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reconcile PayPal payments with bookings')
+    parser.add_argument('--csv', action='append', default=[], help='PayPal activity export (repeatable)')
+    parser.add_argument('--webhooks', action='append', default=[], help='webhook events, one JSON per line (repeatable)')
+    parser.add_argument('--currency', help='only accept payments in this currency, e.g. EUR')
+    parser.add_argument('--report', help='write the mismatch report to this CSV file (default: stdout)')
+    parser.add_argument('--dry-run', action='store_true', help='match and report without updating bookings')
+    args = parser.parse_args(argv)
+
+    if not args.csv and not args.webhooks:
+        parser.error('give at least one --csv or --webhooks file')
+
+    def transactions():
+        for path in args.csv:
+            with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+                yield from read_paypal_csv(f)
+        for path in args.webhooks:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield from read_webhook_events(f)
+
+    outcome = reconcile(transactions(), currency=args.currency and args.currency.upper(), dry_run=args.dry_run)
+
+    stats = outcome['stats']
+    verb = 'would mark' if args.dry_run else 'marked'
+    print(f"{stats['transactions']} transactions: {stats['matched_by_id']} matched by booking ID, "
+          f"{stats['matched_by_email']} by email and amount, {stats['skipped']} skipped; "
+          f"{verb} {stats['updated']} bookings paid ({stats['already_paid']} already paid), "
+          f"{stats['mismatches']} mismatches", file=sys.stderr)
+
+    if outcome['mismatches']:
+        if args.report:
+            with open(args.report, 'w', newline='') as f:
+                write_report(outcome['mismatches'], f)
+        else:
+            write_report(outcome['mismatches'], sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -97,42 +97,38 @@ document.addEventListener('DOMContentLoaded', function() {
     // Booking form functionality
     const bookingForm = document.getElementById('booking-form');
     if (bookingForm) {
+        // The rules /book validates against, published by the server
+        let bookingSchema = null;
+        const tourIdField = bookingForm.querySelector('[name="tour_id"]');
+        if (tourIdField && tourIdField.value) {
+            fetch(`/api/tours/${encodeURIComponent(tourIdField.value)}/booking-schema`)
+                .then(response => response.ok ? response.json() : null)
+                .then(schema => { bookingSchema = schema; })
+                .catch(() => {});
+        }
+
         bookingForm.addEventListener('submit', function(e) {
             e.preventDefault();
-            
-            // Basic client-side validation
-            const requiredFields = ['user_name', 'user_email', 'user_phone', 'number_of_people', 'country_code'];
-            let isValid = true;
-            
-            requiredFields.forEach(fieldName => {
-                const field = this.querySelector(`[name="${fieldName}"]`);
-                if (!field || !field.value.trim()) {
-                    isValid = false;
-                    field.style.borderColor = '#ff3b30';
-                } else {
-                    field.style.borderColor = '#d2d2d7';
+
+            // Check the form against the booking schema, or only for missing
+            // fields and the email format if it could not be loaded
+            const result = bookingSchema ? validateBooking(bookingSchema, this) : basicBookingCheck(this);
+
+            // The country code is part of the phone number, so required here too
+            const countryCodeField = this.querySelector('[name="country_code"]');
+            if (countryCodeField && !countryCodeField.value.trim()) {
+                result.invalid.add('country_code');
+                if (!result.errors.length) result.errors.push('Please fill in all required fields correctly.');
+            }
+
+            this.querySelectorAll('[name]').forEach(field => {
+                if (field.type !== 'hidden') {
+                    field.style.borderColor = result.invalid.has(field.name) ? '#ff3b30' : '#d2d2d7';
                 }
             });
-            
-            // Validate preferred_date_time separately (could be date input)
-            const dateField = this.querySelector('[name="preferred_date_time"]');
-            if (!dateField || !dateField.value) {
-                isValid = false;
-                if (dateField) dateField.style.borderColor = '#ff3b30';
-            } else {
-                if (dateField) dateField.style.borderColor = '#d2d2d7';
-            }
-            
-            // Email validation
-            const email = this.querySelector('[name="user_email"]');
-            const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
-            if (email && !emailRegex.test(email.value)) {
-                isValid = false;
-                email.style.borderColor = '#ff3b30';
-            }
-            
-            if (!isValid) {
-                alert('Please fill in all required fields correctly.');
+
+            if (result.errors.length) {
+                alert(result.errors.join('\n'));
                 return;
             }
             
@@ -320,4 +316,70 @@ document.addEventListener('click', function(event) {
         !aiPanel.contains(event.target)) {
         aiPanel.style.display = 'none';
     }
-});
\ No newline at end of file
+});
+
+// Field value, trimmed ('' when the form has no such field)
+function formValue(form, name) {
+    const field = form.querySelector(`[name="${name}"]`);
+    return field ? field.value.trim() : '';
+}
+
+// Check a booking form against the schema from /api/tours/<id>/booking-schema,
+// the same rules /book applies. Returns the error messages and the names of
+// the fields at fault.
+function validateBooking(schema, form) {
+    const errors = [];
+    const invalid = new Set();
+    const fields = {};
+    schema.fields.forEach(field => { fields[field.name] = field; });
+    const fail = (name, message) => {
+        errors.push(message);
+        invalid.add(name);
+    };
+
+    schema.fields.forEach(field => {
+        if (field.required && !formValue(form, field.name)) fail(field.name, field.required_message);
+    });
+
+    const email = fields.user_email;
+    const emailValue = formValue(form, 'user_email');
+    if (emailValue && !new RegExp(email.pattern).test(emailValue)) fail('user_email', email.pattern_message);
+
+    const people = fields.number_of_people;
+    const peopleValue = formValue(form, 'number_of_people');
+    if (peopleValue) {
+        if (!/^[+-]?\d+$/.test(peopleValue)) {
+            fail('number_of_people', people.type_message);
+        } else {
+            const count = parseInt(peopleValue, 10);
+            if (count < people.min || count > people.max) fail('number_of_people', people.range_message);
+            if (count < people.min_booking) fail('number_of_people', people.min_booking_message);
+        }
+    }
+
+    if (!schema.booking_open) errors.push(schema.closed_message);
+
+    // Dates outside the published window are left to the server
+    const dates = fields.preferred_date_time;
+    const day = formValue(form, 'preferred_date_time').split(/[T ]/)[0];
+    if (dates.dates && day && day >= dates.dates.from && day <= dates.dates.to) {
+        if (dates.dates.disabled.includes(day)) {
+            fail('preferred_date_time', dates.disabled_message);
+        } else if (!dates.dates.enabled.includes(day)) {
+            fail('preferred_date_time', dates.unavailable_message);
+        }
+    }
+
+    return { errors: errors, invalid: invalid };
+}
+
+// Fallback when the schema is unavailable: required fields and email format
+function basicBookingCheck(form) {
+    const invalid = new Set();
+    ['user_name', 'user_email', 'user_phone', 'number_of_people', 'preferred_date_time'].forEach(name => {
+        if (!formValue(form, name)) invalid.add(name);
+    });
+    const email = formValue(form, 'user_email');
+    if (email && !/^[^\s@]+@[^\s@]+\.[^\s@]+$/.test(email)) invalid.add('user_email');
+    return { errors: invalid.size ? ['Please fill in all required fields correctly.'] : [], invalid: invalid };
+}
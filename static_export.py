@@ -0,0 +1,217 @@
+from datetime import date
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+from catalog import catalog_version, load_summaries, write_json_atomic
+from tour_locales import DEFAULT_LOCALE, SUPPORTED_LOCALES
+
+# Static export of the public pages.
+#
+# With STATIC_EXPORT_DIR set, the home page, about page, every tour page,
+# sitemap.xml and robots.txt are rendered into that directory, in every locale,
+# so a plain file server or CDN can serve public traffic:
+#
+#   index.html                  /
+#   about/index.html            /about
+#   tour/<id>/index.html        /tour/<id>
+#   de/tour/<id>/index.html     /tour/<id>?lang=de (likewise it/, ar/)
+#   sitemap.xml, robots.txt, static/
+#
+# Pages are rendered through the app itself (a test client request with
+# STATIC_EXPORT_BASE_URL as the host), so they are what Flask would serve,
+# except that links a localized page keeps ?lang= on ("/tour/<id>?lang=de")
+# point at the exported copy ("/de/tour/<id>/"): file servers ignore the
+# query string. Saving or deleting a tour in the admin panel re-renders that
+# tour's pages, the home pages and the sitemap; anything else that changes the
+# catalog (the date maintenance job, hand edits, catalog.py import) is caught
+# by refresh_stale(), which re-exports everything when the catalog version or
+# the day differs from the last export - tour pages list dates from today on.
+#
+# Flask still has to serve /book, /booking/<id>, /api and /admin.
+
+logger = logging.getLogger(__name__)
+
+STATIC_EXPORT_DIR = os.environ.get('STATIC_EXPORT_DIR', '')
+STATIC_EXPORT_BASE_URL = os.environ.get('STATIC_EXPORT_BASE_URL', 'http://localhost')
+
+STATE_FILE = '.export.json'
+SITE_FILES = ('/sitemap.xml', '/robots.txt')
+
+# A link to a page in a locale, as rendered: "/about?lang=de", optionally
+# with the base URL in front
+_locale_link_re = re.compile(rb'"(%s)?(/[^"?#]*)\?lang=(%s)"' % (
+    re.escape(STATIC_EXPORT_BASE_URL.rstrip('/').encode()), '|'.join(SUPPORTED_LOCALES).encode()))
+
+_state = {'app': None}
+_export_lock = threading.Lock()
+
+
+def enabled():
+    return bool(STATIC_EXPORT_DIR)
+
+
+def _app():
+    if _state['app'] is None:
+        from app import create_app  # the CLI has no app yet
+        _state['app'] = create_app()
+    return _state['app']
+
+
+def _safe_tour_id(tour_id):
+    return bool(tour_id) and os.path.basename(tour_id) == tour_id and tour_id not in ('.', '..')
+
+
+# Output file for a URL path in a locale
+def page_file(out_dir, path, locale=DEFAULT_LOCALE):
+    parts = [out_dir] if locale == DEFAULT_LOCALE else [out_dir, locale]
+    if path in SITE_FILES:
+        return os.path.join(out_dir, path.lstrip('/'))
+    return os.path.join(*parts, *path.strip('/').split('/'), 'index.html')
+
+
+# URL of the exported file for a page path in a locale
+def page_url(path, locale=DEFAULT_LOCALE):
+    if locale == DEFAULT_LOCALE:
+        return path
+    return f'/{locale}/' + ''.join(part + '/' for part in path.strip('/').split('/') if part)
+
+
+def _export_link(match):
+    origin, path, locale = match.groups()
+    return b'"%s%s"' % (origin or b'', page_url(path.decode(), locale.decode()).encode())
+
+
+# Point a page's ?lang= links at the exported files
+def localize_links(html):
+    return _locale_link_re.sub(_export_link, html)
+
+
+def _write_file_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# Render URL paths into out_dir, each in every locale. Returns files written.
+def export_pages(paths, out_dir):
+    client = _app().test_client()
+    written = 0
+    for path in paths:
+        locales = (DEFAULT_LOCALE,) if path in SITE_FILES else SUPPORTED_LOCALES
+        for locale in locales:
+            query = {} if locale == DEFAULT_LOCALE else {'lang': locale}
+            response = client.get(path, base_url=STATIC_EXPORT_BASE_URL, query_string=query)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} ({locale}) returned HTTP {response.status_code}')
+            data = response.get_data() if path in SITE_FILES else localize_links(response.get_data())
+            _write_file_atomic(page_file(out_dir, path, locale), data)
+            written += 1
+    return written
+
+
+def _remove_tour_pages(out_dir, tour_id):
+    for locale in SUPPORTED_LOCALES:
+        shutil.rmtree(os.path.dirname(page_file(out_dir, f'/tour/{tour_id}', locale)), ignore_errors=True)
+
+
+def _tour_ids():
+    return [summary['id'] for summary in load_summaries() if _safe_tour_id(summary.get('id'))]
+
+
+def _save_state(out_dir):
+    write_json_atomic(os.path.join(out_dir, STATE_FILE),
+                      {'catalog_version': catalog_version(), 'date': date.today().isoformat()})
+
+
+def _load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# Export the whole public site. Returns the number of pages written.
+def export_site(out_dir=None):
+    out_dir = out_dir or STATIC_EXPORT_DIR
+    with _export_lock:
+        os.makedirs(out_dir, exist_ok=True)
+        tour_ids = _tour_ids()
+        written = export_pages(['/', '/about'] + [f'/tour/{tour_id}' for tour_id in tour_ids] + list(SITE_FILES),
+                               out_dir)
+        # Tours deleted since the last export
+        for locale in SUPPORTED_LOCALES:
+            tours_dir = os.path.dirname(os.path.dirname(page_file(out_dir, '/tour/x', locale)))
+            if os.path.isdir(tours_dir):
+                for name in set(os.listdir(tours_dir)) - set(tour_ids):
+                    shutil.rmtree(os.path.join(tours_dir, name), ignore_errors=True)
+        shutil.copytree(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        os.path.join(out_dir, 'static'), dirs_exist_ok=True)
+        _save_state(out_dir)
+        return written
+
+
+# Re-render what a change to these tours affects: their own pages (or remove
+# them if the tour is gone), the home pages and the sitemap. Never raises, so
+# a failed export cannot fail the admin save that triggered it.
+def refresh_tours(tour_ids):
+    if not enabled():
+        return
+    try:
+        with _export_lock:
+            existing = set(_tour_ids())
+            paths = ['/'] + [f'/tour/{tour_id}' for tour_id in tour_ids if tour_id in existing] + list(SITE_FILES)
+            for tour_id in tour_ids:
+                if tour_id not in existing and _safe_tour_id(tour_id):
+                    _remove_tour_pages(STATIC_EXPORT_DIR, tour_id)
+            written = export_pages(paths, STATIC_EXPORT_DIR)
+            _save_state(STATIC_EXPORT_DIR)
+        logger.info('Static pages refreshed', extra={'event': 'static_export_refreshed',
+                                                      'tour_ids': list(tour_ids), 'files': written})
+    except Exception:
+        logger.exception('Static export failed', extra={'event': 'static_export_failed', 'tour_ids': list(tour_ids)})
+
+
+# Full re-export when the catalog or the date changed since the last export
+def refresh_stale():
+    if not enabled():
+        return False
+    state = _load_state(STATIC_EXPORT_DIR)
+    if state.get('catalog_version') == catalog_version() and state.get('date') == date.today().isoformat():
+        return False
+    try:
+        written = export_site()
+    except Exception:
+        logger.exception('Static export failed', extra={'event': 'static_export_failed'})
+        return False
+    logger.info('Static site exported', extra={'event': 'static_export_refreshed', 'files': written})
+    return True
+
+
+def init_app(app):
+    _state['app'] = app
+
+
+if __name__ == '__main__':
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else STATIC_EXPORT_DIR
+    if not out_dir:
+        sys.exit('usage: python static_export.py OUTPUT_DIR (or set STATIC_EXPORT_DIR)')
+    count = export_site(out_dir)
+    print(f'Exported {count} pages to {out_dir}')
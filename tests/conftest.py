@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Before the app is imported: its settings are read at import time. No rate
+# limits or background jobs, and CDN purges are kept in memory.
+os.environ.update({
+    'LOG_LEVEL': 'WARNING',
+    'SCHEDULER_ENABLED': '0',
+    'RATE_LIMIT_ENABLED': '0',
+    'STATIC_EXPORT_DIR': '',
+    'CDN_PURGER': 'local',
+})
+os.environ.pop('IO_AUDIT', None)
+sys.path.insert(0, ROOT)
+
+# Shared fixtures. The app reads and writes its data files in the working
+# directory, so tests that touch them run in a copy: the catalog and the
+# translations, with no bookings.
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(ROOT, 'tours.json'), tmp_path)
+    shutil.copytree(os.path.join(ROOT, 'translations'), tmp_path / 'translations')
+    with open(tmp_path / 'bookings.json', 'w') as f:
+        json.dump([], f)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def app(data_dir):
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(client):
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
@@ -0,0 +1,45 @@
+from booking_search import SearchIndex
+from booking_store import JOURNAL_FIELDS
+
+# SearchIndex lookups that are too short to yield a trigram: an empty booking
+# ID in a journal line, or a one- or two-character needle.
+#
+#   python -m pytest tests
+
+
+def record(**fields):
+    return [fields.get(field, '') for field in JOURNAL_FIELDS]
+
+
+def make_index():
+    index = SearchIndex()
+    index.add(record(booking_id='0a1b2c3d-0000-4000-8000-000000000001', user_name='Anna Berisha',
+                     user_email='anna@example.com', user_phone='+355 69 123 4567'), 0)
+    index.add(record(booking_id='', user_name='No Id', user_email='noid@example.com'), 100)
+    return index
+
+
+def test_short_needles_have_no_candidates():
+    index = make_index()
+    assert index._candidates('') == set()
+    assert index._candidates('an') == set()
+    assert index._candidates('', prefix=True) == set()
+    assert index._docs('') == []
+    assert index._docs(None) == []
+
+
+def test_empty_booking_id_in_journal_lines():
+    index = make_index()
+    index.update(record(booking_id='', payment_status='paid'), 200)
+    index.delete('')
+    assert len(index) == 2
+    assert list(index.offsets) == [0, 100]
+
+
+def test_lookups_still_find_bookings():
+    index = make_index()
+    assert index._candidates('berisha') == {0}
+    assert index._candidates('noid@', prefix=True) == {1}
+    assert index._docs('0a1b2c3d-0000-4000-8000-000000000001') == [0]
+    index.delete('0a1b2c3d-0000-4000-8000-000000000001')
+    assert len(index) == 1
@@ -0,0 +1,71 @@
+import pytest
+
+import cdn_cache
+from catalog import load_summaries
+
+# Cache headers on public pages, conditional requests, and the purges admin
+# tour writes send (caught with a LocalPurger).
+
+
+@pytest.fixture
+def purger():
+    purger = cdn_cache.LocalPurger()
+    cdn_cache.set_purger(purger)
+    yield purger
+    cdn_cache.set_purger(None)
+
+
+@pytest.fixture
+def tour_id(data_dir):
+    return load_summaries()[0]['id']
+
+
+def test_admin_edit_purges_catalog_and_tour(admin_client, purger, tour_id):
+    response = admin_client.post(f'/admin/tours/edit/{tour_id}',
+                                 data={'title': 'New title', 'short_description': 'New description', 'price': '50'})
+    assert response.status_code == 302
+    assert {'catalog', f'tour:{tour_id}'} <= purger.purged_keys()
+
+
+def test_admin_delete_purges_catalog_and_tour(admin_client, purger, tour_id):
+    response = admin_client.post(f'/admin/tours/delete/{tour_id}')
+    assert response.status_code == 302
+    assert {'catalog', f'tour:{tour_id}'} <= purger.purged_keys()
+
+
+def test_failed_delete_purges_nothing(admin_client, purger):
+    admin_client.post('/admin/tours/delete/no-such-tour')
+    assert purger.purged == []
+
+
+@pytest.mark.parametrize('path, keys', [
+    ('/', {'site', 'catalog'}),
+    ('/tour/{tour_id}', {'site', 'tour:{tour_id}'}),
+    ('/about', {'site'}),
+    ('/sitemap.xml', {'site', 'catalog'}),
+])
+def test_public_pages_have_cache_headers(client, tour_id, path, keys):
+    response = client.get(path.format(tour_id=tour_id))
+    assert response.status_code == 200
+    cache_control = response.headers['Cache-Control']
+    assert 'public' in cache_control and 's-maxage=' in cache_control and 'stale-while-revalidate=' in cache_control
+    assert {key.format(tour_id=tour_id) for key in keys} <= set(response.headers['Surrogate-Key'].split())
+
+
+def test_matching_etag_gets_304(client, tour_id):
+    response = client.get(f'/tour/{tour_id}')
+    etag = response.headers['ETag']
+    assert etag
+
+    response = client.get(f'/tour/{tour_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    response = client.get(f'/tour/{tour_id}', headers={'If-None-Match': '"something-else"'})
+    assert response.status_code == 200
+
+
+def test_admin_pages_are_not_cached(admin_client):
+    response = admin_client.get('/admin/tours')
+    assert 's-maxage' not in response.headers.get('Cache-Control', '')
+    assert 'Surrogate-Key' not in response.headers
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import perf_gate
+
+# The budgets in benchmarks/perf_budgets.json, checked the way
+# benchmarks/perf_gate.py checks them: file opens, bytes read and written,
+# JSON parses and dumps and templates per request. "ms" is left to the
+# script, which reports it.
+
+CONFIG = perf_gate.load_config()
+
+
+@pytest.fixture(scope='module')
+def gate(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('perf'))
+    try:
+        names = perf_gate.prepare_data(CONFIG)
+        yield perf_gate.admin_client(), names
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize('check', CONFIG['checks'], ids=[check['name'] for check in CONFIG['checks']])
+def test_within_budget(gate, check):
+    client, names = gate
+    actual, counts = perf_gate.measure(client, check, names, timed=False)
+    budget = {name: allowed for name, allowed in check.get('budget', {}).items() if name != 'ms'}
+    assert perf_gate.over_budget(budget, actual, counts) == []
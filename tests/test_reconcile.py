@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import shutil
+
+import pytest
+
+import booking_store
+import reconcile
+from reconcile import match_transactions, parse_amount, read_paypal_csv, read_webhook_events
+
+# parse_amount() on the formats PayPal exports use, then matching and the
+# batched write against tests/fixtures/reconcile: a two-tour catalog (one
+# flexible price), eight bookings, a PayPal CSV export and webhook events.
+#
+#   python -m pytest tests
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'reconcile')
+CSV_FILE = os.path.join(FIXTURES, 'paypal.csv')
+WEBHOOKS_FILE = os.path.join(FIXTURES, 'webhooks.jsonl')
+
+
+def booking_id(n):
+    return '00000000-0000-4000-8000-%012d' % n
+
+
+@pytest.fixture
+def bookings_dir(tmp_path, monkeypatch):
+    for name in ('tours.json', 'bookings.json'):
+        shutil.copy(os.path.join(FIXTURES, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def fixture_bookings():
+    with open(os.path.join(FIXTURES, 'bookings.json')) as f:
+        return json.load(f)
+
+
+def fixture_transactions():
+    with open(CSV_FILE, newline='', encoding='utf-8-sig') as f:
+        transactions = list(read_paypal_csv(f))
+    with open(WEBHOOKS_FILE, encoding='utf-8') as f:
+        transactions += list(read_webhook_events(f))
+    return transactions
+
+
+def statuses():
+    return {b['booking_id']: b['payment_status'] for b in booking_store.load_bookings()}
+
+
+def reasons(mismatches):
+    return {m.get('booking_id') or m['transaction_id']: m['reason'] for m in mismatches}
+
+
+def test_decimal_point_and_comma():
+    assert parse_amount('25.00') == 2500
+    assert parse_amount('25,50') == 2550
+    assert parse_amount('-25.00') == -2500
+    assert parse_amount('0.5') == 50
+
+
+def test_both_separators():
+    assert parse_amount('1,234.56') == 123456
+    assert parse_amount('1.234,56') == 123456
+    assert parse_amount('1 234,56') == 123456
+
+
+def test_lone_separator_before_three_digits_groups_thousands():
+    assert parse_amount('1,234') == 123400
+    assert parse_amount('1.234') == 123400
+    assert parse_amount('-1,234') == -123400
+    assert parse_amount('1,234,567') == 123456700
+    assert parse_amount('1.234.567') == 123456700
+
+
+def test_other_values():
+    assert parse_amount(12) == 1200
+    assert parse_amount(12.5) == 1250
+    assert parse_amount(None) is None
+    assert parse_amount('') is None
+    assert parse_amount('abc') is None
+    assert parse_amount('0,500') == 50
+
+
+def test_csv_import():
+    with open(CSV_FILE, newline='', encoding='utf-8-sig') as f:
+        rows = {t['transaction_id']: t for t in read_paypal_csv(f)}
+
+    assert rows['TX1'] == {'source': 'csv', 'transaction_id': 'TX1', 'booking_id': booking_id(1),
+                           'email': 'anna@example.com', 'amount': 6000, 'currency': 'EUR',
+                           'status': 'completed'}
+    assert rows['TX2']['booking_id'] is None
+    assert rows['TX2']['email'] == 'ben@example.com'
+    # Refund rows: positive amount, refunded status
+    assert rows['TX5']['amount'] == 6000
+    assert rows['TX5']['status'] == 'refunded'
+    assert rows['TX9']['status'] == 'other'
+
+
+def test_webhook_import_skips_malformed_lines():
+    with open(WEBHOOKS_FILE, encoding='utf-8') as f:
+        events = list(read_webhook_events(f))
+
+    assert [e['transaction_id'] for e in events] == ['TX2', 'TX6', 'TX7B']
+    assert events[0]['email'] == 'ben@example.com'
+    assert events[1]['booking_id'] == booking_id(6)
+    assert events[1]['amount'] == 123450
+    assert events[2]['booking_id'] == booking_id(7)
+    assert all(e['source'] == 'webhook' and e['status'] == 'completed' for e in events)
+
+
+def test_match_transactions(bookings_dir):
+    updates, mismatches, stats = match_transactions(
+        fixture_transactions(), fixture_bookings(), reconcile.tour_prices())
+
+    # By booking ID (1, 6, 7) and by email plus amount (2); the flexible
+    # price on booking 6 accepts any amount
+    assert updates == {booking_id(n): 'paid' for n in (1, 2, 6, 7)}
+    assert stats['matched_by_id'] == 4
+    assert stats['matched_by_email'] == 1
+    # TX2 from the webhooks repeats the CSV row; TX9 is pending
+    assert stats['skipped'] == 2
+    assert stats['transactions'] == 10
+    assert reasons(mismatches) == {
+        'TX3': 'ambiguous_match',          # two bookings for cara@ at the same amount
+        booking_id(5): 'refunded_payment',
+        booking_id(7): 'duplicate_payment',
+        booking_id(8): 'amount_mismatch',
+    }
+
+
+def test_currency_filter(bookings_dir):
+    updates, mismatches, stats = match_transactions(
+        fixture_transactions(), fixture_bookings(), reconcile.tour_prices(), currency='USD')
+
+    assert updates == {}
+    assert {m['reason'] for m in mismatches} == {'currency_mismatch'}
+
+
+def test_reconcile_writes_once(bookings_dir, monkeypatch):
+    writes = []
+    write_json_atomic = booking_store.write_json_atomic
+    monkeypatch.setattr(booking_store, 'write_json_atomic',
+                        lambda *args, **kwargs: writes.append(args[0]) or write_json_atomic(*args, **kwargs))
+
+    outcome = reconcile.reconcile(fixture_transactions())
+
+    assert writes == [booking_store.BOOKINGS_FILE]
+    assert outcome['stats']['updated'] == 4
+    assert statuses() == {
+        booking_id(1): 'paid',
+        booking_id(2): 'paid',
+        booking_id(3): 'pending',
+        booking_id(4): 'pending',
+        booking_id(5): 'paid',      # refunds are left to a human
+        booking_id(6): 'paid',
+        booking_id(7): 'paid',
+        booking_id(8): 'pending',
+    }
+
+
+def test_main_dry_run_and_report(bookings_dir, capsys):
+    before = statuses()
+    assert reconcile.main(['--csv', CSV_FILE, '--webhooks', WEBHOOKS_FILE,
+                           '--dry-run', '--report', 'report.csv']) == 0
+
+    assert statuses() == before
+    assert 'would mark 4 bookings paid' in capsys.readouterr().err
+    with open('report.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(r['reason'] for r in rows) == [
+        'ambiguous_match', 'amount_mismatch', 'duplicate_payment', 'refunded_payment']
+
+
+def test_main_marks_bookings_paid(bookings_dir, capsys):
+    assert reconcile.main(['--csv', CSV_FILE, '--webhooks', WEBHOOKS_FILE, '--report', 'report.csv']) == 0
+
+    assert 'marked 4 bookings paid' in capsys.readouterr().err
+    assert list(statuses().values()).count('paid') == 5
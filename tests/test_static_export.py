@@ -0,0 +1,48 @@
+import re
+
+import static_export
+from catalog import load_summaries
+
+# Static export: localized pages link to the other exported pages of their
+# locale, not to ?lang= URLs a file server would answer in English.
+
+
+def _links(html):
+    return re.findall(r'href="(/[^"]*)"', html)
+
+
+def _file_for(out_dir, url):
+    path = url.lstrip('/')
+    return out_dir / path / 'index.html' if not path or path.endswith('/') else out_dir / path
+
+
+def test_localized_links_lead_to_localized_files(data_dir):
+    tour_id = load_summaries()[0]['id']
+    out_dir = data_dir / 'export'
+    static_export.export_pages(['/', '/about', f'/tour/{tour_id}'], str(out_dir))
+
+    html = (out_dir / 'de' / 'index.html').read_text()
+    links = _links(html)
+    assert not [link for link in links if 'lang=' in link]
+    tour_link = f'/de/tour/{tour_id}/'
+    assert tour_link in links and '/de/about/' in links
+
+    tour_html = _file_for(out_dir, tour_link).read_text()
+    assert '<html lang="de"' in tour_html
+    home = _file_for(out_dir, '/de/')
+    assert '/de/' in _links(tour_html) and home.exists()
+
+
+def test_default_locale_links_are_unchanged(data_dir):
+    tour_id = load_summaries()[0]['id']
+    out_dir = data_dir / 'export'
+    static_export.export_pages(['/'], str(out_dir))
+
+    links = _links((out_dir / 'index.html').read_text())
+    assert f'/tour/{tour_id}' in links and '/about' in links
+
+
+def test_page_url():
+    assert static_export.page_url('/', 'ar') == '/ar/'
+    assert static_export.page_url('/tour/x', 'it') == '/it/tour/x/'
+    assert static_export.page_url('/tour/x') == '/tour/x'
@@ -0,0 +1,191 @@
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+import threading
+
+from catalog import catalog_version
+
+# Tour date schedules.
+#
+# A tour's bookable days come from three places, in order of precedence:
+#   1. dates_data - explicit per-date entries ({'date', 'enabled'}), which act
+#      as overrides on top of any rules (the original format, still supported)
+#   2. date_rules['exclude'] - days removed from the recurring pattern
+#   3. date_rules['weekly'] - recurring weekly patterns over a date range:
+#      {'start': 'YYYY-MM-DD', 'end': 'YYYY-MM-DD' or null, 'weekdays': [0-6]}
+#      where 0 is Monday and an empty/missing weekdays list means every day.
+# Tours with neither fall back to the legacy available_dates list.
+#
+# Rules are stored compactly in tours.json and only expanded on demand, for a
+# bounded window of days the booking form needs.
+
+# How far ahead the booking form lists dates
+MATERIALIZE_DAYS = 365
+
+WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+ENABLED = 'enabled'
+DISABLED = 'disabled'
+
+_max_ordinal = date.max.toordinal()
+
+
+def parse_date(value):
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    # Accept "YYYY-MM-DD", "YYYY-MM-DDTHH:MM[:SS]" and "YYYY-MM-DD HH:MM"
+    text = text.split('T')[0].split(' ')[0]
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+# Merge overlapping (start, end) ordinal intervals into sorted disjoint ones
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class TourSchedule:
+    def __init__(self, tour):
+        self.overrides = {}
+        for entry in tour.get('dates_data') or []:
+            day = parse_date(entry.get('date'))
+            if day is not None:
+                self.overrides[day.toordinal()] = bool(entry.get('enabled', True))
+        if not self.overrides:
+            for value in tour.get('available_dates') or []:
+                day = parse_date(value)
+                if day is not None:
+                    self.overrides[day.toordinal()] = True
+
+        rules = tour.get('date_rules') or {}
+        self.excluded = set()
+        for value in rules.get('exclude') or []:
+            day = parse_date(value)
+            if day is not None:
+                self.excluded.add(day.toordinal())
+
+        # Per weekday, sorted disjoint ordinal ranges in which that weekday recurs
+        per_weekday = [[] for _ in range(7)]
+        for rule in rules.get('weekly') or []:
+            start = parse_date(rule.get('start'))
+            if start is None:
+                continue
+            end = parse_date(rule.get('end'))
+            end_ordinal = end.toordinal() if end else _max_ordinal
+            if end_ordinal < start.toordinal():
+                continue
+            weekdays = [int(w) for w in rule.get('weekdays') or [] if str(w).isdigit() and 0 <= int(w) <= 6] or range(7)
+            for weekday in weekdays:
+                per_weekday[weekday].append((start.toordinal(), end_ordinal))
+        self.weekly = [_merge(ranges) for ranges in per_weekday]
+        self._weekly_starts = [[start for start, _ in ranges] for ranges in self.weekly]
+        self.has_rules = any(self.weekly)
+
+    # True when the tour restricts bookings to specific dates at all
+    @property
+    def has_dates(self):
+        return bool(self.overrides) or self.has_rules
+
+    def _in_rules(self, ordinal):
+        weekday = (ordinal - 1) % 7  # date.fromordinal(1) is a Monday
+        starts = self._weekly_starts[weekday]
+        i = bisect_right(starts, ordinal) - 1
+        return i >= 0 and ordinal <= self.weekly[weekday][i][1]
+
+    # 'enabled', 'disabled' or None when the date is not offered
+    def status(self, day):
+        day = parse_date(day)
+        if day is None:
+            return None
+        ordinal = day.toordinal()
+        override = self.overrides.get(ordinal)
+        if override is not None:
+            return ENABLED if override else DISABLED
+        if ordinal in self.excluded:
+            return None
+        return ENABLED if self._in_rules(ordinal) else None
+
+    def is_bookable(self, day):
+        return self.status(day) == ENABLED
+
+    # Dates offered in [start, start + days), as dates_data-style dicts
+    def window(self, start=None, days=MATERIALIZE_DAYS):
+        start = parse_date(start) or date.today()
+        first = start.toordinal()
+        last = first + days - 1
+
+        ordinals = {o for o in self.overrides if first <= o <= last}
+        if self.has_rules:
+            for weekday, ranges in enumerate(self.weekly):
+                for range_start, range_end in ranges:
+                    lo = max(range_start, first)
+                    hi = min(range_end, last)
+                    # First ordinal >= lo falling on this weekday
+                    o = lo + ((weekday - (lo - 1) % 7) % 7)
+                    while o <= hi:
+                        ordinals.add(o)
+                        o += 7
+
+        window = []
+        for ordinal in sorted(ordinals):
+            override = self.overrides.get(ordinal)
+            if override is None and ordinal in self.excluded:
+                continue
+            enabled = override if override is not None else True
+            window.append({'date': date.fromordinal(ordinal).isoformat(), 'enabled': enabled})
+        return window
+
+    def enabled_dates(self, start=None, days=MATERIALIZE_DAYS):
+        return [d['date'] for d in self.window(start, days) if d['enabled']]
+
+
+_schedules = {'version': None, 'by_tour': {}}
+_schedules_lock = threading.Lock()
+
+
+# Schedule for a catalog tour, cached until the catalog changes
+def get_schedule(tour):
+    version = catalog_version()
+    with _schedules_lock:
+        if _schedules['version'] != version:
+            _schedules['version'] = version
+            _schedules['by_tour'] = {}
+        schedule = _schedules['by_tour'].get(tour.get('id'))
+        if schedule is None:
+            schedule = TourSchedule(tour)
+            _schedules['by_tour'][tour.get('id')] = schedule
+        return schedule
+
+
+# Validate and normalise date_rules submitted by the admin form
+def clean_date_rules(raw):
+    weekly = []
+    for rule in (raw or {}).get('weekly') or []:
+        start = parse_date(rule.get('start'))
+        if start is None:
+            continue
+        end = parse_date(rule.get('end'))
+        if end is not None and end < start:
+            start, end = end, start
+        weekdays = sorted({int(w) for w in rule.get('weekdays') or [] if str(w).isdigit() and 0 <= int(w) <= 6})
+        cleaned = {'start': start.isoformat(), 'end': end.isoformat() if end else None}
+        if weekdays and len(weekdays) < 7:
+            cleaned['weekdays'] = weekdays
+        weekly.append(cleaned)
+
+    exclude = sorted({d.isoformat() for d in (parse_date(v) for v in (raw or {}).get('exclude') or []) if d})
+
+    rules = {}
+    if weekly:
+        rules['weekly'] = weekly
+    if exclude:
+        rules['exclude'] = exclude
+    return rules
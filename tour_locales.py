@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from flask import request
+import json
+import logging
+import os
+import threading
+
+from catalog import load_summaries, load_tour, catalog_version
+
+# Per-locale tour content.
+#
+# The catalog holds English content. Translations live in one bundle per
+# locale under translations/tours/<locale>.json, mapping a tour id to the
+# fields that differ from English. A bundle is only read the first time its
+# locale is requested, and the localized listings are kept in a small LRU
+# cache. Single tours are localized on demand from catalog.load_tour().
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCALE = 'en'
+SUPPORTED_LOCALES = ('en', 'de', 'it', 'ar')
+LOCALE_DIR = os.path.join('translations', 'tours')
+LOCALE_CACHE_SIZE = int(os.environ.get('LOCALE_CACHE_SIZE', 3))
+# Locales written right to left: their pages get <html dir="rtl">
+RTL_LOCALES = ('ar',)
+
+# Fields a bundle may override; anything else always comes from the catalog
+LOCALIZED_FIELDS = (
+    'title',
+    'short_description',
+    'long_description',
+    'duration',
+    'starting_point',
+    'schedule',
+    'highlights',
+    'included',
+    'meeting_point_details',
+)
+
+
+# The supported locale asked for with ?lang=, or None
+def requested_locale():
+    requested = (request.args.get('lang') or '').strip().lower()
+    return requested if requested in SUPPORTED_LOCALES else None
+
+
+# Pick the locale from ?lang=, then Accept-Language, falling back to English
+def select_locale():
+    return requested_locale() or request.accept_languages.best_match(SUPPORTED_LOCALES, default=DEFAULT_LOCALE)
+
+
+def text_direction(locale):
+    return 'rtl' if locale in RTL_LOCALES else 'ltr'
+
+
+def bundle_path(locale):
+    return os.path.join(LOCALE_DIR, f'{locale}.json')
+
+
+def bundle_version(locale):
+    try:
+        st = os.stat(bundle_path(locale))
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load_bundle(locale):
+    try:
+        with open(bundle_path(locale), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.error('Error loading %s tour bundle: %s', locale, e, extra={'event': 'locale_bundle_invalid'})
+        return {}
+
+
+# Copy of a tour (or tour summary) with the bundle's fields applied
+def apply_overrides(tour, bundle):
+    overrides = bundle.get(tour.get('id')) or {}
+    if not overrides:
+        return tour
+    tour = dict(tour)
+    for field in LOCALIZED_FIELDS:
+        if field in tour and overrides.get(field):
+            tour[field] = overrides[field]
+    return tour
+
+
+class LocalizedCatalog:
+    def __init__(self, locale, summaries, bundle, version):
+        self.locale = locale
+        self.version = version
+        self.bundle = bundle
+        self.summaries = [apply_overrides(summary, bundle) for summary in summaries]
+
+    def tour(self, tour_id):
+        tour = load_tour(tour_id)
+        return apply_overrides(tour, self.bundle) if tour is not None else None
+
+
+class LocaleCache:
+    def __init__(self, max_size):
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, locale):
+        version = (catalog_version(), bundle_version(locale))
+        with self._lock:
+            entry = self._entries.get(locale)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(locale)
+                return entry
+
+        entry = LocalizedCatalog(locale, load_summaries(), load_bundle(locale), version)
+        with self._lock:
+            self._entries[locale] = entry
+            self._entries.move_to_end(locale)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+locale_cache = LocaleCache(LOCALE_CACHE_SIZE)
+
+
+# Tour summaries (see catalog.load_summaries) for a locale, for listing pages.
+# English is the base catalog and never hits the cache.
+def localized_summaries(locale):
+    if locale == DEFAULT_LOCALE or locale not in SUPPORTED_LOCALES:
+        return load_summaries()
+    return locale_cache.get(locale).summaries
+
+
+def localized_tour(tour_id, locale):
+    if locale == DEFAULT_LOCALE or locale not in SUPPORTED_LOCALES:
+        return load_tour(tour_id)
+    return locale_cache.get(locale).tour(tour_id)
+
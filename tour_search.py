@@ -0,0 +1,208 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+import re
+import threading
+import unicodedata
+
+from catalog import load_tours, catalog_version
+from tour_dates import get_schedule
+
+# Search and filter indexes over the tour catalog.
+#
+# The indexes are built once per catalog version and day and then answer
+# every query from memory: an inverted index for text, sorted arrays for price, duration
+# and dates, and buckets for language and duration class.
+
+# Field weights for text relevance
+TEXT_FIELDS = {
+    'title': 3,
+    'short_description': 2,
+    'highlights': 2,
+    'long_description': 1,
+}
+
+DURATION_BUCKETS = ('half-day', 'full-day', 'multi-day', 'flexible')
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+_hours_re = re.compile(r'(\d+(?:\.\d+)?)\s*(hour|hr|h\b)', re.IGNORECASE)
+_days_re = re.compile(r'(\d+(?:\.\d+)?)\s*day', re.IGNORECASE)
+
+
+def tokenize(text):
+    # Fold accents so "Gjirokastër" matches "gjirokaster"
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _word_re.findall(text)
+
+
+def parse_price(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None  # "flexible" and friends
+
+
+# Duration in hours, or None for "Flexible" / unparseable values
+def parse_duration_hours(value):
+    text = str(value or '')
+    match = _days_re.search(text)
+    if match:
+        return float(match.group(1)) * 24
+    match = _hours_re.search(text)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def duration_bucket(hours):
+    if hours is None:
+        return 'flexible'
+    if hours <= 4:
+        return 'half-day'
+    if hours < 24:
+        return 'full-day'
+    return 'multi-day'
+
+
+# Enabled explicit dates plus recurring dates in the booking window
+def enabled_dates(tour):
+    schedule = get_schedule(tour)
+    dates = {date.fromordinal(o).isoformat() for o, enabled in schedule.overrides.items() if enabled}
+    if schedule.has_rules:
+        dates.update(schedule.enabled_dates())
+    return sorted(dates)
+
+
+class TourIndex:
+    def __init__(self, tours, version):
+        self.version = version
+        self.tours = tours
+        self.all_ids = frozenset(range(len(tours)))
+
+        self.postings = {}          # token -> {tour position: weighted term count}
+        self.vocabulary = []        # sorted tokens, for prefix lookups
+        self.prices = []            # sorted (price, position) for numeric prices
+        self.flexible_price = set()
+        self.durations = []         # sorted (hours, position)
+        self.duration_buckets = {bucket: set() for bucket in DURATION_BUCKETS}
+        self.languages = {}         # lower-cased language -> positions
+        self.dates = []             # sorted (YYYY-MM-DD, position) of enabled dates
+
+        for pos, tour in enumerate(tours):
+            for field, weight in TEXT_FIELDS.items():
+                value = tour.get(field) or ''
+                if isinstance(value, list):
+                    value = ' '.join(str(v) for v in value)
+                for token in tokenize(str(value)):
+                    scores = self.postings.setdefault(token, {})
+                    scores[pos] = scores.get(pos, 0) + weight
+
+            price = parse_price(tour.get('price'))
+            if price is None:
+                self.flexible_price.add(pos)
+            else:
+                self.prices.append((price, pos))
+
+            hours = parse_duration_hours(tour.get('duration'))
+            if hours is not None:
+                self.durations.append((hours, pos))
+            self.duration_buckets[duration_bucket(hours)].add(pos)
+
+            for language in tour.get('languages') or []:
+                self.languages.setdefault(language.strip().lower(), set()).add(pos)
+
+            for date in enabled_dates(tour):
+                self.dates.append((date, pos))
+
+        self.vocabulary = sorted(self.postings)
+        self.prices.sort()
+        self.durations.sort()
+        self.dates.sort()
+
+    # Positions matching a query term, treating the term as a prefix
+    def _term_scores(self, term):
+        scores = {}
+        start = bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            for pos, score in self.postings[token].items():
+                scores[pos] = scores.get(pos, 0) + score
+        return scores
+
+    @staticmethod
+    def _range(sorted_pairs, low, high):
+        start = 0 if low is None else bisect_left(sorted_pairs, (low, -1))
+        end = len(sorted_pairs) if high is None else bisect_right(sorted_pairs, (high, len(sorted_pairs) + 1))
+        return {pos for _, pos in sorted_pairs[start:end]}
+
+    def search(self, q=None, languages=None, durations=None, min_price=None, max_price=None,
+               include_flexible_price=True, min_hours=None, max_hours=None,
+               date_from=None, date_to=None):
+        candidates = set(self.all_ids)
+        relevance = {}
+
+        for term in tokenize(q or ''):
+            scores = self._term_scores(term)
+            candidates &= scores.keys()
+            for pos, score in scores.items():
+                relevance[pos] = relevance.get(pos, 0) + score
+
+        if languages:
+            matched = set()
+            for language in languages:
+                matched |= self.languages.get(language.lower(), set())
+            candidates &= matched
+
+        if durations:
+            matched = set()
+            for bucket in durations:
+                matched |= self.duration_buckets.get(bucket, set())
+            candidates &= matched
+
+        if min_price is not None or max_price is not None:
+            matched = self._range(self.prices, min_price, max_price)
+            if include_flexible_price:
+                matched |= self.flexible_price
+            candidates &= matched
+
+        if min_hours is not None or max_hours is not None:
+            candidates &= self._range(self.durations, min_hours, max_hours)
+
+        if date_from is not None or date_to is not None:
+            candidates &= self._range(self.dates, date_from, date_to)
+
+        return candidates, relevance
+
+
+_index = {'current': None}
+_index_lock = threading.Lock()
+
+
+# Index for the current catalog, rebuilt when the catalog changes or the day
+# rolls over (the enabled dates depend on today's booking window)
+def get_index():
+    version = (catalog_version(), date.today())
+    index = _index['current']
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        index = _index['current']
+        if index is None or index.version != version:
+            index = TourIndex(load_tours(), version)
+            _index['current'] = index
+        return index
+
+
+def sort_results(index, positions, relevance, sort):
+    if sort in ('price_asc', 'price_desc'):
+        prices = {pos: price for price, pos in index.prices}
+        sign = 1 if sort == 'price_asc' else -1
+        # Flexible prices always go last
+        return sorted(positions, key=lambda pos: (pos not in prices, sign * prices.get(pos, 0), pos))
+    if sort == 'relevance' and relevance:
+        return sorted(positions, key=lambda pos: (-relevance.get(pos, 0), pos))
+    # Default: catalog order, as on the index page
+    return sorted(positions)